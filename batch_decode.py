@@ -0,0 +1,214 @@
+# ============================================================================
+# Offline batch decode: recording -> packets, split across processes
+# ============================================================================
+# The recording is cut into chunks on the demodulator's grid (a byte of
+# symbols for fixed timing, a timing block for timing recovery). Each worker
+# starts `warmup` samples early (at least the timing / level tracking
+# look-back, see state_samples) so the filters, the timing estimate, the
+# tracked levels and the decoder state settle, runs a frame past the chunk end
+# so frames straddling the boundary complete, and keeps only packets whose first symbol falls
+# inside its own chunk. Streaming DSP is position independent on that grid and
+# the decoder searches every bit offset, so the merged output is the same as
+# one single-process pass (--jobs 1).
+#
+#   python batch_decode.py record/iq_20260101_120000.sigmf-meta -j 8 -o out.ndjson
+#   python batch_decode.py rec.sigmf-meta --npz packets.npz   # one structured array per command
+#   python batch_decode.py rec.sigmf-data --set demodulation.rrc_alpha=0.3 \
+#          --set game_settings.target_jammer_level=2
+# ============================================================================
+import argparse
+import copy
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils import setup_logger
+from dsp_processor import DSPProcessor
+from packet_decoder import PacketDecoder
+from burst_detector import BurstDetector
+from iq_recorder import FileSource
+from packet_output import to_json
+from packet_types import packets_to_arrays
+from main import load_config, calculate_channel_plan, align_plan_to_recording
+
+BLOCK_SIZE = 1 << 18
+DSP_SETTLE = 2048  # samples discarded while the filters fill (>> LPF + RRC span)
+
+
+def _apply_overrides(config: dict, overrides) -> dict:
+    """--set a.b.c=value (value parsed as JSON when possible)."""
+    for item in overrides or []:
+        key, _, value = item.partition("=")
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        node = config
+        *path, leaf = key.split(".")
+        for part in path:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return config
+
+
+def chunk_grid(dsp: DSPProcessor) -> int:
+    """Chunk boundaries must be a multiple of this many input samples."""
+    if dsp.timing_recovery == "fixed":
+        # one byte of symbols, so every chunk starts on the decoder's byte grid
+        return 4 * dsp.samples_per_symbol
+    return dsp.decimation * int(round(dsp.timing_block_symbols * dsp.output_sps))
+
+
+def state_samples(dsp: DSPProcessor) -> int:
+    """
+    Input samples of look-back the demodulator state depends on: the timing
+    window and the level tracker's max age, each plus one block for the
+    partial block a chunk starts in.
+    """
+    span = 0
+    if dsp.timing_recovery != "fixed":
+        span = (dsp.timing_window_blocks + 1) * int(round(dsp.timing_block_symbols * dsp.output_sps))
+    if dsp.level_tracking:
+        span = max(span, (dsp.level_max_age_blocks + 1) * round(dsp.level_block_symbols * dsp.output_sps))
+    return span * dsp.decimation
+
+
+def max_frame_samples(config: dict, dsp: DSPProcessor) -> int:
+    max_len = config.get("decoder", {}).get("max_data_len")
+    frame_bytes = 9 + (0xFFFF if max_len is None else int(max_len))
+    return frame_bytes * 4 * math.ceil(dsp.sample_rate / dsp.symbol_rate)
+
+
+def _decode_range(config, channels, data_path, start, stop, own_start, own_stop):
+    """
+    Demodulate [start, stop) of the recording and decode every channel.
+    Returns (sample index, channel, packet) for packets whose first symbol
+    lies in [own_start, own_stop).
+    """
+    data = np.memmap(data_path, dtype="<c8", mode="r")
+    stop = min(stop, len(data))
+    dsp = DSPProcessor(config)
+    channelizer = dsp.open_channelizer([off for _, off in channels], sample_offset=start)
+    decoder_cfg = config.get("decoder", {})
+    decoders = [PacketDecoder(max_data_len=decoder_cfg.get("max_data_len"),
+                              burst_detector=BurstDetector.from_config(config),
+                              repair_bits=decoder_cfg.get("repair_bits", 0),
+                              repair_max_flips=decoder_cfg.get("repair_max_flips", 2))
+                for _ in channels]
+
+    # the decoders only see symbols from `settle` on, once the filter transient is gone
+    settle_until = start + DSP_SETTLE if start > 0 else -np.inf
+
+    packets = []
+    block = np.empty(BLOCK_SIZE, dtype=np.complex64)
+    for pos in range(start, stop, BLOCK_SIZE):
+        n = min(BLOCK_SIZE, stop - pos)
+        block[:n] = data[pos:pos + n]
+        bit_arrays = channelizer.process(block[:n])
+        symbol_arrays = zip(bit_arrays, channelizer.symbol_times, channelizer.symbol_values,
+                            channelizer.bit_reliabilities)
+        for k, (bits, times, soft, rel) in enumerate(symbol_arrays):
+            skip = int(np.searchsorted(times, settle_until))
+            bits, times, soft, rel = bits[2 * skip:], times[skip:], soft[skip:], rel[2 * skip:]
+            for p in decoders[k].decode(bits, channels[k][0], soft=soft, reliability=rel, times=times):
+                sample = p.sample_index
+                if own_start <= sample < own_stop:
+                    packets.append((sample, k, p))
+    return packets
+
+
+def _worker(job):
+    return _decode_range(*job)
+
+
+def plan_chunks(config: dict, n_samples: int, chunk_samples: int, warmup: int) -> list:
+    """[(start, stop, own_start, own_stop)] covering the recording."""
+    dsp = DSPProcessor(config)
+    grid = chunk_grid(dsp)
+    chunk_samples = max(grid, chunk_samples // grid * grid)
+    # never shorter than the state look-back, or chunks start from different levels / timing
+    warmup = -(-(max(warmup, state_samples(dsp)) + DSP_SETTLE) // grid) * grid
+    tail = max_frame_samples(config, dsp) + DSP_SETTLE
+    chunks = []
+    for own_start in range(0, n_samples, chunk_samples):
+        own_stop = min(n_samples, own_start + chunk_samples)
+        chunks.append((max(0, own_start - warmup), min(n_samples, own_stop + tail), own_start, own_stop))
+    return chunks
+
+
+def batch_decode(config: dict, path, jobs: int = None, chunk_seconds: float = 10.0, warmup: int = 65536,
+                 logger=None) -> list:
+    """Decode a whole recording; returns packets ordered by (sample index, channel)."""
+    logger = logger or logging.getLogger("radar.batch")
+    config = copy.deepcopy(config)
+    _, center_freq, channels = calculate_channel_plan(config)
+    config["center_frequency_hz"] = center_freq
+    source = FileSource(config, path)
+    channels = align_plan_to_recording(config, source, channels, logger)
+    n_samples = len(np.memmap(source.path, dtype="<c8", mode="r"))
+    sample_rate = config["sdr_settings"]["sample_rate_sps"]
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        chunks = [(0, n_samples, 0, n_samples)]
+    else:
+        chunks = plan_chunks(config, n_samples, int(chunk_seconds * sample_rate), warmup)
+    logger.info(f"{n_samples / sample_rate:.1f} s of IQ, {len(channels)} channel(s), "
+                f"{len(chunks)} chunk(s) on {jobs} process(es)")
+
+    job_args = [(config, channels, str(source.path)) + c for c in chunks]
+    t0 = time.perf_counter()
+    if jobs == 1:
+        results = [_worker(job_args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_worker, job_args))
+    elapsed = time.perf_counter() - t0
+
+    packets = sorted((item for chunk in results for item in chunk), key=lambda item: item[:2])
+    logger.info(f"{len(packets)} packets in {elapsed:.1f} s "
+                f"({n_samples / sample_rate / max(elapsed, 1e-9):.1f}x real time)")
+    for _, _, p in packets:
+        p.time_s = p.sample_index / sample_rate
+    return [p for _, _, p in packets]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode an IQ recording offline across several processes")
+    parser.add_argument("recording", help=".sigmf-data / .sigmf-meta or raw cf32 file")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-seconds", type=float, default=10.0)
+    parser.add_argument("--warmup", type=int, default=65536, help="samples decoded before each chunk (discarded)")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE",
+                        help="override a config value, e.g. demodulation.rrc_alpha=0.3")
+    parser.add_argument("-o", "--output", help="NDJSON output file (default: stdout)")
+    parser.add_argument("--npz", metavar="PATH",
+                        help="also save one NumPy structured array per command type (packet_types.to_array)")
+    args = parser.parse_args()
+
+    logger = setup_logger()
+    config = _apply_overrides(load_config(args.config), args.set)
+    packets = batch_decode(config, args.recording, args.jobs, args.chunk_seconds, args.warmup, logger)
+    if args.npz:
+        arrays = packets_to_arrays(packets)
+        np.savez(args.npz, **arrays)
+        logger.info(f"Saved {', '.join(f'{name} ({len(a)})' for name, a in arrays.items())} to {args.npz}")
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for p in packets:
+            out.write(to_json(p) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
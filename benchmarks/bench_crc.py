@@ -0,0 +1,87 @@
+# ============================================================================
+# CRC micro-benchmark: reference vectors + per-backend timing
+# ============================================================================
+# python3 benchmarks/bench_crc.py [--candidates 20000]
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from crc_engine import CRC_BACKENDS, NUMBA_AVAILABLE, get_crc_engine  # noqa: E402
+
+# CRC-16/MCRF4XX check value (same parameters as the RoboMaster CRC16)
+CHECK_INPUT = b"123456789"
+CHECK_CRC16 = 0x6F91
+
+
+def crc8_bitwise(data, crc=0xFF):
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8C if crc & 1 else crc >> 1
+    return crc
+
+
+def crc16_bitwise(data, crc=0xFFFF):
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x8408 if crc & 1 else crc >> 1
+    return crc
+
+
+def check_reference(engine, rng):
+    assert crc16_bitwise(CHECK_INPUT) == CHECK_CRC16
+    assert engine.crc16(CHECK_INPUT) == CHECK_CRC16
+    assert engine.crc8(CHECK_INPUT) == crc8_bitwise(CHECK_INPUT)
+
+    msgs = rng.integers(0, 256, (500, 40), dtype=np.uint8)
+    lengths = rng.integers(0, 41, 500)
+    ref8 = [crc8_bitwise(m) for m in msgs.tolist()]
+    ref16 = [crc16_bitwise(m[:n]) for m, n in zip(msgs.tolist(), lengths)]
+    assert engine.crc8_batch(msgs).tolist() == ref8
+    assert engine.crc16_batch(msgs, lengths).tolist() == ref16
+
+
+def timed(fn, repeat=5):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--candidates", type=int, default=20000, help="SOF candidates per batch")
+    parser.add_argument("--frame-len", type=int, default=45, help="frame length for CRC16 timing")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    stream = rng.integers(0, 256, args.candidates * 8, dtype=np.uint8)
+    positions = np.arange(0, args.candidates * 8 - 8, 8)[:args.candidates]
+    headers = stream[positions[:, None] + np.arange(5)]
+    frames = rng.integers(0, 256, (args.candidates // 10, args.frame_len), dtype=np.uint8)
+
+    names = [n for n in CRC_BACKENDS if n != "numba" or NUMBA_AVAILABLE]
+    baseline = None
+    print(f"{'backend':8s} {'crc8 hdr/s':>14s} {'crc16 frames/s':>16s} {'speedup':>8s}")
+    for name in names:
+        engine = get_crc_engine(name)
+        check_reference(engine, rng)
+        t8 = timed(lambda: engine.verify_crc8_headers(headers))
+        t16 = timed(lambda: engine.verify_crc16_rows(frames))
+        if baseline is None:
+            baseline = t8
+        print(f"{name:8s} {len(positions) / t8:14.0f} {len(frames) / t16:16.0f} {baseline / t8:7.1f}x")
+    print("reference vectors OK")
+
+
+if __name__ == "__main__":
+    main()
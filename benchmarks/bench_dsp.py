@@ -0,0 +1,426 @@
+# ============================================================================
+# DSP / decoder benchmark on synthetic 4-RRC-FSK (no SDR needed)
+# ============================================================================
+# Reports, for the current config:
+#   throughput : Msps through one ChannelStream and through the Channelizer
+#                for every channel of the plan (DSP only, no decoding)
+#   stages     : ms per buffer for DDC, LPF, discriminator + slicer, RRC,
+#                timing recovery, level tracking and packet decoding
+#   decoder    : PacketDecoder packets/s and Mbit/s on already demodulated bits
+#   discriminator : per demodulation.discriminator variant (phase_diff,
+#                conj_product, fused when numba is installed): discriminator +
+#                RRC ms/buffer on the same LPF output, throughput, and bits
+#                changed against phase_diff
+#   per        : packet error rate against SNR (in the channel filter band)
+#   precision  : float32 against float64 (demodulation.precision): throughput
+#                of both, and per SNR the bits that differ (symbols matched
+#                by time) and the packet error rate of both
+# and writes everything to JSON; --compare prints the change against an
+# earlier result file, e.g. one written on another commit.
+#
+# python3 benchmarks/bench_dsp.py -o bench.json
+# python3 benchmarks/bench_dsp.py --snr 2 4 6 8 --frames 500 --compare bench.json
+# python3 benchmarks/bench_dsp.py --set demodulation.filter_backend=lfilter --skip-per
+# python3 benchmarks/bench_dsp.py --set demodulation.precision=float32 --skip-precision
+# ============================================================================
+import argparse
+import copy
+import json
+import logging
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import scipy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batch_decode import _apply_overrides  # noqa: E402
+from burst_detector import BurstDetector  # noqa: E402
+from dsp_processor import NUMBA_AVAILABLE, DSPProcessor  # noqa: E402
+from main import load_config, calculate_channel_plan  # noqa: E402
+from packet_decoder import PacketDecoder  # noqa: E402
+from packet_types import parse_payload  # noqa: E402
+from signal_generator import SignalGenerator  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_decoder(config: dict) -> PacketDecoder:
+    decoder_cfg = config.get("decoder", {})
+    return PacketDecoder(max_data_len=decoder_cfg.get("max_data_len"),
+                         burst_detector=BurstDetector.from_config(config),
+                         repair_bits=decoder_cfg.get("repair_bits", 0),
+                         repair_max_flips=decoder_cfg.get("repair_max_flips", 2))
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                             text=True, timeout=10)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, timeout=10).stdout.strip()
+        return out.stdout.strip() + ("+dirty" if dirty else "")
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+class StageTimer:
+    """Wraps bound methods of live objects and sums their wall time per stage."""
+
+    def __init__(self):
+        self.totals = {}
+        self.calls = {}
+
+    def wrap(self, obj, attr: str, stage: str):
+        if obj is None:
+            return
+        fn = getattr(obj, attr)
+        self.totals.setdefault(stage, 0.0)
+        self.calls.setdefault(stage, 0)
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - t0
+                self.calls[stage] += 1
+
+        setattr(obj, attr, timed)
+
+
+def best_of(fn, repeat: int) -> float:
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def feed(process, iq: np.ndarray, buffer_size: int):
+    for pos in range(0, len(iq), buffer_size):
+        process(iq[pos:pos + buffer_size])
+
+
+def bench_throughput(config, iq, offsets, buffer_size, repeat) -> dict:
+    dsp = DSPProcessor(config)
+    single = best_of(lambda: feed(dsp.open_channel(offsets[0]).process, iq, buffer_size), repeat)
+    bank = best_of(lambda: feed(dsp.open_channelizer(offsets).process, iq, buffer_size), repeat)
+    return {
+        "single_channel_msps": len(iq) / single / 1e6,
+        "channelizer_msps": len(iq) / bank / 1e6,
+        "channelizer_channels": len(offsets),
+        "realtime_factor": len(iq) / bank / dsp.sample_rate,
+    }
+
+
+def bench_stages(config, iq, offset, buffer_size) -> dict:
+    dsp = DSPProcessor(config)
+    stream = dsp.open_channel(offset)
+    decoder = make_decoder(config)
+    timer = StageTimer()
+    demod = stream._demod
+    timer.wrap(stream, "_filter_and_demod", "_filter_and_demod")
+    timer.wrap(stream._decimator if dsp.decimation > 1 else stream._lpf, "process", "lpf")
+    timer.wrap(demod, "process", "_demod")
+    timer.wrap(demod._rrc, "process", "rrc")
+    timer.wrap(demod._timing, "process", "timing")
+    timer.wrap(demod._levels, "process", "levels")
+
+    total = 0.0
+    buffers = 0
+    for pos in range(0, len(iq), buffer_size):
+        t0 = time.perf_counter()
+        bits = stream.process(iq[pos:pos + buffer_size])
+        total += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        decoder.decode(bits, "bench", soft=stream.symbol_values, reliability=stream.bit_reliabilities)
+        timer.totals["decode"] = timer.totals.get("decode", 0.0) + time.perf_counter() - t0
+        buffers += 1
+
+    t = timer.totals
+    stages = {
+        "ddc": total - t["_filter_and_demod"],
+        "lpf": t["lpf"],
+        "discriminator_slicer": t["_demod"] - t["rrc"] - t.get("timing", 0.0) - t.get("levels", 0.0),
+    }
+    if not demod._fused:
+        stages["rrc"] = t["rrc"]   # fused: part of discriminator_slicer
+    for name in ("timing", "levels", "decode"):
+        if name in t:
+            stages[name] = t[name]
+    out = {f"{name}_ms": 1e3 * value / buffers for name, value in stages.items()}
+    out["buffer_size"] = buffer_size
+    out["buffer_budget_ms"] = 1e3 * buffer_size / dsp.sample_rate
+    return out
+
+
+def bench_decoder(config, iq, offset, buffer_size, repeat) -> dict:
+    stream = DSPProcessor(config).open_channel(offset)
+    chunks = []
+    for pos in range(0, len(iq), buffer_size):
+        bits = stream.process(iq[pos:pos + buffer_size])
+        chunks.append((bits, stream.symbol_values, stream.bit_reliabilities))
+    n_bits = sum(len(b) for b, _, _ in chunks)
+    counted = []
+
+    def run():
+        decoder = make_decoder(config)
+        counted[:] = [sum(len(decoder.decode(b, "bench", soft=s, reliability=r)) for b, s, r in chunks)]
+
+    elapsed = best_of(run, repeat)
+    return {"packets_per_s": counted[0] / elapsed, "mbit_per_s": n_bits / elapsed / 1e6, "packets": counted[0]}
+
+
+def score(config, iq, truth, offset, buffer_size, sps) -> dict:
+    """Decode iq and match packets to the transmitted frames (start within half a symbol, same content)."""
+    stream = DSPProcessor(config).open_channel(offset)
+    decoder = make_decoder(config)
+    starts = np.array([t for t, _ in truth])
+    expected = [(int.from_bytes(f[5:7], "little"), parse_payload(int.from_bytes(f[5:7], "little"), f[7:-2]))
+                for _, f in truth]
+    found = np.zeros(len(truth), dtype=bool)
+    false_packets, repaired = 0, 0
+    for pos in range(0, len(iq), buffer_size):
+        bits = stream.process(iq[pos:pos + buffer_size])
+        packets = decoder.decode(bits, "bench", soft=stream.symbol_values, reliability=stream.bit_reliabilities,
+                                 times=stream.symbol_times)
+        for p in packets:
+            sample = p.sample_index
+            k = int(np.argmin(np.abs(starts - sample)))
+            repaired += p.repaired_bits > 0
+            if abs(starts[k] - sample) <= sps / 2 and (p.cmd_id, (p.record, p.error)) == expected[k] \
+                    and not found[k]:
+                found[k] = True
+            else:
+                false_packets += 1
+    return {
+        "frames": len(truth),
+        "decoded": int(found.sum()),
+        "false_packets": false_packets,
+        "repaired": repaired,
+        "per": 1.0 - found.mean() if len(truth) else 0.0,
+    }
+
+
+def bench_per(config, args, offset) -> list:
+    rows = []
+    for snr in args.snr:
+        gen = SignalGenerator(config, seed=args.seed)
+        iq, truth = gen.burst_train(gen.random_frames(args.frames), offset_hz=offset, idle=args.idle,
+                                    snr_db=snr, cfo_hz=args.cfo, jammer_hz=args.jammer_hz,
+                                    jammer_db=args.jammer_db)
+        row = {"snr_db": snr}
+        row.update(score(config, iq, truth, offset, args.buffer_size, gen.sps))
+        rows.append(row)
+        print(f"  SNR {snr:5.1f} dB  decoded {row['decoded']:4d}/{row['frames']}  PER {row['per']:.3f}  "
+              f"false {row['false_packets']}  repaired {row['repaired']}")
+    return rows
+
+
+def with_demod(config: dict, **settings) -> dict:
+    config = copy.deepcopy(config)
+    config["demodulation"].update(settings)
+    return config
+
+
+def demod_symbols(config, iq, offset, buffer_size):
+    """(bits as rows of two, symbol times) of the whole signal."""
+    stream = DSPProcessor(config).open_channel(offset)
+    bits, times = [], []
+    for pos in range(0, len(iq), buffer_size):
+        bits.append(stream.process(iq[pos:pos + buffer_size]))
+        times.append(stream.symbol_times)
+    return np.concatenate(bits).reshape(-1, 2), np.concatenate(times)
+
+
+def match_times(a: np.ndarray, b: np.ndarray, tol: float) -> np.ndarray:
+    """Index of the element of sorted b nearest each time in a, -1 if none is within tol."""
+    if len(b) == 0:
+        return np.full(len(a), -1)
+    k = np.clip(np.searchsorted(b, a), 1, max(1, len(b) - 1))
+    k = np.where(np.abs(b[k - 1] - a) <= np.abs(b[np.minimum(k, len(b) - 1)] - a), k - 1, k)
+    return np.where(np.abs(b[k] - a) <= tol, k, -1)
+
+
+def bench_precision(config, args, iq, offsets) -> dict:
+    single, double = with_demod(config, precision="float32"), with_demod(config, precision="float64")
+    out = {"throughput": {}, "ber": []}
+    for name, cfg in (("float64", double), ("float32", single)):
+        t = bench_throughput(cfg, iq, offsets, args.buffer_size, args.repeat)
+        out["throughput"][name] = {k: t[k] for k in ("single_channel_msps", "channelizer_msps")}
+    print("  " + ", ".join(f"{name} {t['single_channel_msps']:.3g} / {t['channelizer_msps']:.3g} Msps"
+                           for name, t in out["throughput"].items()) + " (single channel / channelizer)")
+    for snr in args.snr:
+        gen = SignalGenerator(config, seed=args.seed)
+        iq, truth = gen.burst_train(gen.random_frames(args.frames), offset_hz=offsets[0], idle=args.idle,
+                                    snr_db=snr, cfo_hz=args.cfo, jammer_hz=args.jammer_hz,
+                                    jammer_db=args.jammer_db)
+        bits64, times64 = demod_symbols(double, iq, offsets[0], args.buffer_size)
+        bits32, times32 = demod_symbols(single, iq, offsets[0], args.buffer_size)
+        # timing recovery may place a symbol differently; compare symbols at the same time only
+        k = match_times(times64, times32, gen.sps / 2)
+        matched = k >= 0
+        n = int(matched.sum())
+        diffs = int((bits64[matched] != bits32[k[matched]]).sum())
+        row = {"snr_db": snr, "bits": 2 * n, "bit_diffs": diffs, "bit_diff_rate": diffs / max(1, 2 * n),
+               "unmatched_symbols": len(times64) + len(times32) - 2 * n}
+        row["per_float64"] = score(double, iq, truth, offsets[0], args.buffer_size, gen.sps)["per"]
+        row["per_float32"] = score(single, iq, truth, offsets[0], args.buffer_size, gen.sps)["per"]
+        out["ber"].append(row)
+        print(f"  SNR {snr:5.1f} dB  bits differing {diffs}/{row['bits']} ({row['bit_diff_rate']:.2e})  "
+              f"unmatched symbols {row['unmatched_symbols']}  "
+              f"PER float64 {row['per_float64']:.3f} float32 {row['per_float32']:.3f}")
+    return out
+
+
+def bench_discriminators(config, args, iq, offsets) -> dict:
+    """Per discriminator variant: discriminator + RRC ms/buffer on the same LPF output, throughput, bit changes."""
+    # LPF output of every buffer, captured once
+    blocks = []
+    stream = DSPProcessor(config).open_channel(offsets[0])
+    stream._demod.process = lambda filtered: blocks.append(filtered.copy())
+    feed(stream.process, iq, args.buffer_size)
+
+    variants = ["phase_diff", "conj_product"] + (["fused"] if NUMBA_AVAILABLE else [])
+    out = {}
+    reference = None
+    for variant in variants:
+        cfg = with_demod(config, discriminator=variant)
+        dsp = DSPProcessor(cfg)
+        demod = dsp.open_channel(offsets[0])._demod
+
+        def run():
+            demod.reset()
+            for block in blocks:
+                demod._matched_frequency(block)
+
+        row = {"discriminator_rrc_ms": 1e3 * best_of(run, args.repeat) / len(blocks)}
+        row.update({k: v for k, v in bench_throughput(cfg, iq, offsets, args.buffer_size, args.repeat).items()
+                    if k.endswith("_msps")})
+        bits, times = demod_symbols(cfg, iq, offsets[0], args.buffer_size)
+        if reference is None:
+            reference = bits, times
+        k = match_times(reference[1], times, 0.5 * dsp.sample_rate / dsp.symbol_rate)
+        row["bit_diffs"] = int((reference[0][k >= 0] != bits[k[k >= 0]]).sum())
+        row["unmatched_symbols"] = len(reference[1]) + len(times) - 2 * int((k >= 0).sum())
+        out[variant] = row
+        print(f"  {variant:12s} discriminator+RRC {row['discriminator_rrc_ms']:.3f} ms/buffer, "
+              f"{row['single_channel_msps']:.3g} / {row['channelizer_msps']:.3g} Msps, "
+              f"bits changed vs phase_diff {row['bit_diffs']}")
+    return out
+
+
+def flatten(tree, prefix="") -> dict:
+    out = {}
+    if isinstance(tree, dict):
+        for key, value in tree.items():
+            out.update(flatten(value, f"{prefix}{key}."))
+    elif isinstance(tree, list):
+        for row in tree:
+            if isinstance(row, dict) and "snr_db" in row:
+                out.update(flatten({k: v for k, v in row.items() if k != "snr_db"}, f"{prefix}{row['snr_db']:g}dB."))
+    elif isinstance(tree, (int, float)) and not isinstance(tree, bool):
+        out[prefix[:-1]] = float(tree)
+    return out
+
+
+def compare(old: dict, new: dict):
+    keys = ("throughput", "stages", "decoder", "discriminator", "per", "precision")
+    a, b = flatten({k: old.get(k) for k in keys}), flatten({k: new.get(k) for k in keys})
+    print(f"\nvs {old.get('meta', {}).get('commit', '?')}:")
+    print(f"{'metric':44s} {'before':>12s} {'after':>12s} {'change':>8s}")
+    for key in sorted(set(a) & set(b)):
+        change = (b[key] - a[key]) / abs(a[key]) * 100 if a[key] else 0.0
+        print(f"{key:44s} {a[key]:12.4g} {b[key]:12.4g} {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic-signal benchmark of the DSP chain and decoder")
+    parser.add_argument("--config", default=str(ROOT / "config.json"))
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE", help="override a config value")
+    parser.add_argument("--seconds", type=float, default=1.0, help="signal length for the timing runs")
+    parser.add_argument("--buffer-size", type=int, default=None, help="default: processing.buffer_size")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--snr", type=float, nargs="*", default=[2, 4, 6, 8, 10, 15])
+    parser.add_argument("--frames", type=int, default=300, help="frames per SNR point")
+    parser.add_argument("--idle", choices=("random", "off"), default="random",
+                        help="between bursts: random symbols (continuous carrier) or carrier off")
+    parser.add_argument("--cfo", type=float, default=0.0, help="carrier frequency offset (Hz)")
+    parser.add_argument("--jammer-hz", type=float, default=None, help="CW tone offset from the capture center")
+    parser.add_argument("--jammer-db", type=float, default=0.0, help="CW tone power relative to the signal")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-per", action="store_true")
+    parser.add_argument("--skip-precision", action="store_true", help="skip the float32 vs float64 comparison")
+    parser.add_argument("--skip-discriminator", action="store_true", help="skip the discriminator variants")
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="earlier result JSON to compare against")
+    args = parser.parse_args()
+
+    logging.getLogger("radar").setLevel(logging.ERROR)  # CRC16 mismatches are expected at low SNR
+    config = _apply_overrides(load_config(args.config), args.set)
+    _, center_freq, channels = calculate_channel_plan(config)
+    config["center_frequency_hz"] = center_freq
+    offsets = [off for _, off in channels]
+    args.buffer_size = args.buffer_size or config["processing"]["buffer_size"]
+
+    gen = SignalGenerator(config, seed=args.seed)
+    # a frame is ~100 symbols on average, the gap before it ~220
+    n_frames = max(1, int(args.seconds * gen.symbol_rate / 320))
+    iq, _ = gen.burst_train(gen.random_frames(n_frames), offset_hz=offsets[0], idle=args.idle, snr_db=15,
+                            cfo_hz=args.cfo, jammer_hz=args.jammer_hz, jammer_db=args.jammer_db)
+
+    demod = config["demodulation"]
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "machine": platform.machine(),
+            "signal_seconds": len(iq) / gen.sample_rate,
+            "idle": args.idle,
+            "settings": {key: demod.get(key) for key in ("decimation", "timing_recovery", "level_tracking",
+                                                         "filter_backend", "rrc_num_taps", "precision",
+                                                         "discriminator")},
+        }
+    }
+    print(f"commit {results['meta']['commit']}, {len(iq) / gen.sample_rate:.2f} s of IQ, "
+          f"buffers of {args.buffer_size}, {len(offsets)} channel(s)")
+
+    results["throughput"] = bench_throughput(config, iq, offsets, args.buffer_size, args.repeat)
+    print("throughput: " + ", ".join(f"{k} {v:.3g}" for k, v in results["throughput"].items()))
+    results["stages"] = bench_stages(config, iq, offsets[0], args.buffer_size)
+    print("stages (ms/buffer): " + ", ".join(f"{k[:-3]} {v:.3f}" for k, v in results["stages"].items()
+                                             if k.endswith("_ms")))
+    results["decoder"] = bench_decoder(config, iq, offsets[0], args.buffer_size, args.repeat)
+    print(f"decoder: {results['decoder']['packets_per_s']:.0f} packets/s, "
+          f"{results['decoder']['mbit_per_s']:.1f} Mbit/s")
+    if not args.skip_discriminator:
+        print("discriminator variants:")
+        results["discriminator"] = bench_discriminators(config, args, iq, offsets)
+    if not args.skip_per:
+        print("packet error rate:")
+        results["per"] = bench_per(config, args, offsets[0])
+    if not args.skip_precision:
+        print("float32 vs float64:")
+        results["precision"] = bench_precision(config, args, iq, offsets)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# ============================================================================
+# Burst detector: soft-symbol quality gate in front of the packet decoder
+# ============================================================================
+# After the FM discriminator the signal amplitude is gone, and absolute power
+# depends on gain/AGC, so bursts are detected from the soft symbols instead:
+# inside a burst every RRC-filtered symbol sits close to one of the four
+# 4-FSK levels, while on noise the distance to the nearest level is spread
+# over the whole level spacing. The per-symbol squared error (relative to
+# fsk_dev) is averaged over a window starting at each bit; a frame may only
+# start where that average is below `max_evm`. The window (32 symbols by
+# default) is shorter than the smallest frame (9 bytes = 36 symbols), so a
+# real frame always fills it. Errors are quantised to integers so the window
+# sums are exact and the gate does not depend on how the stream was split.
+# ============================================================================
+import numpy as np
+
+QUALITY_SCALE = 256   # quality units per fsk_dev^2
+QUALITY_MAX = 4095    # clamp for samples far outside the outer levels
+# smallest frame: 9 bytes = 36 symbols. A longer window is never filled by a
+# short frame, and the decoder needs a flag for every start position that has
+# a full minimal frame behind it (active() gives one per full window)
+MAX_WINDOW_SYMBOLS = 9 * 4
+
+
+class BurstDetector:
+    def __init__(self, fsk_dev: float, window_symbols: int = 32, max_evm: float = 0.2):
+        """
+        Args:
+            fsk_dev: FSK deviation (Hz); levels are -3, -1, 1, 3 x fsk_dev
+            window_symbols: averaging window for the quality measure, at most
+                            MAX_WINDOW_SYMBOLS (ValueError otherwise)
+            max_evm: highest mean squared error (in fsk_dev^2) that still counts as a burst
+        """
+        if not 1 <= int(window_symbols) <= MAX_WINDOW_SYMBOLS:
+            raise ValueError(f"burst_gate.window_symbols must be 1..{MAX_WINDOW_SYMBOLS} "
+                             f"(shorter than the smallest frame), got {window_symbols}")
+        self.fsk_dev = float(fsk_dev)
+        self.window_bits = 2 * int(window_symbols)
+        self.max_evm = float(max_evm)
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """None unless decoder.burst_gate.enabled is set."""
+        gate = config.get("decoder", {}).get("burst_gate", {})
+        if not gate.get("enabled", False):
+            return None
+        return cls(config["demodulation"]["fsk_deviation_hz"],
+                   window_symbols=gate.get("window_symbols", 32),
+                   max_evm=gate.get("max_evm", 0.2))
+
+    def quality(self, soft: np.ndarray) -> np.ndarray:
+        """Per-bit squared distance to the nearest 4-FSK level (QUALITY_SCALE units of fsk_dev^2)."""
+        # distance to the odd-integer grid -3, -1, 1, 3 (clamped outside the outer levels)
+        u = np.asarray(soft, dtype=np.float64) / self.fsk_dev
+        nearest = np.clip(2 * np.floor(u / 2) + 1, -3, 3)
+        err = np.minimum((u - nearest) ** 2 * QUALITY_SCALE, QUALITY_MAX).astype(np.uint16)
+        return np.repeat(err, 2)
+
+    def active(self, quality: np.ndarray) -> np.ndarray:
+        """
+        For every start position p with a full window behind it
+        (len(quality) - window_bits + 1 of them): mean quality over
+        [p, p + window_bits) below the threshold.
+        """
+        w = self.window_bits
+        if len(quality) < w:
+            return np.zeros(0, dtype=bool)
+        csum = np.concatenate(([0], np.cumsum(quality, dtype=np.int64)))
+        return (csum[w:] - csum[:-w]) < self.max_evm * QUALITY_SCALE * w
@@ -1,10 +1,24 @@
 ﻿# ============================================================================
-# DSP processor: DDC + LPF + 4-RRC-FSK demod
+# DSP processor: DDC + decimating LPF + 4-RRC-FSK demod
 # ============================================================================
+import collections
+import functools
+import math
+from fractions import Fraction
+
 import numpy as np
+import scipy.fft as sp_fft
 import scipy.signal as signal
 import logging
 
+from metrics import NULL_CLOCK, REGISTRY
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 
 class DSPProcessor:
     def __init__(self, config: dict):
@@ -18,80 +32,1145 @@ class DSPProcessor:
 
         self.samples_per_symbol = int(round(self.sample_rate / self.symbol_rate))
 
+        # Symbol timing: "fixed" samples at a constant offset (needs an integer
+        # number of samples per symbol), "oerder_meyr" estimates the sampling
+        # phase from the signal and interpolates, any sps >= 2 after decimation.
+        # Its estimate averages the last few blocks whatever they hold, so with
+        # the carrier keyed off between bursts it is pulled by the idle noise:
+        # "auto" keeps fixed timing whenever the sps allows it.
+        self.timing_recovery = config["demodulation"].get("timing_recovery", "auto")
+        self.timing_block_symbols = int(config["demodulation"].get("timing_block_symbols", 32))
+        self.timing_window_blocks = int(config["demodulation"].get("timing_window_blocks", 4))
+        if self.timing_recovery not in ("auto", "fixed", "oerder_meyr"):
+            raise ValueError(f"unknown timing_recovery: {self.timing_recovery}")
+
+        # Decision levels: with level_tracking the carrier/DC offset and the
+        # actual deviation are estimated from recent bursts instead of using
+        # the nominal -3,-1,1,3 x fsk_dev.
+        self.level_tracking = bool(config["demodulation"].get("level_tracking", False))
+        self.level_block_symbols = int(config["demodulation"].get("level_block_symbols", 1024))
+        self.level_window_blocks = int(config["demodulation"].get("level_window_blocks", 4))
+        self.level_max_age_blocks = int(config["demodulation"].get("level_max_age_blocks", 32))
+        self.level_max_spread = float(config["demodulation"].get("level_max_spread", 0.15))
+
+        # Decimation after the channel LPF: discriminator and RRC run at
+        # sample_rate / decimation, i.e. samples_per_symbol / decimation sps.
+        self.decimation = int(config["demodulation"].get("decimation", 1))
+        if self.decimation < 1:
+            raise ValueError(f"decimation={self.decimation} must be >= 1")
+        self.output_rate = self.sample_rate / self.decimation
+        if self.timing_recovery == "auto":
+            integer_sps = (abs(self.sample_rate / self.symbol_rate - self.samples_per_symbol) <= 1e-9
+                           and self.samples_per_symbol % self.decimation == 0)
+            self.timing_recovery = "fixed" if integer_sps else "oerder_meyr"
+        if self.timing_recovery == "fixed":
+            if abs(self.sample_rate / self.symbol_rate - self.samples_per_symbol) > 1e-9:
+                raise ValueError(
+                    f"fixed timing needs an integer samples per symbol "
+                    f"({self.sample_rate / self.symbol_rate:g}), use timing_recovery=oerder_meyr"
+                )
+            if self.samples_per_symbol % self.decimation:
+                raise ValueError(
+                    f"decimation={self.decimation} must divide samples_per_symbol={self.samples_per_symbol}"
+                )
+            self.output_sps = self.samples_per_symbol // self.decimation
+        else:
+            self.output_sps = self.output_rate / self.symbol_rate
+            if self.output_sps < 2:
+                raise ValueError(f"timing recovery needs >= 2 samples per symbol after decimation "
+                                 f"(got {self.output_sps:g})")
+        if self.filter_bw / 2.0 > self.output_rate / 2.0:
+            self.logger.warning(
+                f"filter_bandwidth_hz={self.filter_bw} exceeds the decimated Nyquist band "
+                f"({self.output_rate / 1e3:.0f} kHz), expect aliasing"
+            )
+
+        # FIR backend for the LPF / RRC stages (see _FIRFilter); "auto" picks
+        # direct or FFT convolution per buffer from the tap count and block size
+        self.filter_backend = config["demodulation"].get("filter_backend", "auto")
+        if self.filter_backend not in FILTER_BACKENDS:
+            raise ValueError(f"unknown filter_backend: {self.filter_backend}")
+
+        # Sample precision of the chain: "float64", or "float32" for complex64
+        # samples and float32 phase / frequency / soft symbols from the LO to
+        # the slicer. Designs stay float64 and are cast once per filter; symbol
+        # times and the timing / level estimates are always float64.
+        self.precision = config["demodulation"].get("precision", "float64")
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"unknown precision: {self.precision}")
+        self.real_dtype = np.dtype(self.precision)
+        self.complex_dtype = np.result_type(self.real_dtype, np.complex64)
+
+        # FM discriminator (see _SymbolDemod): "phase_diff" (arctan2 per sample,
+        # wrapped difference), "conj_product" (one arctan2 of x[n]*conj(x[n-1])),
+        # "fused" (one compiled numba call doing derotation, discriminator and
+        # RRC); "auto" is fused when numba is installed, else conj_product.
+        self.discriminator = config["demodulation"].get("discriminator", "auto")
+        if self.discriminator not in DISCRIMINATORS:
+            raise ValueError(f"unknown discriminator: {self.discriminator}")
+        if self.discriminator == "auto":
+            self.discriminator = "fused" if NUMBA_AVAILABLE else "conj_product"
+        elif self.discriminator == "fused" and not NUMBA_AVAILABLE:
+            self.logger.warning("numba not installed, discriminator falls back to conj_product")
+            self.discriminator = "conj_product"
+        if self.discriminator == "fused":
+            # compile (or load from numba's cache) now, not on the first buffer
+            c, r = self.complex_dtype, self.real_dtype
+            _discriminator_rrc(np.zeros(2, c), c.type(0), c.type(1), r.type(1),
+                               np.zeros(2, r), np.zeros(3, r), np.zeros(2, r))
+
         # pre-design filters
         self.taps = self._design_lpf()
         self.rrc_taps = self._design_rrc()
 
     def _design_lpf(self):
-        cutoff = self.filter_bw / 2.0
-        nyquist = self.sample_rate / 2.0
-        num_taps = 101
-        return signal.firwin(num_taps, cutoff / nyquist, window="hamming")
+        return _lpf_design(self.sample_rate, self.filter_bw, 101)
 
     def _design_rrc(self):
-        alpha = self.rrc_alpha
-        sps = self.samples_per_symbol
-        num_taps = int(self.rrc_num_taps)
+        # RRC runs after decimation; keep the configured span in symbols.
+        return _rrc_design(self.rrc_alpha, float(self.output_sps), int(round(self.rrc_num_taps / self.decimation)))
+
+    def open_channel(self, freq_shift_hz: float, sample_offset: int = 0) -> "ChannelStream":
+        """
+        Create a stateful demodulator for one channel (streaming mode).
+        `sample_offset` is the index of the first input sample within the whole
+        capture, for streams that start part way through a recording.
+        """
+        return ChannelStream(self, freq_shift_hz, sample_offset)
+
+    def process_channel(self, wideband_samples: np.ndarray, freq_shift_hz: float, soft_output: bool = False):
+        # One-shot mode: a fresh stream fed a single buffer.
+        # soft_output=True returns (bits, per-bit reliabilities) instead of bits.
+        stream = ChannelStream(self, freq_shift_hz)
+        bits = stream.process(wideband_samples)
+        return (bits, stream.bit_reliabilities) if soft_output else bits
+
+    def open_channelizer(self, freq_shifts_hz, sample_offset: int = 0) -> "Channelizer":
+        """Create a stateful one-pass demodulator for several channel offsets."""
+        return Channelizer(self, freq_shifts_hz, sample_offset)
+
+    def process_channels(self, wideband_samples: np.ndarray, freq_shifts_hz, soft_output: bool = False) -> list:
+        # One-shot multi-channel mode: one shared filter bank pass per buffer.
+        channelizer = Channelizer(self, freq_shifts_hz)
+        bits = channelizer.process(wideband_samples)
+        return list(zip(bits, channelizer.bit_reliabilities)) if soft_output else bits
+
+
+# Designs and LO tables depend only on their parameters; they are shared
+# (read-only) between every processor, stream and channelizer of the process.
+
+@functools.lru_cache(maxsize=32)
+def _lpf_design(sample_rate: float, filter_bw: float, num_taps: int) -> np.ndarray:
+    cutoff = filter_bw / 2.0
+    nyquist = sample_rate / 2.0
+    taps = signal.firwin(num_taps, cutoff / nyquist, window="hamming")
+    taps.setflags(write=False)
+    return taps
+
+
+@functools.lru_cache(maxsize=32)
+def _rrc_design(alpha: float, sps: float, num_taps: int) -> np.ndarray:
+    # Use exact num_taps length, symmetric around 0.
+    if num_taps % 2 == 0:
+        t = (np.arange(-num_taps / 2 + 0.5, num_taps / 2 + 0.5, dtype=np.float64) / sps)
+    else:
+        t = (np.arange(-(num_taps // 2), num_taps // 2 + 1, dtype=np.float64) / sps)
+    center = t == 0.0
+    edge = (np.abs(t) == 1.0 / (4 * alpha)) if alpha != 0 else np.zeros(len(t), dtype=bool)
+    ti = np.where(center | edge, 1.0, t)   # placeholders, overwritten below
+    with np.errstate(divide="ignore", invalid="ignore"):
+        taps = ((np.sin(np.pi * ti * (1 - alpha)) + 4 * alpha * ti * np.cos(np.pi * ti * (1 + alpha)))
+                / (np.pi * ti * (1 - (4 * alpha * ti) ** 2)))
+    taps[center] = 1.0 - alpha + (4 * alpha / np.pi)
+    if edge.any():
+        taps[edge] = (alpha / np.sqrt(2)) * (
+            (1 + 2 / np.pi) * np.sin(np.pi / (4 * alpha))
+            + (1 - 2 / np.pi) * np.cos(np.pi / (4 * alpha))
+        )
+    taps = taps / np.sum(taps)
+    taps.setflags(write=False)
+    return taps
+
+
+def _lo_period(freq_shift_hz: float, sample_rate: float, max_period: int = 1 << 24) -> int:
+    # Number of samples after which the LO phase repeats exactly (0 = never / too long).
+    ratio = Fraction(freq_shift_hz) / Fraction(sample_rate)
+    return ratio.denominator if ratio.denominator <= max_period else 0
+
+
+LO_TABLE_MAX_PERIOD = 1 << 16
+
+
+@functools.lru_cache(maxsize=64)
+def _lo_table(freq_shift_hz: float, sample_rate: float, length: int, dtype=np.complex128) -> np.ndarray:
+    """
+    exp(-j*2*pi*f*n/fs) for n in [0, period - 1 + length): any `length`
+    samples starting inside the first LO period are one contiguous slice.
+    Phases are reduced exactly (integer n*p mod q for f/fs = p/q), the table
+    is computed in double and stored as `dtype`.
+    """
+    ratio = Fraction(freq_shift_hz) / Fraction(sample_rate)
+    p, q = ratio.numerator, ratio.denominator
+    n = np.arange(q - 1 + length, dtype=np.int64)
+    table = np.exp(-2j * np.pi * ((n % q) * p % q) / q).astype(dtype, copy=False)
+    table.setflags(write=False)
+    return table
+
+
+def _scratch(arr, n: int, dtype=np.float64):
+    # Reusable work array: `arr` itself while it holds n elements, else a bigger one.
+    if arr is None or len(arr) < n:
+        return np.empty(max(n, 2 * (0 if arr is None else len(arr))), dtype=dtype)
+    return arr
+
+
+class _HistoryBuffer:
+    """
+    Work buffer holding the last `hist_len` input samples followed by the
+    newest block, so FIR stages see one contiguous array without a
+    concatenate per call. The view returned by extend() stays valid until the
+    next call.
+    """
+
+    def __init__(self, hist_len: int, dtype=np.complex128):
+        self.hist_len = hist_len
+        self._buf = np.zeros(hist_len + 16384, dtype=dtype)
+        self._len = hist_len
+
+    def extend(self, x: np.ndarray) -> np.ndarray:
+        h, need = self.hist_len, self.hist_len + len(x)
+        history = self._buf[self._len - h:self._len]
+        if len(self._buf) < need:
+            buf = np.zeros(max(need, 2 * len(self._buf)), dtype=self._buf.dtype)
+            buf[:h] = history
+            self._buf = buf
+        elif h:
+            self._buf[:h] = history
+        self._buf[h:need] = x
+        self._len = need
+        return self._buf[:need]
+
+
+FILTER_BACKENDS = ("auto", "lfilter", "direct", "oaconvolve", "overlap_save")
+PRECISIONS = ("float64", "float32")
+DISCRIMINATORS = ("auto", "phase_diff", "conj_product", "fused")
+
+# Cost model for backend="auto" (ns, single core, indexed by complex input):
+#   direct       : n_out * (DIRECT_NS_PER_TAP * taps + DIRECT_NS_PER_OUTPUT)
+#   overlap_save : FFT_CALL_NS + blocks * nfft * log2(nfft) * FFT_NS
+# Only the crossover matters; with 16k buffers the FFT path wins for the
+# complex LPF branches and the real RRC is close to even.
+DIRECT_NS_PER_TAP = (0.095, 0.22)
+DIRECT_NS_PER_OUTPUT = (10.0, 17.0)
+FFT_NS = (0.7, 1.8)
+FFT_CALL_NS = 40e3
+OVERLAP_SAVE_GROUP = 1 << 14  # input samples transformed per batch of FFT blocks
 
-        # Use exact num_taps length, symmetric around 0.
-        if num_taps % 2 == 0:
-            t = (np.arange(-num_taps / 2 + 0.5, num_taps / 2 + 0.5, dtype=np.float64) / sps)
+
+class _FIRFilter:
+    """
+    Streaming FIR y[n] = sum_l h[l] * x[n - l] with a selectable backend:
+
+      lfilter      : scipy direct form, state in zi
+      direct       : np.convolve over [history | block]
+      oaconvolve   : scipy overlap-add FFT convolution over [history | block]
+      overlap_save : FFT blocks of a fixed size, tap spectrum cached per size
+
+    All backends but lfilter keep the last len(taps)-1 inputs as state, so
+    "auto" may choose per call (from the tap count and the block size) and the
+    stream stays continuous. Outputs agree to float rounding. valid() filters
+    a buffer that already starts with its own history (polyphase branches).
+
+    `dtype` is the sample type (float32 / complex64 for single precision);
+    the taps are cast to the matching real type once. scipy's lfilter works
+    in double, its output is cast back.
+    """
+
+    def __init__(self, taps: np.ndarray, backend: str = "auto", dtype=np.float64):
+        if backend not in FILTER_BACKENDS:
+            raise ValueError(f"unknown filter backend: {backend}")
+        self.dtype = np.dtype(dtype)
+        self.taps = np.asarray(taps, dtype=np.finfo(self.dtype).dtype)
+        self.backend = backend
+        self._spectra = {}  # (nfft, real input) -> tap spectrum
+        self._padded = None  # overlap-save work arrays
+        self._blocks = None
+        self.reset()
+
+    def reset(self):
+        self._zi = np.zeros(len(self.taps) - 1, dtype=self.dtype)
+        self._hist = _HistoryBuffer(len(self.taps) - 1, self.dtype)
+
+    def choose(self, n_out: int, is_complex: bool) -> str:
+        """Backend for n_out outputs: the configured one, or the cheaper of direct / overlap_save."""
+        if self.backend != "auto":
+            return self.backend
+        m, c = len(self.taps), int(is_complex)
+        nfft = self._fft_size(n_out)
+        blocks = -(-n_out // (nfft - m + 1))
+        direct = n_out * (DIRECT_NS_PER_TAP[c] * m + DIRECT_NS_PER_OUTPUT[c])
+        fft = FFT_CALL_NS + blocks * nfft * math.log2(nfft) * FFT_NS[c]
+        return "overlap_save" if fft < direct else "direct"
+
+    def _fft_size(self, n_out: int) -> int:
+        # ~8x the filter length keeps the discarded overlap small; never more than one block needs
+        m = len(self.taps)
+        return sp_fft.next_fast_len(min(max(8 * m, 1024), n_out + m - 1))
+
+    def _spectrum(self, nfft: int, real: bool) -> np.ndarray:
+        key = (nfft, real)
+        if key not in self._spectra:
+            self._spectra[key] = (sp_fft.rfft if real else sp_fft.fft)(self.taps, nfft)
+        return self._spectra[key]
+
+    def _overlap_save(self, buf: np.ndarray) -> np.ndarray:
+        # the result is a view of a work array, valid until the next call
+        m = len(self.taps)
+        n_out = len(buf) - m + 1
+        nfft = self._fft_size(n_out)
+        step = nfft - m + 1
+        blocks = -(-n_out // step)
+        n_padded = (blocks - 1) * step + nfft
+        self._padded = _scratch(self._padded, n_padded, buf.dtype)
+        padded = self._padded[:n_padded]
+        padded[:len(buf)] = buf
+        padded[len(buf):] = 0
+        segments = np.lib.stride_tricks.sliding_window_view(padded, nfft)[::step]
+        real = not np.iscomplexobj(buf)
+        spectrum = self._spectrum(nfft, real)
+        self._blocks = _scratch(self._blocks, blocks * step, buf.dtype)
+        out = self._blocks[:blocks * step].reshape(blocks, step)
+        # a few blocks at a time, so the FFT work set stays in cache
+        group = max(1, OVERLAP_SAVE_GROUP // nfft)
+        for b in range(0, blocks, group):
+            seg = segments[b:b + group]
+            # scipy.fft has no out=: the spectra are the only arrays created here
+            if real:
+                z = sp_fft.rfft(seg, axis=1)
+                z *= spectrum
+                y = sp_fft.irfft(z, nfft, axis=1, overwrite_x=True)
+            else:
+                z = sp_fft.fft(seg, axis=1)
+                z *= spectrum
+                y = sp_fft.ifft(z, axis=1, overwrite_x=True)
+            # the first m-1 outputs of every block are circular wrap-around
+            out[b:b + group] = y[:, m - 1:]
+        return out.reshape(-1)[:n_out]
+
+    def valid(self, buf: np.ndarray, backend: str = None, out: np.ndarray = None) -> np.ndarray:
+        """
+        The len(buf) - len(taps) + 1 outputs that only use samples inside buf,
+        written to `out` when given. overlap_save returns a view of its work
+        array (valid until the next call); the other backends a new array.
+        """
+        n_out = len(buf) - len(self.taps) + 1
+        if n_out <= 0:
+            return np.zeros(0, dtype=buf.dtype)
+        backend = backend or self.choose(n_out, np.iscomplexobj(buf))
+        if backend == "overlap_save":
+            y = self._overlap_save(buf)
+        elif backend == "oaconvolve":
+            y = signal.oaconvolve(buf, self.taps, mode="valid")
+        elif backend == "lfilter":
+            y = signal.lfilter(self.taps, 1.0, buf)[len(self.taps) - 1:].astype(buf.dtype, copy=False)
         else:
-            t = (np.arange(-(num_taps // 2), num_taps // 2 + 1, dtype=np.float64) / sps)
-        taps = np.zeros_like(t)
-        for i, ti in enumerate(t):
-            if ti == 0.0:
-                taps[i] = 1.0 - alpha + (4 * alpha / np.pi)
-            elif alpha != 0 and abs(ti) == 1.0 / (4 * alpha):
-                taps[i] = (alpha / np.sqrt(2)) * (
-                    (1 + 2 / np.pi) * np.sin(np.pi / (4 * alpha))
-                    + (1 - 2 / np.pi) * np.cos(np.pi / (4 * alpha))
-                )
+            y = np.convolve(buf, self.taps, mode="valid")
+        if out is None:
+            return y
+        out[:] = y
+        return out
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        """Filter the next block of the stream; one output per input."""
+        backend = self.choose(len(x), np.iscomplexobj(x))
+        if backend == "lfilter":
+            y, self._zi = signal.lfilter(self.taps, 1.0, x, zi=self._zi)
+            return y.astype(self.dtype, copy=False)
+        return self.valid(self._hist.extend(x), backend)
+
+
+class _PolyphaseDecimator:
+    """
+    Stateful polyphase FIR decimator. The taps are split into `factor`
+    branches, each branch runs at the output rate on its decimated input
+    phase, so only every `factor`-th filter output is ever computed. The
+    input history and output phase are kept so consecutive buffers form one
+    continuous stream.
+    """
+
+    def __init__(self, taps: np.ndarray, factor: int, backend: str = "auto", dtype=np.complex128):
+        self.factor = factor
+        self._branch_len = -(-len(taps) // factor)
+        padded = np.zeros(self._branch_len * factor)
+        padded[:len(taps)] = taps
+        # branch r holds taps r, r+D, r+2D, ...
+        self._branches = [_FIRFilter(padded[r::factor], backend, dtype) for r in range(factor)]
+        self._span = len(padded)
+        self._dtype = dtype
+        self._hist = _HistoryBuffer(self._span - 1, dtype)
+        self._out = None
+        self._phase = 0  # position of the next output relative to the next input sample
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        d, q = self.factor, self._branch_len
+        buf = self._hist.extend(x)
+        # first wanted output sits at buf index m0 (full filter history available)
+        m0 = self._span - 1 + self._phase
+        n_out = (len(buf) - 1 - m0) // d + 1 if len(buf) > m0 else 0
+        self._phase = m0 + n_out * d - len(buf)
+
+        # y[m0 + k*d] = sum_r sum_i h[i*d + r] * buf[m0 + (k - i)*d - r]
+        self._out = _scratch(self._out, n_out, self._dtype)
+        out = self._out[:n_out]
+        if n_out == 0:
+            return out
+        for r, branch in enumerate(self._branches):
+            start = m0 - r - (q - 1) * d
+            phase_input = buf[start:start + (n_out + q - 1) * d:d]
+            if r == 0:
+                branch.valid(phase_input, out=out)
             else:
-                numerator = np.sin(np.pi * ti * (1 - alpha)) + 4 * alpha * ti * np.cos(
-                    np.pi * ti * (1 + alpha)
-                )
-                denominator = np.pi * ti * (1 - (4 * alpha * ti) ** 2)
-                taps[i] = numerator / denominator
+                out += branch.valid(phase_input)
+        return out
 
-        taps = taps / np.sum(taps)
-        return taps.astype(np.float64)
 
-    def process_channel(self, wideband_samples: np.ndarray, freq_shift_hz: float) -> np.ndarray:
-        if len(wideband_samples) == 0:
-            return np.array([])
+# atan(a), 0 <= a <= 1: Abramowitz & Stegun 4.4.49, |error| <= 2e-8 rad
+_ATAN_COEFFS = (-0.3333314528, 0.1999355085, -0.1420889944, 0.1065626393,
+                -0.0752896400, 0.0429096138, -0.0161657367, 0.0028662257)
+
+
+def _atan2(y, x):
+    # polynomial atan2 for the compiled discriminator (libm atan2 is several
+    # times slower there than NumPy's vectorized arctan2)
+    ax, ay = abs(x), abs(y)
+    hi, lo = max(ax, ay), min(ax, ay)
+    a = lo / hi if hi > 0 else 0.0
+    s = a * a
+    p = _ATAN_COEFFS[-1]
+    for k in range(len(_ATAN_COEFFS) - 2, -1, -1):
+        p = p * s + _ATAN_COEFFS[k]
+    r = a * (1.0 + s * p)
+    if ay > ax:
+        r = 0.5 * math.pi - r
+    if x < 0:
+        r = math.pi - r
+    return -r if y < 0 else r
+
+
+def _discriminator_rrc_py(x, prev, rotation, scale, taps_rev, buf, out):
+    # For every input: z = x[i] * conj(x[i-1]) * rotation (x[-1] = prev),
+    # f = angle(z) * scale into buf after the len(taps)-1 previous values,
+    # then out[i] = sum_l taps[l] * f[i-l] as a forward dot product with the
+    # reversed taps. Two loops over the same (cached) block so the FIR one
+    # vectorizes. Ends with the newest len(taps)-1 values moved to the front
+    # of buf, the state for the next call.
+    m = len(taps_rev) - 1
+    n = len(x)
+    for i in range(n):
+        z = x[i] * prev.conjugate() * rotation
+        prev = x[i]
+        buf[m + i] = _atan2(z.imag, z.real) * scale
+    for i in range(n):
+        acc = taps_rev[0] * buf[i]   # accumulates in the sample type
+        for k in range(1, m + 1):
+            acc += taps_rev[k] * buf[i + k]
+        out[i] = acc
+    for k in range(m):
+        buf[k] = buf[n + k]
+
+
+if NUMBA_AVAILABLE:
+    # reassociation lets the tap loop use SIMD; no finite-math assumptions
+    _atan2 = njit(inline="always")(_atan2)
+    _discriminator_rrc = njit(cache=True, fastmath={"reassoc", "contract"})(_discriminator_rrc_py)
+
+
+class _TimingRecovery:
+    """
+    Feedforward symbol timing (Oerder & Meyr) for the RRC output.
+
+    The stream is cut into fixed blocks of ~`block_symbols` symbols, counted
+    from the start of the capture. For every block the symbol-rate line of y^2,
+        X_b = sum_n y[n]^2 * exp(-j*2*pi*n/sps)    (n = global sample index)
+    is summed over the last `window_blocks` blocks; its phase gives the
+    sampling grid mu + k*sps. A block emits the grid points from sps/2 past
+    the previous block's last grid point up to its own end, cubic (Lagrange)
+    interpolated, so drift between blocks neither drops nor repeats a symbol.
+    All complete blocks of a call are handled at once, and every block only
+    depends on the last window, so the output does not depend on how the
+    stream is split into buffers. Symbols are released one block (plus two
+    samples) late. Samples and interpolated values are `dtype`; the line
+    sums and the grid (mu, symbol times) are always float64.
+    """
+
+    def __init__(self, sps: Fraction, block_symbols: int, window_blocks: int, start_index: int = 0,
+                 dtype=np.float64):
+        self.sps = float(sps)
+        self.block_len = max(4, int(round(block_symbols * self.sps)))
+        self.window_blocks = max(1, int(window_blocks))
+        # exp(-j*2*pi*n/sps) repeats every p samples when sps = p/q
+        sps = Fraction(sps).limit_denominator(1 << 16)
+        self.dtype = np.dtype(dtype)
+        # reference of global index n: entry n % p of these, laid out so a
+        # block starting anywhere is one slice (see _reference)
+        p, step = sps.numerator, sps.denominator
+        phase = 2 * np.pi * (np.arange(p) * step % p) / p
+        self._ref_period = p
+        self._ref_cos, self._ref_sin = np.cos(phase), np.sin(phase)
+        self._start_index = start_index
+        # samples kept before the block: first symbol may sit sps/2 early, plus cubic history
+        self._history = int(math.ceil(self.sps / 2)) + 2
+        self._y2 = self._re = self._im = None  # line-sum work arrays
+        self.reset()
+
+    def reset(self):
+        # history + samples not yet consumed, held at the front of one growing array
+        self._pending = np.zeros(self._history + 16384, dtype=self.dtype)
+        self._pending_len = self._history
+        self._pending_start = self._start_index - self._history
+        self._block_start = self._start_index
+        self._block_end = (self._start_index // self.block_len + 1) * self.block_len
+        self._lines = np.zeros(self.window_blocks - 1, dtype=np.complex128)  # previous block lines
+        self._prev_last = -np.inf  # last grid point of the previous block
+
+    def _reference(self, first: int, n: int):
+        # cos / sin reference of global indices first .. first + n - 1, as views
+        p = self._ref_period
+        if len(self._ref_cos) < p - 1 + n:
+            reps = -(-(p - 1 + max(n, 2 * len(self._ref_cos))) // p)
+            self._ref_cos = np.tile(self._ref_cos[:p], reps)
+            self._ref_sin = np.tile(self._ref_sin[:p], reps)
+        k = first % p
+        return self._ref_cos[k:k + n], self._ref_sin[k:k + n]
+
+    def _block_lines(self, y: np.ndarray, first: int, sizes: list) -> np.ndarray:
+        # X_b for consecutive blocks of y (starting at global index `first`),
+        # squared and mixed in float64 in work arrays; always reduced as rows
+        # of a 2-D array so the result never depends on batching
+        n = len(y)
+        self._y2 = _scratch(self._y2, n)
+        self._re = _scratch(self._re, n)
+        self._im = _scratch(self._im, n)
+        y2, re, im = self._y2[:n], self._re[:n], self._im[:n]
+        np.multiply(y, y, out=y2, dtype=np.float64)
+        ref_cos, ref_sin = self._reference(first, n)
+        np.multiply(y2, ref_cos, out=re)
+        np.multiply(y2, ref_sin, out=im)
+        out, pos = [], 0
+        for size, count in sizes:
+            part = slice(pos, pos + size * count)
+            out.append(re[part].reshape(count, size).sum(axis=1)
+                       - 1j * im[part].reshape(count, size).sum(axis=1))
+            pos += size * count
+        return np.concatenate(out)
+
+    def process(self, y: np.ndarray):
+        """Returns (symbol values, symbol times as global sample indices)."""
+        n = self._pending_len + len(y)
+        if len(self._pending) < n:
+            grown = np.zeros(max(n, 2 * len(self._pending)), dtype=self.dtype)
+            grown[:self._pending_len] = self._pending[:self._pending_len]
+            self._pending = grown
+        self._pending[self._pending_len:n] = y
+        self._pending_len = n
+        # a block is complete once two samples past its end are in (interpolator)
+        last_end = self._pending_start + n - 2
+        if last_end < self._block_end:
+            return np.zeros(0, dtype=self.dtype), np.zeros(0)
+        L, sps, p0 = self.block_len, self.sps, self._pending_start
+        n_blocks = 1 + (last_end - self._block_end) // L
+        ends = self._block_end + L * np.arange(n_blocks)
+        starts = np.concatenate(([self._block_start], ends[:-1]))
 
-        # 1) DDC to baseband
-        t = np.arange(len(wideband_samples))
-        lo = np.exp(-1j * 2 * np.pi * (freq_shift_hz / self.sample_rate) * t)
-        baseband = wideband_samples * lo
+        # per-block spectral line, summed over the window
+        y = self._pending[starts[0] - p0:ends[-1] - p0]
+        first_len = int(ends[0] - starts[0])
+        sizes = [(first_len, 1)] + ([(L, n_blocks - 1)] if n_blocks > 1 else [])
+        lines = np.concatenate((self._lines, self._block_lines(y, int(starts[0]), sizes)))
+        window = np.lib.stride_tricks.sliding_window_view(lines, self.window_blocks).sum(axis=1)
+        self._lines = lines[len(lines) - (self.window_blocks - 1):]
+        mu = (-np.angle(window) / (2 * np.pi)) % 1.0 * sps
 
-        # 2) LPF
-        filtered = signal.lfilter(self.taps, 1.0, baseband)
+        # grid points of each block: [previous block's last point + sps/2, block end)
+        k1 = np.ceil((ends - mu) / sps) - 1
+        last = mu + k1 * sps
+        prev_last = np.concatenate(([self._prev_last], last[:-1]))
+        self._prev_last = last[-1]
+        lo = np.where(np.isinf(prev_last), starts, prev_last + sps / 2)
+        k0 = np.ceil((lo - mu) / sps)
+        counts = np.maximum(k1 - k0 + 1, 0).astype(np.int64)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        t = np.repeat(mu, counts) + (np.repeat(k0, counts) + offsets) * sps
 
-        # 3) FM discriminator -> instantaneous frequency (Hz)
-        phase = np.angle(filtered)
-        dphi = np.angle(np.exp(1j * np.diff(phase)))
-        freq_inst = dphi * self.sample_rate / (2 * np.pi)
+        # 4-point Lagrange interpolation around floor(t)
+        i = np.floor(t).astype(np.int64)
+        f = (t - i).astype(self.dtype, copy=False)
+        i -= p0
+        p = self._pending
+        v = (-f * (f - 1) * (f - 2) / 6 * p[i - 1] + (f + 1) * (f - 1) * (f - 2) / 2 * p[i]
+             - (f + 1) * f * (f - 2) / 2 * p[i + 1] + (f + 1) * f * (f - 1) / 6 * p[i + 2])
 
-        # 4) RRC matched filter
-        freq_filt = signal.lfilter(self.rrc_taps, 1.0, freq_inst)
+        self._block_start, self._block_end = int(ends[-1]), int(ends[-1]) + L
+        drop = self._block_start - self._history - p0
+        keep = n - drop
+        self._pending[:keep] = self._pending[drop:n]
+        self._pending_len = keep
+        self._pending_start += drop
+        return v, t
 
-        # 5) symbol sampling
-        total_delay = (len(self.taps) - 1) // 2 + (len(self.rrc_taps) - 1) // 2
-        if total_delay >= len(freq_filt):
-            return np.array([])
 
-        idxs = np.arange(total_delay, len(freq_filt), self.samples_per_symbol)
-        sym_samples = freq_filt[idxs]
+class _LevelTracker:
+    """
+    Decision-directed estimate of the four 4-FSK levels (Hz) as actually
+    received: carrier/DC offset shifts all of them, the real deviation and
+    the band-limiting of the outer ones scale them.
+
+    Symbols are grouped into blocks of `block_len` samples of the global
+    symbol time grid. Once a block is complete, its burst symbols add their
+    per-level counts and sums to a window over the last `window_blocks`
+    blocks that held a burst, as long as they lie within `max_age_blocks`
+    blocks of the grid (sparse bursts keep their estimate across the idle
+    blocks between them; older sums are dropped). A symbol counts as burst
+    when its distance to the nearest level hardly varies over +-`smooth`
+    symbols, which a constant offset does not disturb. The level means over
+    that window set the levels for the following blocks; without a plausible
+    fit they fall back to the nominal ones. The levels therefore only depend
+    on the last `max_age_blocks` blocks, so a stream started that far back
+    (batch_decode warmup) and a single pass agree, and the output does not
+    depend on how the stream is split.
+    """
+
+    NOMINAL = np.array([-3.0, -1.0, 1.0, 3.0])
+    _EXTEND = 1e6   # end segments of the piecewise linear map, in level spacings
+    _NOMINAL_KNOTS = np.concatenate(([-3.0 - 2 * _EXTEND], NOMINAL, [3.0 + 2 * _EXTEND]))
+
+    def __init__(self, fsk_dev: float, block_len: int, window_blocks: int, max_age_blocks: int,
+                 max_spread: float, min_symbols: int = 32, smooth: int = 8):
+        self.fsk_dev = float(fsk_dev)
+        self.block_len = max(1, int(block_len))
+        self.window_blocks = max(1, int(window_blocks))
+        self.max_age_blocks = max(self.window_blocks, int(max_age_blocks))
+        self.max_spread = max_spread
+        self.min_symbols = min_symbols
+        self.smooth = smooth
+        self.reset()
+
+    def reset(self):
+        self._set_levels(self.NOMINAL * self.fsk_dev)
+        self._block = None     # block index of the symbols in _pending
+        self._pending = []
+        self._sums = collections.deque()  # (block index, count and sum of u for each level) per burst block
+
+    def _set_levels(self, levels: np.ndarray):
+        self.levels = levels
+        self._knots = np.concatenate(([levels[0] - self._EXTEND * (levels[1] - levels[0])], levels,
+                                      [levels[3] + self._EXTEND * (levels[3] - levels[2])]))
+
+    @property
+    def offset(self) -> float:
+        return float(self.levels.mean())
+
+    @property
+    def deviation(self) -> float:
+        return float(((self.levels[3] - self.levels[0]) / 6 + (self.levels[2] - self.levels[1]) / 2) / 2)
+
+    def _normalize(self, u: np.ndarray) -> np.ndarray:
+        # tracked levels -> -3, -1, 1, 3, end segments extended (far) past the outer levels
+        return np.interp(u, self._knots, self._NOMINAL_KNOTS)
+
+    def _block_sums(self, u: np.ndarray):
+        w = 2 * self.smooth + 1
+        if len(u) < w:
+            return None
+        z = self._normalize(u)
+        k = np.clip(np.floor(z / 2) + 2, 0, 3).astype(np.int64)   # nearest level index
+        d = z - self.NOMINAL[k]
+        # moving mean / mean square of d over w symbols
+        c = np.zeros((2, len(u) + 1))
+        np.cumsum(d, out=c[0, 1:])
+        np.cumsum(d * d, out=c[1, 1:])
+        mean, mean_sq = (c[:, w:] - c[:, :-w]) / w
+        sel = np.zeros(len(u), dtype=bool)
+        sel[self.smooth:len(u) - self.smooth] = mean_sq - mean * mean < self.max_spread
+        if sel.sum() < self.min_symbols:
+            return None
+        return np.concatenate((np.bincount(k[sel], minlength=4), np.bincount(k[sel], u[sel], minlength=4)))
+
+    def _close_block(self, next_block):
+        # levels for the blocks from next_block on: the last window_blocks burst
+        # blocks among the max_age_blocks blocks before it
+        if self._pending:
+            row = self._block_sums(np.concatenate(self._pending))
+            self._pending = []
+            if row is not None:
+                self._sums.append((self._block, row))
+        while self._sums and (len(self._sums) > self.window_blocks
+                              or self._sums[0][0] < next_block - self.max_age_blocks):
+            self._sums.popleft()
+        levels = self.NOMINAL * self.fsk_dev
+        if self._sums:
+            total = np.sum([row for _, row in self._sums], axis=0)
+            counts, sums = total[:4], total[4:]
+            if counts.min() >= 4:
+                fit = sums / counts
+                spacing = np.diff(fit)
+                # nominal levels if the fit is implausible
+                if spacing.min() > 0.5 * self.fsk_dev and spacing.max() < 4 * self.fsk_dev:
+                    levels = fit
+        self._set_levels(levels)
+
+    def process(self, values: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Soft symbols (Hz) at global sample times -> the same mapped onto the nominal levels."""
+        if len(values) == 0:
+            return values
+        blocks = np.floor(times / self.block_len).astype(np.int64)
+        cuts = (np.flatnonzero(np.diff(blocks)) + 1).tolist()
+        out = np.empty(len(values), dtype=values.dtype)
+        for s, e in zip([0] + cuts, cuts + [len(values)]):
+            if blocks[s] != self._block:
+                self._close_block(blocks[s])
+                self._block = blocks[s]
+            seg = values[s:e]
+            out[s:e] = self._normalize(seg) * self.fsk_dev
+            self._pending.append(seg.copy())
+        return out
+
+
+class _SymbolDemod:
+    """
+    Per-channel back end: FM discriminator -> RRC matched filter -> symbol
+    slicer, running at the decimated rate. Keeps the last phase sample, the RRC
+    filter state and the symbol timing offset between calls.
+
+    `phase_step` is a constant per-sample phase rotation (rad) left in the
+    input by the front end; it is removed inside the discriminator. The
+    discriminator variant is dsp.discriminator: all give the same frequency
+    up to float rounding, "fused" also runs the RRC in the same call.
+    `sample_offset` is the capture index of the first wideband input sample.
+    After each call `symbol_times` holds the wideband sample index of every
+    returned symbol (filter delays removed) and `symbol_values` its soft
+    value (RRC output, Hz; mapped onto the nominal levels when levels are
+    tracked); `bit_reliabilities` turns those into one reliability per
+    returned bit.
+    """
+
+    BIT_MAP = np.array([[0, 0], [0, 1], [1, 0], [1, 1]], dtype=np.uint8)
+
+    def __init__(self, dsp: DSPProcessor, phase_step: float = 0.0, sample_offset: int = 0):
+        self.dsp = dsp
+        self.phase_step = phase_step
+        if sample_offset % dsp.decimation:
+            raise ValueError(f"sample_offset={sample_offset} must be a multiple of decimation={dsp.decimation}")
+        # global (decimated) index of the first discriminator output
+        self._start_index = sample_offset // dsp.decimation
+        # LPF group delay expressed at the (decimated) discriminator rate
+        lpf_delay = int(round((len(dsp.taps) - 1) / 2 / dsp.decimation))
+        self._total_delay = lpf_delay + (len(dsp.rrc_taps) - 1) // 2
+        self._timing = None
+        if dsp.timing_recovery == "oerder_meyr":
+            sps = Fraction(dsp.sample_rate) / Fraction(dsp.symbol_rate) / dsp.decimation
+            self._timing = _TimingRecovery(sps, dsp.timing_block_symbols, dsp.timing_window_blocks,
+                                           self._start_index, dsp.real_dtype)
+        self._levels = None
+        if dsp.level_tracking:
+            self._levels = _LevelTracker(dsp.fsk_dev, round(dsp.level_block_symbols * dsp.output_sps),
+                                         dsp.level_window_blocks, dsp.level_max_age_blocks,
+                                         dsp.level_max_spread)
+        # 4-FSK levels -3,-1,1,3 (x fsk_dev): decision thresholds halfway between
+        self._thresholds = (np.array([-2.0, 0.0, 2.0]) * dsp.fsk_dev).astype(dsp.real_dtype)
+        # conj_product / fused: the residual rotation is one complex factor,
+        # rad/sample -> Hz one real factor
+        self._rotation = np.exp(-1j * phase_step).astype(dsp.complex_dtype)
+        self._scale = dsp.real_dtype.type(dsp.output_rate / (2 * np.pi))
+        self._fused = dsp.discriminator == "fused"
+        self._rrc_taps_rev = np.ascontiguousarray(dsp.rrc_taps[::-1], dtype=dsp.real_dtype)
+        self._phase = None
+        self._product = None
+        self._freq = None
+        self._column = None
+        self._fused_out = None
+        self.reset()
+
+    def reset(self):
+        self._rrc = _FIRFilter(self.dsp.rrc_taps, self.dsp.filter_backend, self.dsp.real_dtype)
+        # fused: RRC history (len(taps)-1 values) followed by the block being filtered
+        self._fused_buf = np.zeros(len(self._rrc_taps_rev) - 1 + 16384, dtype=self.dsp.real_dtype)
+        self._last_phase = None           # last LPF output phase, for the phase_diff discriminator
+        self._last_sample = None          # last LPF output, for conj_product / fused
+        self._next_symbol = self._total_delay  # index of next symbol in the next RRC output block
+        self._n_filtered = self._start_index   # global index of the next RRC output sample
+        self.symbol_times = np.zeros(0)
+        self.symbol_values = np.zeros(0)
+        if self._timing is not None:
+            self._timing.reset()
+        if self._levels is not None:
+            self._levels.reset()
+
+    @property
+    def estimated_offset_hz(self) -> float:
+        return self._levels.offset if self._levels is not None else 0.0
+
+    @property
+    def estimated_deviation_hz(self) -> float:
+        return self._levels.deviation if self._levels is not None else float(self.dsp.fsk_dev)
+
+    def process(self, filtered: np.ndarray) -> np.ndarray:
+        n = len(filtered)
+        self.symbol_times = self.symbol_values = np.zeros(0)
+        if n == 0:
+            return np.array([], dtype=np.uint8)
+        clock = REGISTRY.clock()
+
+        # 3-4) FM discriminator -> instantaneous frequency (Hz) -> RRC matched filter
+        freq_filt = self._matched_frequency(filtered, clock)
+        if len(freq_filt) == 0:
+            return np.array([], dtype=np.uint8)
+
+        # 5) symbol sampling (timing offset / pending block carried into the next buffer)
+        sps = self.dsp.output_sps
+        if self._timing is not None:
+            sym_samples, times = self._timing.process(freq_filt)
+        else:
+            # a copy: freq_filt is a work array, the symbols are handed out
+            sym_samples = freq_filt[self._next_symbol::sps].copy()
+            times = self._n_filtered + self._next_symbol + sps * np.arange(len(sym_samples))
+            self._next_symbol += len(sym_samples) * sps - len(freq_filt)
+        self._n_filtered += len(freq_filt)
+        clock.lap("timing")
+        if self._levels is not None:
+            sym_samples = self._levels.process(sym_samples, times)
+            clock.lap("levels")
+        self.symbol_times = (times - self._total_delay) * self.dsp.decimation
+        self.symbol_values = sym_samples
         if len(sym_samples) == 0:
-            return np.array([])
+            return np.array([], dtype=np.uint8)
 
         # 6) 4-FSK decision (00->-3, 01->-1, 10->1, 11->3)
-        # Use fixed decision levels in Hz based on spec (4-RRC-FSK mapping).
-        levels = np.array([-3, -1, 1, 3]) * self.fsk_dev
-
-        idx = np.argmin(np.abs(sym_samples.reshape(-1, 1) - levels.reshape(1, -1)), axis=1)
-        bit_map = np.array([[0, 0], [0, 1], [1, 0], [1, 1]], dtype=np.uint8)
-        bits = bit_map[idx].reshape(-1)
+        # Use fixed decision levels in Hz based on spec (4-RRC-FSK mapping),
+        # on samples already corrected for offset/deviation when tracking:
+        # nearest level == number of thresholds below the sample.
+        idx = np.searchsorted(self._thresholds, sym_samples)
+        bits = self.BIT_MAP[idx].reshape(-1)
+        clock.lap("slicer")
         return bits
+
+    def _matched_frequency(self, filtered: np.ndarray, clock=NULL_CLOCK) -> np.ndarray:
+        # RRC-filtered instantaneous frequency (Hz), one output per input
+        # (the very first input only sets the discriminator state)
+        if self._fused:
+            freq_filt = self._discriminate_rrc(filtered)
+            clock.lap("discriminator_rrc")
+            return freq_filt
+        if self.dsp.discriminator == "conj_product":
+            freq_inst = self._conj_product(filtered)
+        else:
+            freq_inst = self._phase_diff(filtered)
+        clock.lap("discriminator")
+        if len(freq_inst) == 0:
+            return freq_inst
+        freq_filt = self._rrc.process(freq_inst)
+        clock.lap("rrc")
+        return freq_filt
+
+    def _phase_diff(self, filtered: np.ndarray) -> np.ndarray:
+        # arctan2 of every sample, wrapped difference of consecutive phases
+        n = len(filtered)
+        self._phase = _scratch(self._phase, n + 1, self.dsp.real_dtype)
+        if self._last_phase is None:
+            phase = self._phase[:n]
+            np.arctan2(filtered.imag, filtered.real, out=phase)
+        else:
+            phase = self._phase[:n + 1]
+            phase[0] = self._last_phase
+            np.arctan2(filtered.imag, filtered.real, out=phase[1:])
+        self._last_phase = phase[-1]
+
+        self._freq = _scratch(self._freq, len(phase) - 1, self.dsp.real_dtype)
+        freq_inst = self._freq[:len(phase) - 1]
+        np.subtract(phase[1:], phase[:-1], out=freq_inst)
+        # wrap (dphi - phase_step) into [-pi, pi), then rad/sample -> Hz
+        freq_inst += np.pi - self.phase_step
+        np.mod(freq_inst, 2 * np.pi, out=freq_inst)
+        freq_inst -= np.pi
+        freq_inst *= self.dsp.output_rate / (2 * np.pi)
+        return freq_inst
+
+    def _conj_product(self, filtered: np.ndarray) -> np.ndarray:
+        # angle(x[n] * conj(x[n-1]) * exp(-j*phase_step)): one arctan2, no wrapping
+        if self._last_sample is None:
+            prev, filtered = filtered[0], filtered[1:]
+        else:
+            prev = self._last_sample
+        n = len(filtered)
+        self._last_sample = filtered[-1] if n else prev
+        self._product = _scratch(self._product, n, self.dsp.complex_dtype)
+        product = self._product[:n]
+        if n:
+            product[0] = np.conj(prev)
+            np.conjugate(filtered[:-1], out=product[1:])
+            product *= filtered
+            if self.phase_step:
+                product *= self._rotation
+        self._freq = _scratch(self._freq, n, self.dsp.real_dtype)
+        freq_inst = self._freq[:n]
+        np.arctan2(product.imag, product.real, out=freq_inst)
+        freq_inst *= self._scale
+        return freq_inst
+
+    def _discriminate_rrc(self, filtered: np.ndarray) -> np.ndarray:
+        # fused kernel: conj_product discriminator and the RRC in one compiled loop
+        if self._last_sample is None:
+            prev, filtered = filtered[0], filtered[1:]
+        else:
+            prev = self._last_sample
+        # channelizer columns are strided; the compiled loop wants a contiguous block
+        if not filtered.flags.c_contiguous:
+            self._column = _scratch(self._column, len(filtered), self.dsp.complex_dtype)
+            column = self._column[:len(filtered)]
+            column[:] = filtered
+            filtered = column
+        n, m = len(filtered), len(self._rrc_taps_rev) - 1
+        self._last_sample = filtered[-1] if n else prev
+        if len(self._fused_buf) < m + n:
+            buf = np.zeros(m + max(n, 2 * (len(self._fused_buf) - m)), dtype=self._fused_buf.dtype)
+            buf[:m] = self._fused_buf[:m]
+            self._fused_buf = buf
+        self._fused_out = _scratch(self._fused_out, n, self.dsp.real_dtype)
+        out = self._fused_out[:n]
+        _discriminator_rrc(filtered, self.dsp.complex_dtype.type(prev), self._rotation, self._scale,
+                           self._rrc_taps_rev, self._fused_buf, out)
+        return out
+
+    @property
+    def bit_reliabilities(self) -> np.ndarray:
+        """
+        Distance (in fsk_dev) of each symbol to the nearest decision threshold
+        that would flip the bit, two values per symbol like the bits. The
+        first bit only changes at 0; the second one changes at -2, 0 and 2.
+        """
+        u = np.abs(np.asarray(self.symbol_values, dtype=np.float32)) / np.float32(self.dsp.fsk_dev)
+        rel = np.empty((len(u), 2), dtype=np.float32)
+        rel[:, 0] = u
+        np.minimum(u, np.abs(u - 2), out=rel[:, 1])
+        return rel.reshape(-1)
+
+
+class ChannelStream:
+    """
+    Streaming demodulator for a single channel.
+
+    Carries LO phase, LPF/RRC filter state, the last discriminator phase and
+    the symbol timing offset from one buffer to the next, so feeding a capture
+    in pieces yields the same bits as feeding it in one call. Per-buffer work
+    arrays are reused between calls.
+    """
+
+    def __init__(self, dsp: DSPProcessor, freq_shift_hz: float, sample_offset: int = 0):
+        self.dsp = dsp
+        self.freq_shift_hz = float(freq_shift_hz)
+        self.sample_offset = int(sample_offset)
+        self._lo_step = self.freq_shift_hz / dsp.sample_rate
+        self._lo_period = _lo_period(self.freq_shift_hz, dsp.sample_rate)
+        # short LO periods use a shared phasor table (no cos/sin per buffer)
+        self._use_lo_table = 0 < self._lo_period <= LO_TABLE_MAX_PERIOD
+        self._lo_table = None
+        self._demod = _SymbolDemod(dsp, sample_offset=self.sample_offset)
+        self._ramp = np.arange(16384, dtype=np.int64)
+        self._t = None
+        self._arg = None
+        self._baseband = None
+        self.reset()
+
+    def reset(self):
+        self._lo_index = self.sample_offset  # LO sample index (wrapped to the LO period)
+        if self._lo_period:
+            self._lo_index %= self._lo_period
+        self._lpf = _FIRFilter(self.dsp.taps, self.dsp.filter_backend, self.dsp.complex_dtype)
+        self._decimator = _PolyphaseDecimator(self.dsp.taps, self.dsp.decimation, self.dsp.filter_backend,
+                                              self.dsp.complex_dtype)
+        self._demod.reset()
+
+    def process(self, wideband_samples: np.ndarray) -> np.ndarray:
+        n = len(wideband_samples)
+        if n == 0:
+            return np.array([], dtype=np.uint8)
+
+        # 1) DDC to baseband (phase-continuous LO)
+        clock = REGISTRY.clock()
+        self._baseband = _scratch(self._baseband, n, self.dsp.complex_dtype)
+        baseband = self._baseband[:n]
+        if self._use_lo_table:
+            if self._lo_table is None or len(self._lo_table) < self._lo_period - 1 + n:
+                self._lo_table = _lo_table(self.freq_shift_hz, self.dsp.sample_rate, 1 << (n - 1).bit_length(),
+                                           self.dsp.complex_dtype)
+            np.multiply(self._lo_table[self._lo_index:self._lo_index + n], wideband_samples, out=baseband)
+            self._lo_index = (self._lo_index + n) % self._lo_period
+            clock.lap("ddc")
+            return self._filter_and_demod(baseband, clock)
+
+        self._t = _scratch(self._t, n, np.int64)
+        self._arg = _scratch(self._arg, n)
+        t, arg = self._t[:n], self._arg[:n]
+        if len(self._ramp) < n:
+            self._ramp = np.arange(n, dtype=np.int64)
+        np.add(self._ramp[:n], self._lo_index, out=t)
+        if self._lo_period:
+            np.remainder(t, self._lo_period, out=t)
+            self._lo_index = (self._lo_index + n) % self._lo_period
+        else:
+            self._lo_index += n
+        # LO phase in double even in single precision: n * step grows large
+        np.multiply(t, -2 * np.pi * self._lo_step, out=arg)
+        np.cos(arg, out=baseband.real)
+        np.sin(arg, out=baseband.imag)
+        baseband *= wideband_samples
+        clock.lap("ddc")
+        return self._filter_and_demod(baseband, clock)
+
+    def _filter_and_demod(self, baseband: np.ndarray, clock=NULL_CLOCK) -> np.ndarray:
+        # 2) LPF (+ polyphase decimation)
+        if self.dsp.decimation == 1:
+            filtered = self._lpf.process(baseband)
+        else:
+            filtered = self._decimator.process(baseband)
+        clock.lap("lpf")
+
+        # 3-6) discriminator, RRC, symbol decision
+        return self._demod.process(filtered)
+
+    @property
+    def symbol_times(self) -> np.ndarray:
+        """Capture sample index of each symbol returned by the last process() call."""
+        return self._demod.symbol_times
+
+    @property
+    def symbol_values(self) -> np.ndarray:
+        """Soft value (Hz) of each symbol returned by the last process() call."""
+        return self._demod.symbol_values
+
+    @property
+    def bit_reliabilities(self) -> np.ndarray:
+        """Reliability (fsk_dev units) of each bit returned by the last process() call."""
+        return self._demod.bit_reliabilities
+
+    @property
+    def estimated_offset_hz(self) -> float:
+        """Tracked carrier/DC offset of the channel (0 without level tracking)."""
+        return self._demod.estimated_offset_hz
+
+    @property
+    def estimated_deviation_hz(self) -> float:
+        return self._demod.estimated_deviation_hz
+
+
+class Channelizer:
+    """
+    One-pass front end for several channels of the same wideband stream.
+
+    Every channel uses the same (decimating) LPF, modulated to its offset:
+        y_k[n] = sum_l h[l] * x[nD - l] * exp(j*w_k*l)
+    When all offsets sit on a grid of fs/M with M <= len(taps), the sum is
+    folded modulo M first (polyphase filter bank, shared by all channels) and
+    the per-channel part is an M-point DFT row. Otherwise the modulated taps are
+    applied directly. No LO is generated: the leftover rotation exp(j*w_k*nD) is
+    a constant phase step per output, removed in the discriminator.
+    """
+
+    def __init__(self, dsp: DSPProcessor, freq_shifts_hz, sample_offset: int = 0):
+        self.dsp = dsp
+        self.freq_shifts_hz = [float(f) for f in freq_shifts_hz]
+        taps = np.asarray(dsp.taps, dtype=np.float64)
+        ntaps, d = len(taps), dsp.decimation
+
+        # bin grid: smallest M with every offset an integer multiple of fs/M
+        grid = 1
+        for f in self.freq_shifts_hz:
+            period = _lo_period(f, dsp.sample_rate)
+            grid = grid * period // math.gcd(grid, period) if period and grid else 0
+        if grid and grid <= ntaps:
+            fold = grid
+        else:
+            fold = ntaps
+        self._fold = fold
+        self._span = -(-ntaps // fold) * fold  # taps zero-padded to a multiple of the fold size
+
+        # windows are taken oldest-first, so taps are applied reversed
+        taps_rev = np.zeros(self._span)
+        taps_rev[self._span - ntaps:] = taps[::-1]
+        lag = self._span - 1 - np.arange(fold)  # filter lag of each folded column (mod fold)
+        w = 2 * np.pi * np.asarray(self.freq_shifts_hz) / dsp.sample_rate
+        steer = np.exp(1j * np.outer(lag, w))
+        if self._span == fold:
+            # no folding: modulated taps applied directly to the windows
+            self._taps_rev = None
+            self._steer = (taps_rev[:, None] * steer).astype(dsp.complex_dtype)
+        else:
+            self._taps_rev = taps_rev.reshape(-1, fold).astype(dsp.real_dtype)
+            self._steer = steer.astype(dsp.complex_dtype)
+
+        self._demods = [_SymbolDemod(dsp, phase_step=wk * d, sample_offset=sample_offset) for wk in w]
+        self.reset()
+
+    def reset(self):
+        self._hist = _HistoryBuffer(self._span - 1, self.dsp.complex_dtype)
+        self._folded = None
+        self._outputs = None
+        self._phase = 0  # position of the next output relative to the next input sample
+        for demod in self._demods:
+            demod.reset()
+
+    def _filter_bank(self, x: np.ndarray) -> np.ndarray:
+        d, k = self.dsp.decimation, len(self._demods)
+        buf = self._hist.extend(x)
+        m0 = self._span - 1 + self._phase
+        n_out = (len(buf) - 1 - m0) // d + 1 if len(buf) > m0 else 0
+        self._phase = m0 + n_out * d - len(buf)
+
+        self._outputs = _scratch(self._outputs, n_out * k, self.dsp.complex_dtype)
+        outputs = self._outputs[:n_out * k].reshape(n_out, k)
+        if n_out == 0:
+            return outputs
+
+        # windows[n, i] = buf[m0 + n*d - span + 1 + i]  (oldest sample first)
+        windows = np.lib.stride_tricks.sliding_window_view(buf, self._span)
+        windows = windows[m0 - self._span + 1::d][:n_out]
+        if self._taps_rev is None:
+            return np.matmul(windows, self._steer, out=outputs)
+        self._folded = _scratch(self._folded, n_out * self._fold, self.dsp.complex_dtype)
+        folded = self._folded[:n_out * self._fold].reshape(n_out, self._fold)
+        np.einsum("npm,pm->nm", windows.reshape(n_out, -1, self._fold), self._taps_rev,
+                  out=folded, optimize=True)
+        return np.matmul(folded, self._steer, out=outputs)
+
+    def process(self, wideband_samples: np.ndarray) -> list:
+        """Demodulate every channel from one buffer; bit arrays in freq_shifts_hz order."""
+        if len(wideband_samples) == 0:
+            return [np.array([], dtype=np.uint8) for _ in self._demods]
+        clock = REGISTRY.clock()
+        outputs = self._filter_bank(wideband_samples)
+        clock.lap("filter_bank")
+        return [demod.process(outputs[:, k]) for k, demod in enumerate(self._demods)]
+
+    @property
+    def symbol_times(self) -> list:
+        """Per channel: capture sample index of each symbol from the last process() call."""
+        return [demod.symbol_times for demod in self._demods]
+
+    @property
+    def symbol_values(self) -> list:
+        """Per channel: soft value (Hz) of each symbol from the last process() call."""
+        return [demod.symbol_values for demod in self._demods]
+
+    @property
+    def bit_reliabilities(self) -> list:
+        """Per channel: reliability (fsk_dev units) of each bit from the last process() call."""
+        return [demod.bit_reliabilities for demod in self._demods]
+
+    @property
+    def estimated_offsets_hz(self) -> list:
+        """Per channel: tracked carrier/DC offset (0 without level tracking)."""
+        return [demod.estimated_offset_hz for demod in self._demods]
+
+    @property
+    def estimated_deviations_hz(self) -> list:
+        return [demod.estimated_deviation_hz for demod in self._demods]
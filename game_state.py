@@ -0,0 +1,223 @@
+# ============================================================================
+# Game state: latest value per command and robot, published as deltas
+# ============================================================================
+# The broadcast repeats the same content (positions, HP, ammo, buffs ...),
+# often on the broadcast and a jammer channel at once. GameState keeps the
+# latest value of every (command type, robot) pair - the top-level keys of
+# the packet's data, e.g. ("A02_hp", "hero") - and only reports changes:
+#
+#   duplicates : a frame already seen within dup_window_s (same cmd_id, seq
+#                and CRC16, whatever the channel) is dropped
+#   deltas     : a value that differs from the stored one is published with
+#                its receive time, capture time and source; an identical
+#                value only refreshes the entry
+#   staleness  : an entry not refreshed for stale_after_s is published once
+#                with stale = true (and again when it comes back)
+#
+# StateSink runs the store in the PacketOutput writer thread and publishes
+# the deltas, plus a full snapshot every snapshot_interval_s for late
+# subscribers, to its own sinks (UDP / NDJSON / console):
+#
+#   {"topic": "A02_hp", "key": "hero", "value": 413, "t": 1760..., "time_s": 12.3,
+#    "source": "broadcast", "stale": false}
+#   {"snapshot": true, "t": 1760..., "state": {"A02_hp": {"hero": {"value": 413, "age_s": 0.4, ...}}}}
+# ============================================================================
+import collections
+import logging
+import sys
+import time
+
+from metrics import REGISTRY
+from packet_output import NDJSONFileSink, OutputSink, UDPSink
+from packet_types import PARSERS
+
+Delta = collections.namedtuple("Delta", ["topic", "key", "value", "timestamp", "time_s", "source", "stale", "age_s"])
+
+
+def delta_to_dict(delta: Delta) -> dict:
+    out = {"topic": delta.topic, "key": delta.key, "value": delta.value, "t": delta.timestamp,
+           "time_s": delta.time_s, "source": delta.source, "stale": delta.stale}
+    if delta.stale:
+        out["age_s"] = delta.age_s
+    return out
+
+
+class StateEntry:
+    __slots__ = ("value", "source", "time_s", "updated", "changed", "stale")
+
+    def __init__(self, value, source, time_s, now):
+        self.value = value
+        self.source = source
+        self.time_s = time_s
+        self.updated = now    # last time this value was received (changed or not)
+        self.changed = now    # last time the value changed
+        self.stale = False
+
+
+class GameState:
+    def __init__(self, dup_window_s: float = 1.0, stale_after_s: float = 3.0):
+        """
+        Not thread safe: feed it from one thread (StateSink: the output writer).
+
+        Args:
+            dup_window_s: how long a frame (cmd_id, seq, CRC16) counts as a duplicate
+            stale_after_s: entries not refreshed for this long are reported stale
+        """
+        self.dup_window_s = float(dup_window_s)
+        self.stale_after_s = float(stale_after_s)
+        self._entries = {}                       # (topic, key) -> StateEntry
+        self._seen = collections.OrderedDict()   # (cmd_id, seq, crc16) -> first receive time
+        self.stats = {"packets": 0, "duplicates": 0, "ignored": 0, "unchanged": 0, "deltas": 0, "stale": 0}
+
+    def update(self, packets, now: float = None) -> list:
+        """Store a batch of packet_types.Packet; returns the Deltas it caused, in order."""
+        deltas = []
+        for p in packets:
+            t = p.timestamp if p.timestamp is not None else (time.time() if now is None else now)
+            self.stats["packets"] += 1
+            if p.record is None:
+                # unknown command or short payload: nothing to keep
+                self.stats["ignored"] += 1
+                continue
+            self._forget(t)
+            ident = (p.cmd_id, p.frame[3], p.frame[-2:])
+            if ident in self._seen:
+                self.stats["duplicates"] += 1
+                REGISTRY.inc("radar_state_duplicates_total", source=p.source)
+                continue
+            self._seen[ident] = t
+
+            spec = PARSERS[p.cmd_id]
+            for key, value in spec.to_data(p.record).items():
+                entry = self._entries.get((spec.name, key))
+                if entry is None:
+                    self._entries[(spec.name, key)] = StateEntry(value, p.source, p.time_s, t)
+                elif entry.value == value and not entry.stale:
+                    entry.updated = t
+                    self.stats["unchanged"] += 1
+                    continue
+                else:
+                    # changed, or back from stale (published again even if equal)
+                    if entry.value != value:
+                        entry.changed = t
+                    entry.value, entry.source, entry.time_s = value, p.source, p.time_s
+                    entry.updated = t
+                    entry.stale = False
+                deltas.append(Delta(spec.name, key, value, t, p.time_s, p.source, False, 0.0))
+        self.stats["deltas"] += len(deltas)
+        REGISTRY.inc("radar_state_deltas_total", len(deltas))
+        return deltas
+
+    def _forget(self, now: float):
+        # frames arrive in time order: the oldest are at the front
+        while self._seen:
+            ident, t = next(iter(self._seen.items()))
+            if now - t <= self.dup_window_s:
+                break
+            del self._seen[ident]
+
+    def expire(self, now: float = None) -> list:
+        """Deltas (stale = true) for entries that have just gone stale."""
+        now = time.time() if now is None else now
+        deltas = []
+        for (topic, key), entry in self._entries.items():
+            age = now - entry.updated
+            if not entry.stale and age > self.stale_after_s:
+                entry.stale = True
+                deltas.append(Delta(topic, key, entry.value, now, entry.time_s, entry.source, True, age))
+        self.stats["stale"] += len(deltas)
+        REGISTRY.set("radar_state_stale_entries", sum(e.stale for e in self._entries.values()))
+        return deltas
+
+    def get(self, topic: str, key: str):
+        """Latest value of (topic, key), None if never received."""
+        entry = self._entries.get((topic, key))
+        return None if entry is None else entry.value
+
+    def snapshot(self, now: float = None) -> dict:
+        """{topic: {key: {value, source, time_s, t, changed, age_s, stale}}}"""
+        now = time.time() if now is None else now
+        out = {}
+        for (topic, key), e in self._entries.items():
+            out.setdefault(topic, {})[key] = {"value": e.value, "source": e.source, "time_s": e.time_s,
+                                              "t": e.updated, "changed": e.changed,
+                                              "age_s": now - e.updated, "stale": e.stale}
+        return out
+
+
+class DeltaConsoleSink(OutputSink):
+    """One line per delta; snapshots are not printed."""
+
+    name = "state-console"
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def write(self, items):
+        lines = []
+        for d in items:
+            if d.get("snapshot"):
+                continue
+            state = f"stale ({d['age_s']:.1f} s)" if d["stale"] else f"= {d['value']}"
+            lines.append(f"[state] {d['topic']}.{d['key']} {state} [{d['source']}]")
+        if lines:
+            self.stream.write("\n".join(lines) + "\n")
+
+    def flush(self):
+        self.stream.flush()
+
+
+class StateSink(OutputSink):
+    """PacketOutput sink: packets into a GameState, deltas and snapshots out to its own sinks."""
+
+    name = "state"
+
+    def __init__(self, state: GameState, sinks, snapshot_interval_s: float = 5.0):
+        self.logger = logging.getLogger("radar.state")
+        self.state = state
+        self.sinks = list(sinks)
+        self.snapshot_interval_s = float(snapshot_interval_s)
+        self._next_snapshot = time.monotonic() + self.snapshot_interval_s
+
+    @classmethod
+    def from_config(cls, config: dict) -> "StateSink":
+        cfg = config.get("state", {})
+        sinks = []
+        if cfg.get("console", False):
+            sinks.append(DeltaConsoleSink())
+        if cfg.get("ndjson_path"):
+            sinks.append(NDJSONFileSink(cfg["ndjson_path"]))
+        if cfg.get("udp"):
+            host, _, port = str(cfg["udp"]).rpartition(":")
+            sinks.append(UDPSink(host or "127.0.0.1", int(port)))
+        state = GameState(cfg.get("dup_window_s", 1.0), cfg.get("stale_after_s", 3.0))
+        return cls(state, sinks, cfg.get("snapshot_interval_s", 5.0))
+
+    def write(self, packets):
+        self._publish([delta_to_dict(d) for d in self.state.update(packets)])
+
+    def flush(self):
+        # the writer thread calls flush every flush_interval_s, also when idle
+        items = [delta_to_dict(d) for d in self.state.expire()]
+        if self.snapshot_interval_s > 0 and time.monotonic() >= self._next_snapshot:
+            self._next_snapshot = time.monotonic() + self.snapshot_interval_s
+            items.append({"snapshot": True, "t": time.time(), "state": self.state.snapshot()})
+        self._publish(items)
+        for sink in self.sinks:
+            self._call(sink, "flush")
+
+    def close(self):
+        self.flush()
+        for sink in self.sinks:
+            self._call(sink, "close")
+
+    def _publish(self, items):
+        if items:
+            for sink in self.sinks:
+                self._call(sink, "write", items)
+
+    def _call(self, sink, method, *args):
+        try:
+            getattr(sink, method)(*args)
+        except Exception as e:
+            self.logger.error(f"State sink {sink.name} {method} failed: {e}")
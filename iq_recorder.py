@@ -0,0 +1,258 @@
+# ============================================================================
+# IQ recording / replay: raw cf32 + SigMF sidecar
+# ============================================================================
+# IQRecorder : copies RX buffers into its own preallocated pool and a writer
+#              thread appends them to <base>.sigmf-data (complex64, little
+#              endian). The RX side never touches the disk; when the writer
+#              falls behind buffers are dropped and a new SigMF capture
+#              segment marks the discontinuity.
+# FileSource : replays a capture through np.memmap with the SDRDriver
+#              interface (open / read_into / read_samples / close), so the
+#              serial loop and the pipeline run unchanged without SoapySDR.
+# ============================================================================
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from pipeline import BufferRing
+
+SIGMF_VERSION = "1.0.0"
+DATA_SUFFIX = ".sigmf-data"
+META_SUFFIX = ".sigmf-meta"
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def sigmf_paths(path) -> tuple:
+    """(data_path, meta_path) for a capture given either file or the base name."""
+    path = Path(path)
+    if path.suffix in (DATA_SUFFIX, META_SUFFIX):
+        path = path.with_suffix("")
+    return path.with_name(path.name + DATA_SUFFIX), path.with_name(path.name + META_SUFFIX)
+
+
+class IQRecorder:
+    def __init__(self, base_path, sample_rate: float, center_freq: float, gain_db: Optional[float] = None,
+                 buffer_size: int = 16384, num_buffers: int = 32, description: str = ""):
+        """
+        Args:
+            base_path: capture name without suffix (record/iq_20260101_120000)
+            buffer_size: size of one pool buffer; longer writes are split
+            num_buffers: pool depth, i.e. how far the disk may lag behind RX
+        """
+        self.logger = logging.getLogger("radar.recorder")
+        self.data_path, self.meta_path = sigmf_paths(base_path)
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.gain_db = gain_db
+        self.description = description
+
+        self.ring = BufferRing(num_buffers, buffer_size)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._file = None
+
+        self.samples_written = 0    # sample index of the next recorded sample
+        self.dropped_samples = 0
+        self._captures = []
+        self._dropping = False
+        self._start_time = None
+
+    @classmethod
+    def from_config(cls, config: dict, directory="record", **kwargs):
+        sdr = config["sdr_settings"]
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return cls(Path(directory) / f"iq_{stamp}", sdr["sample_rate_sps"], config["center_frequency_hz"],
+                   gain_db=None if sdr.get("agc_enabled", False) else sdr.get("gain_db"),
+                   buffer_size=config["processing"]["buffer_size"], **kwargs)
+
+    def start(self):
+        self.data_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.data_path, "wb")
+        self._start_time = _utc_now()
+        self._new_capture()
+        self._thread = threading.Thread(target=self._write_loop, name="iq-recorder", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Recording IQ to {self.data_path}")
+        return self
+
+    def _new_capture(self):
+        self._captures.append({
+            "core:sample_start": self.samples_written,
+            "core:frequency": float(self.center_freq),
+            "core:datetime": _utc_now(),
+        })
+
+    def write(self, samples: np.ndarray):
+        """Called from the RX thread: copy into the pool and return immediately."""
+        if self._file is None:
+            return
+        size = len(self.ring.buffers[0])
+        for start in range(0, len(samples), size):
+            chunk = samples[start:start + size]
+            idx = self.ring.acquire()
+            if idx is None:
+                # disk is behind: drop, the next written buffer opens a new capture
+                self.dropped_samples += len(chunk)
+                self._dropping = True
+                continue
+            self.ring.buffers[idx][:len(chunk)] = chunk
+            self._queue.put((idx, len(chunk), self._dropping))
+            self._dropping = False
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            idx, n, after_gap = item
+            try:
+                if after_gap:
+                    self._new_capture()
+                self.ring.buffers[idx][:n].tofile(self._file)
+                self.samples_written += n
+            except Exception as e:
+                self.logger.error(f"IQ write failed: {e}")
+            finally:
+                self.ring.release(idx)
+
+    def close(self):
+        if self._file is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        self._file = None
+        self._write_meta()
+        self.logger.info(f"IQ recording closed: {self.samples_written} samples "
+                         f"({self.samples_written / self.sample_rate:.1f} s), dropped {self.dropped_samples}")
+
+    def _write_meta(self):
+        global_ = {
+            "core:datatype": "cf32_le",
+            "core:sample_rate": float(self.sample_rate),
+            "core:version": SIGMF_VERSION,
+            "core:recorder": "radar iq_recorder",
+            "core:extensions": [{"name": "radar", "version": "1.0.0", "optional": True}],
+            "radar:start_datetime": self._start_time,
+            "radar:end_datetime": _utc_now(),
+            "radar:dropped_samples": int(self.dropped_samples),
+        }
+        if self.gain_db is not None:
+            global_["radar:gain_db"] = float(self.gain_db)
+        if self.description:
+            global_["core:description"] = self.description
+        meta = {"global": global_, "captures": self._captures, "annotations": []}
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+
+class FileSource:
+    def __init__(self, config: dict, path, realtime: bool = False, loop: bool = False):
+        """
+        SDRDriver stand-in that replays a recording.
+
+        Args:
+            config: same config dict as SDRDriver; used when the capture has no
+                    .sigmf-meta (raw cf32) and for buffer_size
+            path: .sigmf-data / .sigmf-meta / base name, or a raw cf32 file
+            realtime: pace reads at the sample rate instead of as fast as possible
+            loop: restart from the beginning at end of file
+        """
+        self.cfg = config
+        self.logger = logging.getLogger("radar.replay")
+        self.realtime = realtime
+        self.loop = loop
+        # file replay must not lose data: the pipeline waits for a free buffer
+        # instead of dropping like it does for a live device
+        self.live = False
+
+        self.buffer_size = self.cfg["processing"]["buffer_size"]
+        self.sample_rate = self.cfg["sdr_settings"]["sample_rate_sps"]
+        self.center_freq = self.cfg.get("center_frequency_hz")
+        self.gain = self.cfg["sdr_settings"].get("gain_db")
+        self.meta = None
+
+        path = Path(path)
+        data_path, meta_path = sigmf_paths(path)
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+            datatype = self.meta["global"].get("core:datatype", "cf32_le")
+            if datatype != "cf32_le":
+                raise ValueError(f"Unsupported SigMF datatype: {datatype}")
+            self.sample_rate = self.meta["global"]["core:sample_rate"]
+            captures = self.meta.get("captures", [])
+            if captures and "core:frequency" in captures[0]:
+                self.center_freq = captures[0]["core:frequency"]
+            self.gain = self.meta["global"].get("radar:gain_db", self.gain)
+            self.path = data_path
+        else:
+            self.path = path
+
+        self._data = None
+        self._pos = 0
+        self._t0 = None
+        self.finished = False
+        self._opened = False
+        self.logger.info(f"Replay source: {self.path}")
+
+    def __len__(self):
+        return 0 if self._data is None else len(self._data)
+
+    @property
+    def position(self) -> int:
+        return self._pos
+
+    def open(self):
+        if not self.path.exists():
+            raise RuntimeError(f"Recording not found: {self.path}")
+        self._data = np.memmap(self.path, dtype="<c8", mode="r")
+        self._pos = 0
+        self._t0 = time.perf_counter()
+        self.finished = False
+        self._opened = True
+        self.logger.info(f"Replaying {len(self._data)} samples "
+                         f"({len(self._data) / self.sample_rate:.1f} s @ {self.sample_rate / 1e6:g} Msps)")
+
+    def read_into(self, buff: np.ndarray, num_samples: Optional[int] = None) -> int:
+        if not self._opened:
+            raise RuntimeError("Replay source not opened")
+        if num_samples is None:
+            num_samples = min(self.buffer_size, len(buff))
+
+        if self._pos >= len(self._data):
+            if not self.loop or len(self._data) == 0:
+                self.finished = True
+                return 0
+            self._pos = 0
+            self._t0 = time.perf_counter()
+
+        n = min(num_samples, len(self._data) - self._pos)
+        buff[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+
+        if self.realtime:
+            wait = self._t0 + self._pos / self.sample_rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        return n
+
+    def read_samples(self, num_samples: Optional[int] = None) -> np.ndarray:
+        if num_samples is None:
+            num_samples = self.buffer_size
+        buff = np.empty(num_samples, dtype=np.complex64)
+        return buff[:self.read_into(buff, num_samples)]
+
+    def close(self):
+        self._data = None
+        self._opened = False
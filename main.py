@@ -12,13 +12,13 @@ import numpy as np
 from utils import setup_logger
 from sdr_driver import SDRDriver
 from dsp_processor import DSPProcessor
-from packet_decoder import PacketDecoder
-
-try:
-    import matplotlib.pyplot as plt
-    MATPLOTLIB_AVAILABLE = True
-except Exception:
-    MATPLOTLIB_AVAILABLE = False
+from packet_decoder import MultiStreamDecoder
+from burst_detector import BurstDetector
+from pipeline import LOAD_SMOOTHING, ReceiverPipeline
+from iq_recorder import IQRecorder, FileSource
+from metrics import REGISTRY, start_from_config as start_metrics
+from spectrum import SpectrumMonitor
+from packet_output import PacketOutput
 
 running = True
 
@@ -35,7 +35,7 @@ def load_config(config_path="config.json"):
         return json.load(f)
 
 
-def calculate_frequency_plan(config):
+def _select_frequency_table(config):
     game = config.get("game_settings", {})
     receive_team = game.get("receive_team")
 
@@ -54,6 +54,12 @@ def calculate_frequency_plan(config):
         else:
             freqs = config["frequencies"]["blue_team_receiving_red"]
             mode_str = "Blue team listening to RED"
+    return mode_str, freqs
+
+
+def calculate_frequency_plan(config):
+    game = config.get("game_settings", {})
+    mode_str, freqs = _select_frequency_table(config)
 
     level = game.get("target_jammer_level", 1)
     enable_jammer = config.get("processing", {}).get("enable_jammer", False)
@@ -79,129 +85,210 @@ def calculate_frequency_plan(config):
     return mode_str, center_freq, offset_bc, offset_jam
 
 
-class SpectrumPlot:
-    def __init__(self, sample_rate, update_hz=5):
-        self.sample_rate = sample_rate
-        self.update_interval = 1.0 / max(update_hz, 1)
-        self.last_update = 0.0
-        self.enabled = MATPLOTLIB_AVAILABLE
-        if not self.enabled:
-            return
-        plt.ion()
-        self.fig, self.ax = plt.subplots()
-        self.line, = self.ax.plot([], [])
-        self.ax.set_title("Spectrum")
-        self.ax.set_xlabel("Frequency (kHz)")
-        self.ax.set_ylabel("Power (dB)")
-        self.ax.grid(True)
-
-    def update(self, samples):
-        if not self.enabled:
-            return
+def calculate_channel_plan(config):
+    """
+    Channels demodulated from one wideband stream.
+
+    Returns (mode_str, center_freq, [(name, offset_hz), ...]). With
+    processing.watch_all_jammers every jammer_N_freq of the table is watched
+    and the center sits in the middle of the lowest/highest frequency;
+    otherwise the plan matches calculate_frequency_plan (broadcast plus the
+    target jammer level when enabled).
+    """
+    processing = config.get("processing", {})
+    if not processing.get("watch_all_jammers", False):
+        mode_str, center_freq, offset_bc, offset_jam = calculate_frequency_plan(config)
+        channels = [("broadcast", offset_bc)]
+        if processing.get("enable_jammer", False) and abs(offset_bc - offset_jam) > 1000:
+            channels.append(("jammer", offset_jam))
+        return mode_str, center_freq, channels
+
+    mode_str, freqs = _select_frequency_table(config)
+    named = [("broadcast", freqs["broadcast_freq"])]
+    for level in (1, 2, 3):
+        freq = freqs.get(f"jammer_{level}_freq")
+        # jammer_3 usually shares the broadcast frequency: one channel is enough
+        if freq is not None and all(abs(freq - f) > 1000 for _, f in named):
+            named.append((f"jammer_{level}", freq))
+
+    all_freqs = [f for _, f in named]
+    center_freq = (min(all_freqs) + max(all_freqs)) / 2.0
+    return mode_str, center_freq, [(name, f - center_freq) for name, f in named]
+
+
+def align_plan_to_recording(config, source, channels, logger):
+    """Adopt a recording's sample rate / centre frequency; returns shifted channel offsets."""
+    if source.sample_rate != config["sdr_settings"]["sample_rate_sps"]:
+        logger.warning(f"Recording sample rate {source.sample_rate/1e6:g} Msps overrides config")
+        config["sdr_settings"]["sample_rate_sps"] = source.sample_rate
+    center_freq = config["center_frequency_hz"]
+    if source.center_freq is not None and source.center_freq != center_freq:
+        # the recording was tuned elsewhere: keep the channels on their absolute frequencies
+        shift = center_freq - source.center_freq
+        channels = [(name, off + shift) for name, off in channels]
+        logger.warning(f"Recording centre {source.center_freq/1e6:.4f} MHz, channel offsets shifted by {shift/1e3:.1f} kHz")
+    return channels
+
+
+def run_serial(config, driver, dsp, decoder, channels, spectrum, output, logger, recorder=None):
+    # one shared filter-bank pass per buffer for all watched channels
+    channelizer = dsp.open_channelizer([off for _, off in channels])
+
+    sample_rate = config["sdr_settings"]["sample_rate_sps"]
+    last_stat = time.time()
+    pkt_count = 0
+    load = 0.0   # processing time / buffer duration, smoothed
+    # one receive buffer, reused: the recorder, spectrum and DSP stages copy what they keep
+    buf = np.empty(driver.buffer_size, dtype=np.complex64)
+
+    while running:
+        n = driver.read_into(buf)
+        if n <= 0:
+            if getattr(driver, "finished", False):
+                logger.info("End of recording.")
+                break
+            continue
+        samples = buf[:n]
+        if recorder:
+            recorder.write(samples)
+
+        spectrum.push(samples)
+
+        t0 = time.perf_counter()
+        bit_arrays = channelizer.process(samples)
+        soft_arrays = zip(channelizer.symbol_values, channelizer.bit_reliabilities, channelizer.symbol_times)
+        for (name, _), bits, (soft, reliability, times) in zip(channels, bit_arrays, soft_arrays):
+            if len(bits) > 0:
+                packets = decoder.decode(bits, name, soft=soft, reliability=reliability, times=times)
+                if packets:
+                    pkt_count += len(packets)
+                    clock = REGISTRY.clock()
+                    output.submit(packets)
+                    clock.lap("output")
+        load += LOAD_SMOOTHING * ((time.perf_counter() - t0) * sample_rate / len(samples) - load)
+        REGISTRY.set("radar_realtime_load", load, worker="serial")
+
         now = time.time()
-        if now - self.last_update < self.update_interval:
-            return
-        self.last_update = now
-
-        n = 4096
-        if len(samples) < n:
-            return
-        x = samples[:n]
-        window = np.hanning(n)
-        spec = np.fft.fftshift(np.fft.fft(x * window))
-        power = 20 * np.log10(np.abs(spec) + 1e-12)
-        freqs = np.fft.fftshift(np.fft.fftfreq(n, d=1.0 / self.sample_rate)) / 1e3
-
-        self.line.set_data(freqs, power)
-        self.ax.set_xlim(freqs[0], freqs[-1])
-        self.ax.set_ylim(np.max(power) - 80, np.max(power) + 5)
-        self.fig.canvas.draw()
-        self.fig.canvas.flush_events()
-
-def estimate_snr_db(samples, sample_rate):
-    n = 4096
-    if len(samples) < n:
-        return None
-    x = samples[:n]
-    window = np.hanning(n)
-    spec = np.fft.fftshift(np.fft.fft(x * window))
-    power = np.abs(spec) ** 2
-    # Estimate noise floor via median power, signal via max power
-    noise_power = np.median(power)
-    signal_power = np.max(power)
-    if noise_power <= 0:
-        return None
-    snr_db = 10 * np.log10(signal_power / noise_power + 1e-12)
-    return snr_db
+        if now - last_stat >= 1.0:
+            snr_db = spectrum.snr_db
+            line = f"Packets/s: {pkt_count} | load {load:.0%}"
+            if getattr(driver, "read_errors", None):
+                line += " | read errors " + ", ".join(f"{k} {v}" for k, v in driver.read_errors.items())
+            if output.dropped:
+                line += f" | output dropped {output.dropped}"
+            if snr_db is not None:
+                line += f" | SNR~{snr_db:.1f} dB"
+            if dsp.level_tracking:
+                line += " | offset " + ", ".join(
+                    f"{name} {off / 1e3:+.1f} kHz" for (name, _), off in zip(channels, channelizer.estimated_offsets_hz))
+            logger.info(line)
+            pkt_count = 0
+            last_stat = now
+
+
+def run_pipelined(config, driver, dsp, decoder, channels, spectrum, output, logger, recorder=None):
+    processing = config.get("processing", {})
+    pipeline = ReceiverPipeline(
+        driver, dsp, channels, decoder, output.submit,
+        num_buffers=processing.get("ring_buffers", 8),
+        dsp_workers=processing.get("dsp_workers", 0),
+        on_samples=spectrum.push,   # DSP worker 0; a rate-limited copy into shared memory
+        recorder=recorder,
+    )
+    pipeline.start()
+    try:
+        last_stat = time.time()
+        last_packets = 0
+        while running:
+            time.sleep(0.05)
+            if pipeline.finished():
+                logger.info(f"End of recording: {pipeline.stats()['packets']} packets decoded.")
+                break
+            now = time.time()
+            if now - last_stat < 1.0:
+                continue
+            st = pipeline.stats()
+            by_code = ", ".join(f"{k} {v}" for k, v in getattr(driver, "read_errors", {}).items())
+            line = (f"Packets/s: {st['packets'] - last_packets} | overflows: {st['overflows']} "
+                    f"| read errors: {st['read_errors']}" + (f" ({by_code})" if by_code else "") +
+                    f" | ring: {st['ring_in_use']}/{len(pipeline.ring.buffers)} "
+                    f"| output queue: {st['output_queue']} | load " + "/".join(f"{x:.0%}" for x in st["load"]))
+            if output.dropped:
+                line += f" | output dropped {output.dropped}"
+            for name, ss in st.get("streams", {}).items():
+                line += f" | {name}: {ss['packets']} ok ({ss['repaired']} fixed), {ss['crc16_errors']} crc err"
+                if name in st["offsets_hz"]:
+                    line += f", offset {st['offsets_hz'][name] / 1e3:+.1f} kHz"
+            snr_db = spectrum.snr_db
+            if snr_db is not None:
+                line += f" | SNR~{snr_db:.1f} dB"
+            logger.info(line)
+            last_packets = st["packets"]
+            last_stat = now
+    finally:
+        pipeline.stop()
+
 
 def main():
     global running
     parser = argparse.ArgumentParser()
     parser.add_argument("--config", default="config.json")
+    parser.add_argument("--replay", metavar="PATH",
+                        help="replay an IQ recording (.sigmf-data/.sigmf-meta or raw cf32) instead of the SDR")
+    parser.add_argument("--realtime", action="store_true", help="pace --replay at the recorded sample rate")
+    parser.add_argument("--simulate", action="store_true",
+                        help='use the simulated device (device.driver = "simulated", see config "simulation")')
     args = parser.parse_args()
 
     signal.signal(signal.SIGINT, signal_handler)
     logger = setup_logger()
+    recorder = None
+    spectrum = None
+    output = None
+    metric_sinks = []
 
     try:
         raw_config = load_config(args.config)
-        mode_str, center_freq, offset_bc, offset_jam = calculate_frequency_plan(raw_config)
+        if args.simulate:
+            raw_config["device"]["driver"] = "simulated"
+        mode_str, center_freq, channels = calculate_channel_plan(raw_config)
 
         raw_config["center_frequency_hz"] = center_freq
+        metric_sinks = start_metrics(raw_config)
 
         logger.info(mode_str)
         logger.info(f"Center frequency: {center_freq/1e6:.4f} MHz")
-        logger.info(f"Broadcast offset: {offset_bc/1e3:.1f} kHz | Jammer offset: {offset_jam/1e3:.1f} kHz")
+        logger.info(" | ".join(f"{name} offset: {off/1e3:.1f} kHz" for name, off in channels))
 
-        driver = SDRDriver(raw_config)
+        if args.replay:
+            driver = FileSource(raw_config, args.replay, realtime=args.realtime)
+            channels = align_plan_to_recording(raw_config, driver, channels, logger)
+        else:
+            driver = SDRDriver(raw_config)
         dsp = DSPProcessor(raw_config)
-        decoder = PacketDecoder()
+        # one reassembly buffer per channel: bytes of different channels must never mix
+        decoder = MultiStreamDecoder([name for name, _ in channels],
+                                     max_data_len=raw_config.get("decoder", {}).get("max_data_len"),
+                                     burst_detector=BurstDetector.from_config(raw_config),
+                                     repair_bits=raw_config.get("decoder", {}).get("repair_bits", 0),
+                                     repair_max_flips=raw_config.get("decoder", {}).get("repair_max_flips", 2))
 
-        show_spec = raw_config.get("logging", {}).get("show_spectrum", False)
-        update_hz = raw_config.get("logging", {}).get("spectrum_update_hz", 5)
-        spectrum = SpectrumPlot(raw_config["sdr_settings"]["sample_rate_sps"], update_hz) if show_spec else None
-
-        enable_jammer = raw_config.get("processing", {}).get("enable_jammer", False)
+        # before the device opens: the display process must not inherit its handles
+        spectrum = SpectrumMonitor.from_config(raw_config).start()
+        output = PacketOutput.from_config(raw_config, [name for name, _ in channels]).start()
 
         driver.open()
-        time.sleep(1)
+        if not args.replay:
+            if not driver.simulated:
+                time.sleep(1)
+            if raw_config.get("logging", {}).get("save_raw_data", False):
+                recorder = IQRecorder.from_config(raw_config, Path(__file__).parent / "record").start()
         logger.info("Receiver started.")
 
-        last_stat = time.time()
-        pkt_count = 0
-
-        while running:
-            samples = driver.read_samples()
-            if len(samples) == 0:
-                continue
-
-            if spectrum:
-                spectrum.update(samples)
-
-            bits_bc = dsp.process_channel(samples, offset_bc)
-            if len(bits_bc) > 0:
-                packets = decoder.decode(bits_bc, "broadcast")
-                if packets:
-                    pkt_count += len(packets)
-                    decoder.print_packets(packets)
-
-            if enable_jammer and abs(offset_bc - offset_jam) > 1000:
-                bits_jam = dsp.process_channel(samples, offset_jam)
-                if len(bits_jam) > 0:
-                    packets = decoder.decode(bits_jam, "jammer")
-                    if packets:
-                        pkt_count += len(packets)
-                        decoder.print_packets(packets)
-
-            now = time.time()
-            if now - last_stat >= 1.0:
-                snr_db = estimate_snr_db(samples, raw_config["sdr_settings"]["sample_rate_sps"])
-                if snr_db is None:
-                    logger.info(f"Packets/s: {pkt_count}")
-                else:
-                    logger.info(f"Packets/s: {pkt_count} | SNR~{snr_db:.1f} dB")
-                pkt_count = 0
-                last_stat = now
+        if raw_config.get("processing", {}).get("pipeline", False):
+            run_pipelined(raw_config, driver, dsp, decoder, channels, spectrum, output, logger, recorder)
+        else:
+            run_serial(raw_config, driver, dsp, decoder, channels, spectrum, output, logger, recorder)
 
     except Exception as e:
         logger.error(f"Error: {e}")
@@ -210,6 +297,14 @@ def main():
     finally:
         if "driver" in locals():
             driver.close()
+        if recorder:
+            recorder.close()
+        if spectrum:
+            spectrum.stop()
+        if output:
+            output.close()
+        for sink in metric_sinks:
+            sink.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,308 @@
+# ============================================================================
+# Runtime metrics: stage timers, counters and gauges with pluggable sinks
+# ============================================================================
+# One process-wide registry (REGISTRY), disabled unless metrics.enabled is set
+# in the config. Instrumented code asks for a StageClock per buffer and calls
+# lap("stage") after each stage; while disabled the clock is a shared no-op
+# object, so the hot path pays one attribute check. Counters / histograms
+# are created on first use and keyed by name + labels.
+#
+# Sinks read the registry from their own thread:
+#   PrometheusSink : GET /metrics (Prometheus text format) and
+#                    /metrics.json on a local HTTP port
+#   JSONDumpSink   : rewrites a JSON snapshot every `interval_s` seconds
+# ============================================================================
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# histogram bounds for durations (s): 10 us .. 1 s, then +Inf
+TIME_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 1.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=TIME_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)   # last one: above every bound
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf past the last bound)."""
+        if self.count == 0:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class StageClock:
+    """Times consecutive stages of one call: each lap() records the time since the previous one."""
+
+    __slots__ = ("_registry", "_metric", "_labels", "_t")
+
+    def __init__(self, registry, metric: str, labels: dict):
+        self._registry = registry
+        self._metric = metric
+        self._labels = labels
+        self._t = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self._registry.histogram(self._metric, stage=stage, **self._labels).observe(now - self._t)
+        self._t = now
+
+
+class _NullClock:
+    __slots__ = ()
+
+    def lap(self, stage: str):
+        pass
+
+
+NULL_CLOCK = _NullClock()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.enabled = False
+        self._metrics = {}   # name -> (kind, help, {label key: metric})
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, labels: dict, help_text: str = "", **kwargs):
+        key = _label_key(labels)
+        family = self._metrics.get(name)
+        metric = family[2].get(key) if family else None
+        if metric is None:
+            with self._lock:
+                family = self._metrics.setdefault(name, (cls.kind, help_text, {}))
+                metric = family[2].setdefault(key, cls(**kwargs))
+        return metric
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get(Counter, name, labels, help_text)
+
+    def gauge(self, name: str, help_text: str = "", **labels) -> Gauge:
+        return self._get(Gauge, name, labels, help_text)
+
+    def histogram(self, name: str, help_text: str = "", buckets=TIME_BUCKETS, **labels) -> Histogram:
+        return self._get(Histogram, name, labels, help_text, buckets=buckets)
+
+    # shortcuts for the hot path: nothing is created while disabled
+
+    def inc(self, name: str, n=1, **labels):
+        if self.enabled and n:
+            self.counter(name, **labels).inc(n)
+
+    def set(self, name: str, value, **labels):
+        if self.enabled:
+            self.gauge(name, **labels).set(value)
+
+    def observe(self, name: str, value: float, **labels):
+        if self.enabled:
+            self.histogram(name, **labels).observe(value)
+
+    def clock(self, metric: str = "radar_stage_seconds", **labels):
+        return StageClock(self, metric, labels) if self.enabled else NULL_CLOCK
+
+    def reset(self):
+        with self._lock:
+            self._metrics = {}
+
+    # ------------------------------------------------------------------ export
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, (kind, help_text, series) in sorted(self._metrics.items()):
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(series.items()):
+                if kind != "histogram":
+                    lines.append(f"{name}{_format_labels(key)} {metric.value}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(metric.bounds + (float("inf"),), metric.counts):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{name}_bucket{_format_labels(key, le)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(key)} {metric.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """{name: [{labels, value} | {labels, count, sum, mean, p50, p99}]}"""
+        out = {}
+        for name, (kind, _, series) in sorted(self._metrics.items()):
+            rows = []
+            for key, metric in sorted(series.items()):
+                row = {"labels": dict(key)}
+                if kind == "histogram":
+                    row.update(count=metric.count, sum=metric.sum,
+                               mean=metric.sum / metric.count if metric.count else 0.0,
+                               p50=metric.quantile(0.5), p99=metric.quantile(0.99))
+                else:
+                    row["value"] = metric.value
+                rows.append(row)
+            out[name] = rows
+        return out
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsSink:
+    """Base class: a sink exports `registry` until stop()."""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+        self.logger = logging.getLogger("radar.metrics")
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+
+class PrometheusSink(MetricsSink):
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: str = "127.0.0.1", port: int = 9108):
+        super().__init__(registry)
+        self.host, self.port = host, int(port)
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, ctype = json.dumps(registry.snapshot()).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, ctype = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Metrics on http://{self.host}:{self._server.server_port}/metrics")
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class JSONDumpSink(MetricsSink):
+    def __init__(self, registry: MetricsRegistry = REGISTRY, path="metrics.json", interval_s: float = 5.0):
+        super().__init__(registry)
+        self.path = str(path)
+        self.interval_s = float(interval_s)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="metrics-json", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Metrics dumped to {self.path} every {self.interval_s:g} s")
+        return self
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_s):
+            self.dump()
+
+    def dump(self):
+        snapshot = {"time": time.time(), "metrics": self.registry.snapshot()}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=1)
+            os.replace(tmp, self.path)   # readers never see a half-written file
+        except OSError as e:
+            self.logger.error(f"Metrics dump failed: {e}")
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self.dump()
+
+
+def start_from_config(config: dict, registry: MetricsRegistry = REGISTRY) -> list:
+    """Enable the registry and start the sinks configured under "metrics"; returns the sinks."""
+    cfg = config.get("metrics", {})
+    if not cfg.get("enabled", False):
+        return []
+    registry.enabled = True
+    sinks = []
+    if cfg.get("prometheus_port"):
+        sinks.append(PrometheusSink(registry, cfg.get("prometheus_host", "127.0.0.1"), cfg["prometheus_port"]))
+    if cfg.get("json_path"):
+        sinks.append(JSONDumpSink(registry, cfg["json_path"], cfg.get("json_interval_s", 5.0)))
+    return [sink.start() for sink in sinks]
@@ -1,257 +1,348 @@
 ﻿# ============================================================================
 # Packet decoder for RoboMaster protocol (CRC8/CRC16)
 # ============================================================================
+# Frames are searched in the bit stream, not in bytes: the SOF pattern is
+# matched at every bit offset, so a burst that starts mid-byte (or mid-symbol)
+# is still found. An optional BurstDetector restricts the search to bits that
+# look like a burst; buffers of pure noise then skip the SOF/CRC work.
+# With per-bit reliabilities a frame failing CRC16 is retried with up to
+# `repair_max_flips` of its `repair_bits` least reliable bits flipped (one
+# batched CRC16 over all candidates); the cheapest combination that checks
+# wins. Every candidate is a chance of a false match (~1/65536 each), so the
+# candidate count is capped.
+# decode() returns packet_types.Packet objects (payload parsed by the cmd_id
+# registry into a NamedTuple record); dicts are built only by the outputs.
+# ============================================================================
+import collections
+import itertools
 import struct
 import logging
+import threading
+import time
+
+import numpy as np
+
+from crc_engine import CRC8_INIT, CRC8_TAB, CRC16_INIT, CRC16_TAB, get_crc_engine
+from metrics import REGISTRY
+from packet_types import Packet, parse_payload
+
+MAX_REPAIR_CANDIDATES = 4096   # candidate frames per CRC16 failure at most
+SYMBOL_TIME_HISTORY = 4        # decode() calls whose symbol times are kept for _sample_index
+
+CMD_ID = struct.Struct("<H")   # cmd_id right behind the 5 byte header
 
 
 class PacketDecoder:
-    def __init__(self):
+    def __init__(self, crc_backend="auto", max_data_len=None, burst_detector=None,
+                 repair_bits=0, repair_max_flips=2):
         self.logger = logging.getLogger("radar.decoder")
         self.SOF = 0xA5
-        self.buffer = bytearray()
-
-        self.CRC8_INIT = 0xFF
-        self.CRC8_TAB = [
-            0x00, 0x5e, 0xbc, 0xe2, 0x61, 0x3f, 0xdd, 0x83, 0xc2, 0x9c, 0x7e, 0x20, 0xa3, 0xfd, 0x1f, 0x41,
-            0x9d, 0xc3, 0x21, 0x7f, 0xfc, 0xa2, 0x40, 0x1e, 0x5f, 0x01, 0xe3, 0xbd, 0x3e, 0x60, 0x82, 0xdc, 0x23,
-            0x7d, 0x9f, 0xc1, 0x42, 0x1c, 0xfe, 0xa0, 0xe1, 0xbf, 0x5d, 0x03, 0x80, 0xde, 0x3c, 0x62, 0xbe, 0xe0,
-            0x02, 0x5c, 0xdf, 0x81, 0x63, 0x3d, 0x7c, 0x22, 0xc0, 0x9e, 0x1d, 0x43, 0xa1, 0xff, 0x46, 0x18, 0xfa,
-            0xa4, 0x27, 0x79, 0x9b, 0xc5, 0x84, 0xda, 0x38, 0x66, 0xe5, 0xbb, 0x59, 0x07, 0xdb, 0x85, 0x67, 0x39,
-            0xba, 0xe4, 0x06, 0x58, 0x19, 0x47, 0xa5, 0xfb, 0x78, 0x26, 0xc4, 0x9a, 0x65, 0x3b, 0xd9, 0x87, 0x04,
-            0x5a, 0xb8, 0xe6, 0xa7, 0xf9, 0x1b, 0x45, 0xc6, 0x98, 0x7a, 0x24, 0xf8, 0xa6, 0x44, 0x1a, 0x99, 0xc7,
-            0x25, 0x7b, 0x3a, 0x64, 0x86, 0xd8, 0x5b, 0x05, 0xe7, 0xb9,
-            0x8c, 0xd2, 0x30, 0x6e, 0xed, 0xb3, 0x51, 0x0f, 0x4e, 0x10, 0xf2, 0xac, 0x2f, 0x71, 0x93, 0xcd, 0x11,
-            0x4f, 0xad, 0xf3, 0x70, 0x2e, 0xcc, 0x92, 0xd3, 0x8d, 0x6f, 0x31, 0xb2, 0xec, 0x0e, 0x50, 0xaf, 0xf1,
-            0x13, 0x4d, 0xce, 0x90, 0x72, 0x2c, 0x6d, 0x33, 0xd1, 0x8f, 0x0c, 0x52, 0xb0, 0xee, 0x32, 0x6c, 0x8e,
-            0xd0, 0x53, 0x0d, 0xef, 0xb1, 0xf0, 0xae, 0x4c, 0x12, 0x91, 0xcf, 0x2d, 0x73, 0xca, 0x94, 0x76, 0x28,
-            0xab, 0xf5, 0x17, 0x49, 0x08, 0x56, 0xb4, 0xea, 0x69, 0x37, 0xd5, 0x8b, 0x57, 0x09, 0xeb, 0xb5, 0x36,
-            0x68, 0x8a, 0xd4, 0x95, 0xcb, 0x29, 0x77, 0xf4, 0xaa, 0x48, 0x16, 0xe9, 0xb7, 0x55, 0x0b, 0x88, 0xd6,
-            0x34, 0x6a, 0x2b, 0x75, 0x97, 0xc9, 0x4a, 0x14, 0xf6, 0xa8,
-            0x74, 0x2a, 0xc8, 0x96, 0x15, 0x4b, 0xa9, 0xf7, 0xb6, 0xe8, 0x0a, 0x54, 0xd7, 0x89, 0x6b, 0x35,
-        ]
-
-        self.CRC16_INIT = 0xFFFF
-        self.CRC16_TAB = [
-            0x0000, 0x1189, 0x2312, 0x329b, 0x4624, 0x57ad, 0x6536, 0x74bf,
-            0x8c48, 0x9dc1, 0xaf5a, 0xbed3, 0xca6c, 0xdbe5, 0xe97e, 0xf8f7,
-            0x1081, 0x0108, 0x3393, 0x221a, 0x56a5, 0x472c, 0x75b7, 0x643e,
-            0x9cc9, 0x8d40, 0xbfdb, 0xae52, 0xdaed, 0xcb64, 0xf9ff, 0xe876,
-            0x2102, 0x308b, 0x0210, 0x1399, 0x6726, 0x76af, 0x4434, 0x55bd,
-            0xad4a, 0xbcc3, 0x8e58, 0x9fd1, 0xeb6e, 0xfae7, 0xc87c, 0xd9f5,
-            0x3183, 0x200a, 0x1291, 0x0318, 0x77a7, 0x662e, 0x54b5, 0x453c,
-            0xbdcb, 0xac42, 0x9ed9, 0x8f50, 0xfbef, 0xea66, 0xd8fd, 0xc974,
-            0x4204, 0x538d, 0x6116, 0x709f, 0x0420, 0x15a9, 0x2732, 0x36bb,
-            0xce4c, 0xdfc5, 0xed5e, 0xfcd7, 0x8868, 0x99e1, 0xab7a, 0xbaf3,
-            0x5285, 0x430c, 0x7197, 0x601e, 0x14a1, 0x0528, 0x37b3, 0x263a,
-            0xdecd, 0xcf44, 0xfddf, 0xec56, 0x98e9, 0x8960, 0xbbfb, 0xaa72,
-            0x6306, 0x728f, 0x4014, 0x519d, 0x2522, 0x34ab, 0x0630, 0x17b9,
-            0xef4e, 0xfec7, 0xcc5c, 0xddd5, 0xa96a, 0xb8e3, 0x8a78, 0x9bf1,
-            0x7387, 0x620e, 0x5095, 0x411c, 0x35a3, 0x242a, 0x16b1, 0x0738,
-            0xffcf, 0xee46, 0xdcdd, 0xcd54, 0xb9eb, 0xa862, 0x9af9, 0x8b70,
-            0x8408, 0x9581, 0xa71a, 0xb693, 0xc22c, 0xd3a5, 0xe13e, 0xf0b7,
-            0x0840, 0x19c9, 0x2b52, 0x3adb, 0x4e64, 0x5fed, 0x6d76, 0x7cff,
-            0x9489, 0x8500, 0xb79b, 0xa612, 0xd2ad, 0xc324, 0xf1bf, 0xe036,
-            0x18c1, 0x0948, 0x3bd3, 0x2a5a, 0x5ee5, 0x4f6c, 0x7df7, 0x6c7e,
-            0xa50a, 0xb483, 0x8618, 0x9791, 0xe32e, 0xf2a7, 0xc03c, 0xd1b5,
-            0x2942, 0x38cb, 0x0a50, 0x1bd9, 0x6f66, 0x7eef, 0x4c74, 0x5dfd,
-            0xb58b, 0xa402, 0x9699, 0x8710, 0xf3af, 0xe226, 0xd0bd, 0xc134,
-            0x39c3, 0x284a, 0x1ad1, 0x0b58, 0x7fe7, 0x6e6e, 0x5cf5, 0x4d7c,
-            0xc60c, 0xd785, 0xe51e, 0xf497, 0x8028, 0x91a1, 0xa33a, 0xb2b3,
-            0x4a44, 0x5bcd, 0x6956, 0x78df, 0x0c60, 0x1de9, 0x2f72, 0x3efb,
-            0xd68d, 0xc704, 0xf59f, 0xe416, 0x90a9, 0x8120, 0xb3bb, 0xa232,
-            0x5ac5, 0x4b4c, 0x79d7, 0x685e, 0x1ce1, 0x0d68, 0x3ff3, 0x2e7a,
-            0xe70e, 0xf687, 0xc41c, 0xd595, 0xa12a, 0xb0a3, 0x8238, 0x93b1,
-            0x6b46, 0x7acf, 0x4854, 0x59dd, 0x2d62, 0x3ceb, 0x0e70, 0x1ff9,
-            0xf78f, 0xe606, 0xd49d, 0xc514, 0xb1ab, 0xa022, 0x92b9, 0x8330,
-            0x7bc7, 0x6a4e, 0x58d5, 0x495c, 0x3de3, 0x2c6a, 0x1ef1, 0x0f78
-        ]
+        self._sof_bits = np.unpackbits(np.array([self.SOF], dtype=np.uint8))
+        # headers announcing a longer payload are treated as noise instead of
+        # being waited on (None: accept any 16-bit length)
+        self.max_data_len = max_data_len
+
+        # optional soft-symbol gate (burst_detector.BurstDetector)
+        self.burst_detector = burst_detector
+        # CRC16 repair: the `repair_bits` least reliable bits, at most
+        # `repair_max_flips` of them flipped at once (0: off)
+        self.repair_bits = int(repair_bits)
+        self._flip_patterns = self._make_flip_patterns(self.repair_bits, int(repair_max_flips))
+
+        # Reassembly buffer: bits [_head, _tail) of _ring are pending, with the
+        # burst quality of each bit in _quality and its reliability in
+        # _reliability (inf: unknown). Consumed bits only move _head; the rings
+        # are compacted together when they run out of room.
+        self._ring = np.zeros(32768, dtype=np.uint8)
+        self._quality = np.zeros(32768, dtype=np.uint16)
+        self._reliability = np.full(32768, np.inf, dtype=np.float32)
+        self._head = 0
+        self._tail = 0
+        self._ring_base = 0   # stream bit index of _ring[0]
+        self._searched = 0    # stream bit index up to which SOF hits are counted
+        # (stream bit index of the first bit, capture sample of each symbol)
+        # for the last few decode() calls that passed symbol times
+        self._times = collections.deque(maxlen=SYMBOL_TIME_HISTORY)
+        self.stats = self._new_stats()
+
+        # CRC tables live in crc_engine; kept here for existing callers
+        self.crc = get_crc_engine(crc_backend)
+        self.CRC8_INIT = CRC8_INIT
+        self.CRC8_TAB = CRC8_TAB
+        self.CRC16_INIT = CRC16_INIT
+        self.CRC16_TAB = CRC16_TAB
 
     def _get_crc8_check_sum(self, pch_message, dw_length, uc_crc8):
-        for i in range(dw_length):
-            index = uc_crc8 ^ pch_message[i]
-            uc_crc8 = self.CRC8_TAB[index]
-        return uc_crc8
+        return self.crc.crc8(pch_message, dw_length, uc_crc8)
 
     def _verify_crc8_check_sum(self, pch_message, dw_length):
-        if pch_message is None or dw_length <= 2:
-            return False
-        uc_expected = self._get_crc8_check_sum(pch_message, dw_length - 1, self.CRC8_INIT)
-        return uc_expected == pch_message[dw_length - 1]
+        return self.crc.verify_crc8(pch_message, dw_length)
 
     def _get_crc16_check_sum(self, pch_message, dw_length, w_crc):
-        for i in range(dw_length):
-            ch_data = pch_message[i]
-            index = (w_crc ^ ch_data) & 0x00FF
-            w_crc = (w_crc >> 8) ^ self.CRC16_TAB[index]
-        return w_crc
+        return self.crc.crc16(pch_message, dw_length, w_crc)
 
     def _verify_crc16_check_sum(self, pch_message, dw_length):
         if pch_message is None or dw_length <= 2:
             return False
-        w_expected = self._get_crc16_check_sum(pch_message, dw_length - 2, self.CRC16_INIT)
-        actual_crc_low = pch_message[dw_length - 2]
-        actual_crc_high = pch_message[dw_length - 1]
-        return (w_expected & 0xFF) == actual_crc_low and ((w_expected >> 8) & 0xFF) == actual_crc_high
+        frame = np.frombuffer(bytes(pch_message[:dw_length]), dtype=np.uint8)
+        return bool(self.crc.verify_crc16_rows(frame[None])[0])
+
+    @property
+    def buffer(self):
+        """Pending (not yet consumed) bits of the reassembly buffer, packed MSB first."""
+        return self.bits_to_bytes(self._ring[self._head:self._tail])
+
+    def reset(self):
+        self._head = self._tail = 0
+        self._ring_base = 0
+        self._searched = 0
+        self._times.clear()
+        self.stats = self._new_stats()
+
+    @staticmethod
+    def _new_stats():
+        return {"bits": 0, "packets": 0, "sof_hits": 0, "crc8_errors": 0, "crc16_errors": 0, "repaired": 0,
+                "length_rejects": 0, "last_packet_time": None}
+
+    def _count(self, key, source_name, n=1):
+        self.stats[key] += n
+        REGISTRY.inc(f"radar_decoder_{key}_total", n, source=source_name)
 
     def bits_to_bytes(self, bits):
-        bytes_data = bytearray()
-        for i in range(0, len(bits), 8):
-            if i + 8 > len(bits):
-                break
-            byte_val = 0
-            for j in range(8):
-                byte_val |= (bits[i + j] << (7 - j))
-            bytes_data.append(byte_val)
-        return bytes_data
+        # MSB-first packing of whole bytes; trailing partial byte is dropped
+        bits = np.asarray(bits, dtype=np.uint8)
+        n = len(bits) - len(bits) % 8
+        return bytearray(np.packbits(bits[:n]).tobytes())
 
-    def decode(self, symbols, source_name="src"):
-        new_bytes = self.bits_to_bytes(symbols)
-        self.buffer.extend(new_bytes)
+    def _append(self, new_bits, new_quality, new_reliability):
+        n = len(new_bits)
+        if self._tail + n > len(self._ring):
+            pending = self._tail - self._head
+            rings = [self._ring, self._quality, self._reliability]
+            if pending + n > len(self._ring):
+                size = max(2 * len(self._ring), pending + n)
+                grown = [np.empty(size, dtype=r.dtype) for r in rings]
+            else:
+                grown = rings
+            for old, new in zip(rings, grown):
+                new[:pending] = old[self._head:self._tail]
+            self._ring, self._quality, self._reliability = grown
+            self._ring_base += self._head
+            self._head, self._tail = 0, pending
+        self._ring[self._tail:self._tail + n] = new_bits
+        self._quality[self._tail:self._tail + n] = new_quality
+        self._reliability[self._tail:self._tail + n] = new_reliability
+        self._tail += n
 
-        packets = []
-        while len(self.buffer) >= 9:
-            if self.buffer[0] != self.SOF:
-                self.buffer.pop(0)
-                continue
+    def _find_headers(self, head, tail, source_name="src"):
+        """Bit positions in [head, tail - 72] holding SOF + a valid header CRC8."""
+        ring = self._ring
+        stop = tail - 9 * 8 + 1   # a full minimal frame (9 bytes) must follow
+        if self.burst_detector is not None:
+            match = self.burst_detector.active(self._quality[head:tail])[:stop - head]
+            if not match.any():
+                # nothing in this stretch looks like a burst
+                return np.zeros(0, dtype=np.int64), np.zeros((0, 5), dtype=np.uint8)
+        else:
+            match = np.ones(stop - head, dtype=bool)
+        for i, bit in enumerate(self._sof_bits):
+            match &= ring[head + i:stop + i] == bit
+        candidates = np.flatnonzero(match) + head
+        headers = np.packbits(ring[candidates[:, None] + np.arange(5 * 8)], axis=1)
+        ok = self.crc.verify_crc8_headers(headers)
+        # a pending frame's stretch is searched again next call: count each position once
+        fresh = candidates + self._ring_base >= self._searched
+        self._searched = max(self._searched, self._ring_base + stop)
+        if fresh.any():
+            self._count("sof_hits", source_name, int(fresh.sum()))
+            self._count("crc8_errors", source_name, int((fresh & ~ok).sum()))
+        return candidates[ok], headers[ok]
 
-            try:
-                sof, data_len, seq, crc8_val = struct.unpack('<BHBB', self.buffer[:5])
-            except struct.error:
-                break
+    @staticmethod
+    def _make_flip_patterns(n_bits, max_flips):
+        """(P, n_bits) 0/1 rows: every non-empty set of at most max_flips bits."""
+        rows = [c for w in range(1, min(n_bits, max_flips) + 1) for c in itertools.combinations(range(n_bits), w)]
+        if len(rows) > MAX_REPAIR_CANDIDATES:
+            raise ValueError(f"repair_bits={n_bits}, repair_max_flips={max_flips}: {len(rows)} candidates "
+                             f"per frame (max {MAX_REPAIR_CANDIDATES})")
+        patterns = np.zeros((len(rows), n_bits), dtype=np.uint8)
+        for i, c in enumerate(rows):
+            patterns[i, list(c)] = 1
+        return patterns
 
-            if not self._verify_crc8_check_sum(self.buffer[:5], 5):
-                self.buffer.pop(0)
+    def _repair(self, pos, n_bytes):
+        """
+        Flip combinations of the least reliable bits of the frame at bit `pos`
+        (header excluded, its CRC8 already passed) until CRC16 checks.
+        Returns (frame bytes, bits flipped) or None.
+        """
+        rel = self._reliability[pos + 40:pos + n_bytes * 8]
+        k = min(self.repair_bits, int(np.isfinite(rel).sum()))
+        if k == 0:
+            return None
+        weak = np.argpartition(rel, k - 1)[:k] if k < len(rel) else np.arange(k)
+        patterns = self._flip_patterns
+        if k < self.repair_bits:
+            patterns = patterns[~patterns[:, k:].any(axis=1), :k]
+
+        frames = np.tile(np.packbits(self._ring[pos:pos + n_bytes * 8]), (len(patterns), 1))
+        bit = weak + 40
+        masks = (0x80 >> (bit % 8)).astype(np.uint8)
+        for j in range(k):
+            frames[:, bit[j] // 8] ^= patterns[:, j] * masks[j]
+
+        ok = np.flatnonzero(self.crc.verify_crc16_rows(frames))
+        if len(ok) == 0:
+            return None
+        # several hits: keep the one that flips the least total reliability
+        best = ok[np.argmin(patterns[ok] @ rel[weak])]
+        return frames[best].tobytes(), int(patterns[best].sum())
+
+    def decode(self, symbols, source_name="src", soft=None, reliability=None, times=None):
+        """
+        Args:
+            symbols: hard bits (2 per 4-FSK symbol)
+            soft: soft symbol values for the same symbols (len(symbols) // 2),
+                  used by the burst detector; without it every bit is searched
+            reliability: per-bit reliability (DSP bit_reliabilities), used to
+                         repair frames failing CRC16 when repair_bits > 0
+            times: capture sample index of the same symbols (DSP symbol_times);
+                   packets then carry `sample_index` (first symbol) instead
+                   of `bit_index` (first bit, counted from this decoder's start)
+        Returns:
+            [Packet, ...], each with its verified frame bytes in `frame`
+        """
+        clock = REGISTRY.clock()
+        bits = np.asarray(symbols, dtype=np.uint8)
+        self._count("bits", source_name, len(bits))
+        if times is not None and len(bits):
+            self._times.append((self._ring_base + self._tail, np.asarray(times)))
+        if self.burst_detector is not None and soft is not None:
+            quality = self.burst_detector.quality(soft)
+        else:
+            quality = 0
+        if len(bits):
+            self._append(bits, quality, np.inf if reliability is None else reliability)
+
+        packets = []
+        ring, head, tail = self._ring, self._head, self._tail
+        if tail - head < 9 * 8:
+            clock.lap("decode")
+            return packets
+
+        # Every bit position holding SOF with a full minimal frame behind it,
+        # in order, header CRC8 checked for all of them in one batch.
+        # Candidates inside a consumed frame are skipped via `head`.
+        candidates, headers = self._find_headers(head, tail, source_name)
+        for pos, header in zip(candidates.tolist(), headers):
+            if pos < head:
                 continue
 
+            data_len = int(header[1]) | (int(header[2]) << 8)
+            if self.max_data_len is not None and data_len > self.max_data_len:
+                self._count("length_rejects", source_name)
+                continue
             total_packet_len = 5 + 2 + data_len + 2
-            if len(self.buffer) < total_packet_len:
+            if tail - pos < total_packet_len * 8:
+                # wait for the rest of this frame
+                head = pos
                 break
 
-            packet_data = self.buffer[:total_packet_len]
-            self.buffer = self.buffer[total_packet_len:]
-
-            if not self._verify_crc16_check_sum(packet_data, total_packet_len):
-                self.logger.warning(f"[{source_name}] CRC16 mismatch")
-                continue
+            frame = np.packbits(ring[pos:pos + total_packet_len * 8])
+            packet_data = frame.tobytes()
+            head = pos + total_packet_len * 8
 
-            cmd_id = struct.unpack('<H', packet_data[5:7])[0]
-            payload = packet_data[7:7 + data_len]
+            flipped = 0
+            # one-row batch: the engine's compiled/vectorized path, not the per-byte loop
+            if not self.crc.verify_crc16_rows(frame[None])[0]:
+                repaired = self._repair(pos, total_packet_len) if self.repair_bits else None
+                if repaired is None:
+                    self.logger.warning(f"[{source_name}] CRC16 mismatch")
+                    self._count("crc16_errors", source_name)
+                    continue
+                packet_data, flipped = repaired
+                self._count("repaired", source_name)
 
-            parsed = self.parse_payload(cmd_id, payload)
-            parsed['_source'] = source_name
-            packets.append(parsed)
+            cmd_id = CMD_ID.unpack_from(packet_data, 5)[0]
+            record, error = parse_payload(cmd_id, packet_data, 7, data_len)
+            # first bit of the frame, counted from the start of this decoder's input
+            bit_index = self._ring_base + pos
+            sample = self._sample_index(bit_index) if self._times else None
+            packets.append(Packet(cmd_id, record, error, source_name, packet_data,
+                                  bit_index=bit_index if sample is None else None,
+                                  sample_index=sample, repaired_bits=flipped))
+        else:
+            # no frame pending: every start position with a full minimal frame
+            # behind it has been searched
+            head = max(head, tail - 9 * 8 + 1)
 
+        self._head = head
+        if packets:
+            self._count("packets", source_name, len(packets))
+            self.stats["last_packet_time"] = time.time()
+        clock.lap("decode")
         return packets
 
-    def parse_payload(self, cmd_id, payload):
-        info = {"cmd_id": hex(cmd_id)}
-
-        try:
-            if cmd_id == 0x0A01:
-                if len(payload) >= 24:
-                    pos = struct.unpack('<12H', payload[:24])
-                    info["type"] = "A01_positions"
-                    info["data"] = {
-                        "hero": (pos[0], pos[1]),
-                        "engineer": (pos[2], pos[3]),
-                        "infantry3": (pos[4], pos[5]),
-                        "infantry4": (pos[6], pos[7]),
-                        "aerial": (pos[8], pos[9]),
-                        "sentry": (pos[10], pos[11])
-                    }
-                else:
-                    info["error"] = "payload too short (0x0A01)"
-
-            elif cmd_id == 0x0A02:
-                if len(payload) >= 12:
-                    hps = struct.unpack('<6H', payload[:12])
-                    info["type"] = "A02_hp"
-                    info["data"] = {
-                        "hero": hps[0],
-                        "engineer": hps[1],
-                        "infantry3": hps[2],
-                        "infantry4": hps[3],
-                        "reserved": hps[4],
-                        "sentry": hps[5]
-                    }
-                else:
-                    info["error"] = "payload too short (0x0A02)"
-
-            elif cmd_id == 0x0A03:
-                if len(payload) >= 10:
-                    ammo = struct.unpack('<5H', payload[:10])
-                    info["type"] = "A03_ammo"
-                    info["data"] = {
-                        "hero": ammo[0],
-                        "infantry3": ammo[1],
-                        "infantry4": ammo[2],
-                        "aerial": ammo[3],
-                        "sentry": ammo[4]
-                    }
-                else:
-                    info["error"] = "payload too short (0x0A03)"
-
-            elif cmd_id == 0x0A04:
-                if len(payload) >= 8:
-                    gold_rem, gold_tot, macro = struct.unpack('<HHI', payload[:8])
-                    info["type"] = "A04_macro"
-                    info["data"] = {
-                        "gold_remaining": gold_rem,
-                        "gold_total": gold_tot,
-                        "macro_bits": macro
-                    }
-                else:
-                    info["error"] = "payload too short (0x0A04)"
-
-            elif cmd_id == 0x0A05:
-                if len(payload) >= 36:
-                    def parse_buff(offset):
-                        rec, cool, deff, vuln, att = struct.unpack('<BHBBH', payload[offset:offset + 7])
-                        return {"recovery": rec, "cooling": cool, "defence": deff, "vulnerability": vuln, "attack": att}
-
-                    info["type"] = "A05_buffs"
-                    info["data"] = {
-                        "hero": parse_buff(0),
-                        "engineer": parse_buff(7),
-                        "infantry3": parse_buff(14),
-                        "infantry4": parse_buff(21),
-                        "sentry": parse_buff(28)
-                    }
-                    info["data"]["sentry"]["posture"] = payload[35]
-                else:
-                    info["error"] = "payload too short (0x0A05)"
-
-            elif cmd_id == 0x0A06:
-                if len(payload) >= 6:
-                    key_bytes = payload[:6]
-                    try:
-                        key_str = key_bytes.decode('ascii')
-                    except Exception:
-                        key_str = key_bytes.hex()
-                    info["type"] = "A06_key"
-                    info["data"] = {"key": key_str}
-                else:
-                    info["error"] = "payload too short (0x0A06)"
+    def _sample_index(self, bit_index):
+        """Capture sample of the symbol holding stream bit `bit_index`, None once it left the history."""
+        for first, times in reversed(self._times):
+            if bit_index >= first:
+                k = (bit_index - first) // 2
+                return int(round(times[k])) if k < len(times) else None
+        return None
 
-            else:
-                info["type"] = "unknown"
-                info["raw_hex"] = payload.hex()
+    @staticmethod
+    def print_packets(packets):
+        for p in packets:
+            print(PacketDecoder.format_packet(p))
+
+    @staticmethod
+    def format_packet(p) -> str:
+        """The console block print_packets shows for one packet (a Packet or its to_dict())."""
+        if isinstance(p, Packet):
+            p = p.to_dict()
+        lines = ["-" * 50, f"[{p.get('_source', 'SRC')}] CmdID: {p['cmd_id']} | Type: {p.get('type','Unknown')}"]
+        if "error" in p:
+            lines.append(f"  Error: {p['error']}")
+        elif "data" in p:
+            lines.extend(f"  {k}: {v}" for k, v in p["data"].items())
+        elif "raw_hex" in p:
+            lines.append(f"  Raw: {p['raw_hex']}")
+        lines.append("-" * 50)
+        return "\n".join(lines)
+
+
+class MultiStreamDecoder:
+    """
+    One PacketDecoder per source (channel), so bytes of different channels are
+    never reassembled together. decode()/print_packets() match PacketDecoder.
+    A given source must only be decoded from one thread at a time; different
+    sources may be decoded concurrently.
+    """
 
-        except Exception as e:
-            info["error"] = f"parse error: {e}"
+    def __init__(self, sources=(), **decoder_kwargs):
+        self._kwargs = decoder_kwargs
+        self._lock = threading.Lock()
+        self.decoders = {name: PacketDecoder(**decoder_kwargs) for name in sources}
 
-        return info
+    def stream(self, source_name) -> PacketDecoder:
+        decoder = self.decoders.get(source_name)
+        if decoder is None:
+            with self._lock:
+                decoder = self.decoders.setdefault(source_name, PacketDecoder(**self._kwargs))
+        return decoder
+
+    def decode(self, symbols, source_name="src", soft=None, reliability=None, times=None):
+        return self.stream(source_name).decode(symbols, source_name, soft=soft, reliability=reliability,
+                                               times=times)
+
+    def reset(self):
+        for decoder in list(self.decoders.values()):
+            decoder.reset()
+
+    def stats(self) -> dict:
+        """{source: {bits, packets, sof_hits, crc8_errors, crc16_errors, repaired, length_rejects, last_packet_time}}"""
+        return {name: dict(decoder.stats) for name, decoder in list(self.decoders.items())}
 
     def print_packets(self, packets):
-        for p in packets:
-            print("-" * 50)
-            print(f"[{p.get('_source', 'SRC')}] CmdID: {p['cmd_id']} | Type: {p.get('type','Unknown')}")
-            if "error" in p:
-                print(f"  Error: {p['error']}")
-            elif "data" in p:
-                for k, v in p["data"].items():
-                    print(f"  {k}: {v}")
-            elif "raw_hex" in p:
-                print(f"  Raw: {p['raw_hex']}")
-            print("-" * 50)
+        PacketDecoder.print_packets(packets)
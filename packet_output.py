@@ -0,0 +1,298 @@
+# ============================================================================
+# Packet output: bounded queue in front of pluggable sinks
+# ============================================================================
+# The decode side calls PacketOutput.submit(packets) with packet_types.Packet
+# objects: the batch is stamped (`timestamp`, and `time_s` from
+# `sample_index` when the sample rate is known) and put on a bounded queue
+# without waiting. When the queue is full the batch is dropped and counted,
+# so slow disks, sockets or terminals can never stall reception. One writer
+# thread drains the queue in batches and hands them to every sink; packets
+# only become dicts (Packet.to_dict) here, in the text sinks:
+#
+#   ConsoleSink    : the print_packets block per packet, at most max_per_s
+#                    packets a second (the rest is counted and summarised)
+#   NDJSONFileSink : one JSON object per line (parsed fields, no raw frame)
+#   BinaryFileSink : compact records holding the raw frame (read_binary())
+#   UDPSink        : NDJSON lines packed into datagrams for a local UI
+#   StateSink      : game_state.py, deduplicated state changes (deltas) only
+#
+# A failing sink is logged and skipped; the others keep running.
+# ============================================================================
+import json
+import logging
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+
+from metrics import REGISTRY
+from packet_decoder import PacketDecoder
+
+BINARY_MAGIC = b"RMPK\x01"
+# record header: frame length, source index, sample index (-1: unknown), timestamp
+BINARY_RECORD = struct.Struct("<HBqd")
+
+
+def to_json(packet) -> str:
+    """NDJSON line for a Packet (or its to_dict()); the raw frame stays in the binary log."""
+    if not isinstance(packet, dict):
+        packet = packet.to_dict()
+    return json.dumps({k: v for k, v in packet.items() if k != "_frame"}, ensure_ascii=False)
+
+
+class OutputSink:
+    """Base class: write() gets every batch from the writer thread, in order."""
+
+    name = "sink"
+
+    def write(self, packets: list):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class ConsoleSink(OutputSink):
+    name = "console"
+
+    def __init__(self, max_per_s: float = 20, stream=None):
+        self.max_per_s = float(max_per_s)
+        self.stream = stream or sys.stdout
+        # room for at least one line, so rates below 1/s still print (0.5: one every 2 s)
+        self._capacity = max(1.0, self.max_per_s)
+        self._tokens = self._capacity
+        self._last = time.monotonic()
+        self.suppressed = 0
+
+    def write(self, packets):
+        now = time.monotonic()
+        # token bucket: bursts up to one second's worth, then max_per_s
+        self._tokens = min(self._capacity, self._tokens + (now - self._last) * self.max_per_s)
+        self._last = now
+        shown = min(len(packets), int(self._tokens))
+        self._tokens -= shown
+        self.suppressed += len(packets) - shown
+        if shown:
+            self.stream.write("\n".join(PacketDecoder.format_packet(p) for p in packets[:shown]) + "\n")
+
+    def flush(self):
+        if self.suppressed:
+            self.stream.write(f"... {self.suppressed} packet(s) not shown (console limit {self.max_per_s:g}/s)\n")
+            self.suppressed = 0
+        self.stream.flush()
+
+
+class NDJSONFileSink(OutputSink):
+    name = "ndjson"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=1 << 16)
+
+    def write(self, packets):
+        self._file.write("".join(to_json(p) + "\n" for p in packets))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BinaryFileSink(OutputSink):
+    """
+    File: BINARY_MAGIC, uint16 length + JSON header {"sources": [...]}, then
+    per packet BINARY_RECORD + the raw frame (SOF .. CRC16).
+    """
+
+    name = "binary"
+
+    def __init__(self, path, sources=()):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.sources = list(sources)
+        self._index = {name: i for i, name in enumerate(self.sources)}
+        header = json.dumps({"sources": self.sources}).encode()
+        self._file = open(self.path, "wb", buffering=1 << 16)
+        self._file.write(BINARY_MAGIC + struct.pack("<H", len(header)) + header)
+
+    def write(self, packets):
+        parts = []
+        for p in packets:
+            if not p.frame:
+                continue
+            source = self._index.get(p.source, 0xFF)
+            sample = -1 if p.sample_index is None else p.sample_index
+            parts.append(BINARY_RECORD.pack(len(p.frame), source, sample, p.timestamp or 0.0))
+            parts.append(p.frame)
+        self._file.write(b"".join(parts))
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_binary(path):
+    """Yields (source, sample index or None, timestamp, frame bytes) from a BinaryFileSink file."""
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            raise ValueError(f"{path}: not a packet log")
+        (n,) = struct.unpack("<H", f.read(2))
+        sources = json.loads(f.read(n))["sources"]
+        while True:
+            head = f.read(BINARY_RECORD.size)
+            if len(head) < BINARY_RECORD.size:
+                return
+            length, source, sample, timestamp = BINARY_RECORD.unpack(head)
+            name = sources[source] if source < len(sources) else None
+            yield name, (sample if sample >= 0 else None), timestamp, f.read(length)
+
+
+class UDPSink(OutputSink):
+    """NDJSON lines over UDP, packed up to max_datagram bytes; a full socket drops, never waits."""
+
+    name = "udp"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9200, max_datagram: int = 1400):
+        self.address = (host, int(port))
+        self.max_datagram = int(max_datagram)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self.send_errors = 0
+
+    def write(self, packets):
+        datagram = b""
+        for p in packets:
+            line = to_json(p).encode() + b"\n"
+            if datagram and len(datagram) + len(line) > self.max_datagram:
+                self._send(datagram)
+                datagram = b""
+            datagram += line
+        if datagram:
+            self._send(datagram)
+
+    def _send(self, datagram):
+        try:
+            self._sock.sendto(datagram, self.address)
+        except OSError:
+            # nobody listening / socket buffer full: the UI just misses it
+            self.send_errors += 1
+            REGISTRY.inc("radar_output_send_errors_total", sink=self.name)
+
+    def close(self):
+        self._sock.close()
+
+
+class PacketOutput:
+    def __init__(self, sinks, queue_size: int = 1024, sample_rate: float = None, flush_interval_s: float = 0.5):
+        """
+        Args:
+            sinks: OutputSink instances, all fed every batch
+            queue_size: batches (one submit() each) waiting at most
+            sample_rate: capture rate, for `_time_s` from `_sample_index`
+            flush_interval_s: how often sinks flush their buffered writes
+        """
+        self.logger = logging.getLogger("radar.output")
+        self.sinks = list(sinks)
+        self.sample_rate = sample_rate
+        self.flush_interval_s = float(flush_interval_s)
+        self._queue = queue.Queue(maxsize=int(queue_size))
+        self._stop = threading.Event()
+        self._thread = None
+        self.dropped = 0
+        self.written = 0
+
+    @classmethod
+    def from_config(cls, config: dict, sources=()) -> "PacketOutput":
+        cfg = config.get("output", {})
+        sinks = []
+        if cfg.get("console", True):
+            sinks.append(ConsoleSink(cfg.get("console_max_per_s", 20)))
+        if cfg.get("ndjson_path"):
+            sinks.append(NDJSONFileSink(cfg["ndjson_path"]))
+        if cfg.get("binary_path"):
+            sinks.append(BinaryFileSink(cfg["binary_path"], sources))
+        if cfg.get("udp"):
+            host, _, port = str(cfg["udp"]).rpartition(":")
+            sinks.append(UDPSink(host or "127.0.0.1", int(port)))
+        if config.get("state", {}).get("enabled", False):
+            # imported here: game_state builds on the sinks of this module
+            from game_state import StateSink
+            sinks.append(StateSink.from_config(config))
+        return cls(sinks, queue_size=cfg.get("queue_size", 1024),
+                   sample_rate=config.get("sdr_settings", {}).get("sample_rate_sps"),
+                   flush_interval_s=cfg.get("flush_interval_s", 0.5))
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="packet-output", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, packets):
+        """Queue a batch for the sinks; never blocks (a full queue drops the batch)."""
+        if not packets:
+            return
+        now = time.time()
+        for p in packets:
+            p.timestamp = now
+            if self.sample_rate and p.sample_index is not None:
+                p.time_s = p.sample_index / self.sample_rate
+        try:
+            self._queue.put_nowait(packets)
+        except queue.Full:
+            self.dropped += len(packets)
+            REGISTRY.inc("radar_output_dropped_total", len(packets))
+
+    def _loop(self):
+        next_flush = time.monotonic() + self.flush_interval_s
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            try:
+                batch.extend(self._queue.get(timeout=0.1))
+                # whatever else is waiting goes out in the same write
+                while True:
+                    batch.extend(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._emit("write", batch)
+                self.written += len(batch)
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_interval_s
+                self._emit("flush")
+        # the sinks are only ever touched by this thread, closing included
+        self._emit("close")
+
+    def _emit(self, method, *args):
+        for sink in self.sinks:
+            try:
+                getattr(sink, method)(*args)
+            except Exception as e:
+                self.logger.error(f"Output sink {sink.name} {method} failed: {e}")
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "dropped": self.dropped, "written": self.written}
+
+    def close(self, timeout: float = 2.0):
+        """Drain what is queued, then flush and close every sink (done by the writer thread)."""
+        if self._thread is None:
+            # never started: nothing else uses the sinks
+            self._emit("close")
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # still inside a sink write: it closes the sinks itself once done
+            self.logger.warning(f"Packet output still writing after {timeout:g} s, "
+                                f"{self._queue.qsize()} batch(es) queued; sinks close when it finishes")
+        self._thread = None
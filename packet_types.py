@@ -0,0 +1,204 @@
+# ============================================================================
+# Referee broadcast payloads: typed records and the cmd_id parser registry
+# ============================================================================
+# Every known command has one PayloadSpec in PARSERS (keyed by the integer
+# cmd_id): a precompiled struct.Struct, a flat NamedTuple record with the
+# same fields and a packed NumPy dtype of the same layout. The decoder hands
+# out Packet objects (fixed __slots__ fields, the payload as a record);
+# the nested dict / JSON layout is only built at the output boundary
+# (Packet.to_dict, used by the console, NDJSON and UDP sinks). For batches,
+# to_array() turns the packets of one command into a structured array with a
+# single np.frombuffer over the payloads.
+#
+#   record, error = parse_payload(0x0A02, payload)   # HP(hero=..., ...)
+#   arrays = packets_to_arrays(packets)              # {"A02_hp": ndarray, ...}
+# ============================================================================
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+ROBOTS_A01 = ("hero", "engineer", "infantry3", "infantry4", "aerial", "sentry")
+ROBOTS_A02 = ("hero", "engineer", "infantry3", "infantry4", "reserved", "sentry")
+ROBOTS_A03 = ("hero", "infantry3", "infantry4", "aerial", "sentry")
+ROBOTS_A05 = ("hero", "engineer", "infantry3", "infantry4", "sentry")
+BUFF_FIELDS = ("recovery", "cooling", "defence", "vulnerability", "attack")
+
+# struct code -> NumPy field type (little endian, packed like the struct)
+_NUMPY_CODES = {"B": "u1", "H": "<u2", "I": "<u4"}
+
+Positions = namedtuple("Positions", [f"{r}_{axis}" for r in ROBOTS_A01 for axis in ("x", "y")])
+HP = namedtuple("HP", ROBOTS_A02)
+Ammo = namedtuple("Ammo", ROBOTS_A03)
+Macro = namedtuple("Macro", ["gold_remaining", "gold_total", "macro_bits"])
+Buffs = namedtuple("Buffs", [f"{r}_{f}" for r in ROBOTS_A05 for f in BUFF_FIELDS] + ["sentry_posture"])
+Key = namedtuple("Key", ["key"])
+
+
+class PayloadSpec:
+    """Parser of one command: a record type and the struct code of each of its fields, in payload order."""
+
+    __slots__ = ("cmd_id", "name", "record", "struct", "dtype", "to_data", "convert")
+
+    def __init__(self, cmd_id: int, name: str, record, codes, to_data, convert=None):
+        """
+        Args:
+            record: NamedTuple class, one field per code
+            codes: struct codes of the fields (B, H, I or <n>s)
+            to_data: record -> the legacy "data" dict of the JSON output
+            convert: optional tuple -> tuple applied after unpacking (e.g. bytes -> str)
+        """
+        if len(codes) != len(record._fields):
+            raise ValueError(f"{name}: {len(codes)} codes for {len(record._fields)} fields")
+        self.cmd_id = cmd_id
+        self.name = name
+        self.record = record
+        self.struct = struct.Struct("<" + "".join(codes))
+        self.dtype = np.dtype([(field, _NUMPY_CODES.get(code, "S" + code[:-1]))
+                               for field, code in zip(record._fields, codes)])
+        self.to_data = to_data
+        self.convert = convert
+
+    @property
+    def size(self) -> int:
+        return self.struct.size
+
+    def parse(self, buf, offset: int = 0):
+        values = self.struct.unpack_from(buf, offset)
+        if self.convert is not None:
+            values = self.convert(values)
+        return self.record._make(values)
+
+
+PARSERS = {}
+
+
+def register(spec: PayloadSpec) -> PayloadSpec:
+    PARSERS[spec.cmd_id] = spec
+    return spec
+
+
+def _key_text(values):
+    try:
+        return (values[0].decode("ascii"),)
+    except UnicodeDecodeError:
+        return (values[0].hex(),)
+
+
+def _buffs_data(rec):
+    data = {r: {f: rec[i * 5 + k] for k, f in enumerate(BUFF_FIELDS)} for i, r in enumerate(ROBOTS_A05)}
+    data["sentry"]["posture"] = rec.sentry_posture
+    return data
+
+
+register(PayloadSpec(0x0A01, "A01_positions", Positions, ["H"] * 12,
+                     lambda rec: {r: (rec[2 * i], rec[2 * i + 1]) for i, r in enumerate(ROBOTS_A01)}))
+register(PayloadSpec(0x0A02, "A02_hp", HP, ["H"] * 6, lambda rec: rec._asdict()))
+register(PayloadSpec(0x0A03, "A03_ammo", Ammo, ["H"] * 5, lambda rec: rec._asdict()))
+register(PayloadSpec(0x0A04, "A04_macro", Macro, ["H", "H", "I"], lambda rec: rec._asdict()))
+register(PayloadSpec(0x0A05, "A05_buffs", Buffs, ["B", "H", "B", "B", "H"] * 5 + ["B"], _buffs_data))
+register(PayloadSpec(0x0A06, "A06_key", Key, ["6s"], lambda rec: rec._asdict(), convert=_key_text))
+
+
+def parse_payload(cmd_id: int, buf, offset: int = 0, length: int = None):
+    """
+    (record, error) for the payload at buf[offset:offset + length].
+    Unknown commands give (None, None); a payload shorter than the command's
+    layout gives (None, "payload too short (0x0A01)").
+    """
+    spec = PARSERS.get(cmd_id)
+    if spec is None:
+        return None, None
+    if length is None:
+        length = len(buf) - offset
+    if length < spec.size:
+        return None, f"payload too short (0x{cmd_id:04X})"
+    return spec.parse(buf, offset), None
+
+
+class Packet:
+    """One verified frame. The payload is a record of PARSERS[cmd_id] (None: unknown command or error)."""
+
+    __slots__ = ("cmd_id", "record", "error", "source", "frame", "bit_index", "sample_index",
+                 "repaired_bits", "timestamp", "time_s")
+
+    def __init__(self, cmd_id: int, record, error=None, source=None, frame: bytes = b"",
+                 bit_index=None, sample_index=None, repaired_bits: int = 0):
+        self.cmd_id = cmd_id
+        self.record = record
+        self.error = error
+        self.source = source
+        self.frame = frame
+        self.bit_index = bit_index        # first bit, counted from the decoder's start
+        self.sample_index = sample_index  # capture sample of the first symbol, when known
+        self.repaired_bits = repaired_bits
+        self.timestamp = None             # set by PacketOutput.submit
+        self.time_s = None
+
+    @property
+    def type(self) -> str:
+        spec = PARSERS.get(self.cmd_id)
+        return spec.name if spec is not None else "unknown"
+
+    @property
+    def payload(self) -> bytes:
+        # SOF .. CRC8 (5 bytes) + cmd_id (2) in front, CRC16 (2) behind
+        return self.frame[7:-2]
+
+    def to_dict(self) -> dict:
+        """The JSON layout of the output sinks: cmd_id as hex, nested data, `_` metadata."""
+        out = {"cmd_id": hex(self.cmd_id)}
+        if self.error is not None:
+            out["error"] = self.error
+        elif self.record is None:
+            out["type"] = "unknown"
+            out["raw_hex"] = self.payload.hex()
+        else:
+            out["type"] = self.type
+            out["data"] = PARSERS[self.cmd_id].to_data(self.record)
+        out["_source"] = self.source
+        if self.sample_index is None:
+            out["_bit_index"] = self.bit_index
+        else:
+            out["_sample_index"] = self.sample_index
+        out["_frame"] = self.frame
+        if self.repaired_bits:
+            out["_repaired_bits"] = self.repaired_bits
+        if self.timestamp is not None:
+            out["_timestamp"] = self.timestamp
+        if self.time_s is not None:
+            out["_time_s"] = self.time_s
+        return out
+
+    def __repr__(self):
+        return (f"Packet({hex(self.cmd_id)}, {self.record if self.error is None else self.error!r}, "
+                f"source={self.source!r}, sample_index={self.sample_index})")
+
+
+def to_array(packets, cmd_id: int) -> np.ndarray:
+    """
+    Structured array of the packets carrying cmd_id (others are skipped):
+    sample_index (-1: unknown), time_s (nan: unknown), source, then the
+    payload fields of PARSERS[cmd_id].
+    """
+    spec = PARSERS[cmd_id]
+    rows = [p for p in packets if p.cmd_id == cmd_id and p.record is not None]
+    sources = max((len(str(p.source)) for p in rows), default=1)
+    dtype = np.dtype([("sample_index", "<i8"), ("time_s", "<f8"), ("source", f"U{sources}")] + spec.dtype.descr)
+    out = np.empty(len(rows), dtype=dtype)
+    if not rows:
+        return out
+    out["sample_index"] = [-1 if p.sample_index is None else p.sample_index for p in rows]
+    out["time_s"] = [np.nan if p.time_s is None else p.time_s for p in rows]
+    out["source"] = [p.source for p in rows]
+    # every payload field at once, straight from the frame bytes
+    raw = np.frombuffer(b"".join(p.frame[7:7 + spec.size] for p in rows), dtype=spec.dtype)
+    for field in spec.dtype.names:
+        out[field] = raw[field]
+    return out
+
+
+def packets_to_arrays(packets) -> dict:
+    """{type name: to_array(...)} for every known command present in packets."""
+    present = {p.cmd_id for p in packets if p.record is not None}
+    return {PARSERS[cmd].name: to_array(packets, cmd) for cmd in sorted(present)}
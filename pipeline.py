@@ -0,0 +1,282 @@
+# ============================================================================
+# Pipelined receiver runtime: RX thread -> channel workers -> output thread
+# ============================================================================
+# RX thread   : the driver reads straight into a fixed ring of preallocated
+#               complex64 buffers (read_into, no per-buffer allocation). When
+#               every buffer is still in use downstream the read still happens
+#               (into a scratch buffer, so the driver never stalls) and the
+#               buffer is counted as an overflow and dropped. Sources that
+#               are not live (file replay) wait for a buffer instead.
+# Workers     : each owns a Channelizer and the per-channel decoders for a
+#               fixed subset of channels (by default one channel per worker),
+#               so filter and reassembly state stay with one thread. NumPy/SciPy
+#               release the GIL in the heavy loops, so workers run in parallel.
+# Output      : reorders worker results by buffer sequence number and hands
+#               packets out in channel plan order, so output is deterministic.
+# ============================================================================
+import logging
+import queue
+import threading
+import time
+
+import numpy as np
+
+from metrics import REGISTRY
+
+LOAD_SMOOTHING = 0.1   # EWMA weight of the newest buffer in the per-worker load
+
+
+class BufferRing:
+    """Fixed pool of preallocated complex64 buffers shared between threads."""
+
+    def __init__(self, num_buffers: int, buffer_size: int):
+        self.buffers = [np.zeros(buffer_size, dtype=np.complex64) for _ in range(num_buffers)]
+        self._free = queue.Queue()
+        self._refs = [0] * num_buffers
+        self._lock = threading.Lock()
+        for i in range(num_buffers):
+            self._free.put(i)
+
+    def acquire(self):
+        """Index of a free buffer, or None when all buffers are in flight."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return None
+
+    def hand_out(self, idx: int, consumers: int):
+        with self._lock:
+            self._refs[idx] = consumers
+
+    def release(self, idx: int):
+        with self._lock:
+            self._refs[idx] -= 1
+            done = self._refs[idx] <= 0
+        if done:
+            self._free.put(idx)
+
+    def in_use(self) -> int:
+        return len(self.buffers) - self._free.qsize()
+
+
+class ReceiverPipeline:
+    def __init__(self, driver, dsp, channels, decoder, on_packets,
+                 num_buffers=8, dsp_workers=1, on_samples=None, recorder=None):
+        """
+        Args:
+            driver: SDRDriver (or anything with read_into(buf) and buffer_size)
+            dsp: DSPProcessor
+            channels: [(name, offset_hz), ...] from calculate_channel_plan
+            decoder: MultiStreamDecoder (one reassembly buffer per channel name);
+                     each channel is only ever decoded by the worker that owns it
+            on_packets: callback(packets), called in order from the output thread;
+                        must not block (PacketOutput.submit)
+            num_buffers: size of the RX buffer ring
+            dsp_workers: number of worker threads, <= 0 for one per channel
+                         (capped at the channel count)
+            on_samples: optional callback(samples), called by the first DSP worker
+            recorder: optional IQRecorder, fed every buffer read (dropped ones too)
+        """
+        self.logger = logging.getLogger("radar.pipeline")
+        self.driver = driver
+        self.decoder = decoder
+        self.channels = list(channels)
+        self.on_packets = on_packets
+        self.on_samples = on_samples
+        self.recorder = recorder
+        self._live = getattr(driver, "live", True)
+        self._sample_rate = getattr(driver, "sample_rate", None)
+
+        self.ring = BufferRing(num_buffers, driver.buffer_size)
+        self._scratch = np.empty(driver.buffer_size, dtype=np.complex64)
+
+        # channels are dealt round-robin to workers; each worker keeps its own
+        # channelizer (and filter state) for its channels
+        n_workers = len(self.channels) if int(dsp_workers) <= 0 else int(dsp_workers)
+        n_workers = max(1, min(n_workers, len(self.channels)))
+        self._assignments = [list(range(w, len(self.channels), n_workers)) for w in range(n_workers)]
+        self._channelizers = [
+            dsp.open_channelizer([self.channels[k][1] for k in chans]) for chans in self._assignments
+        ]
+        self._dsp_queues = [queue.Queue(maxsize=num_buffers) for _ in range(n_workers)]
+        self._output_queue = queue.Queue(maxsize=num_buffers * n_workers)
+        # per worker: processing time / buffer duration, smoothed (> 1: falling behind)
+        self._load = [0.0] * n_workers
+
+        self._stop = threading.Event()
+        self._drained = threading.Event()
+        self._total_buffers = None   # set once the source reports end of data
+        self._threads = []
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "buffers": 0,
+            "samples": 0,
+            "overflows": 0,
+            "read_errors": 0,
+            "packets": 0,
+            "max_ring_in_use": 0,
+            "max_output_queue": 0,
+        }
+
+    # ------------------------------------------------------------------ control
+
+    def start(self):
+        self._stop.clear()
+        self._drained.clear()
+        self._total_buffers = None
+        self._threads = [threading.Thread(target=self._rx_loop, name="rx", daemon=True)]
+        for w in range(len(self._assignments)):
+            self._threads.append(threading.Thread(target=self._dsp_loop, args=(w,), name=f"dsp{w}", daemon=True))
+        self._threads.append(threading.Thread(target=self._output_loop, name="output", daemon=True))
+        for t in self._threads:
+            t.start()
+        self.logger.info(f"Pipeline started: {len(self._assignments)} channel worker(s), {len(self.ring.buffers)} buffers")
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def finished(self) -> bool:
+        """True once a finite source (file replay) is exhausted and fully decoded."""
+        return self._drained.is_set()
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            out = dict(self._stats)
+        out["ring_in_use"] = self.ring.in_use()
+        out["dsp_queue"] = [q.qsize() for q in self._dsp_queues]
+        out["output_queue"] = self._output_queue.qsize()
+        out["load"] = list(self._load)
+        if hasattr(self.decoder, "stats"):
+            out["streams"] = self.decoder.stats()
+        out["offsets_hz"] = {
+            self.channels[k][0]: offset
+            for chans, channelizer in zip(self._assignments, self._channelizers)
+            for k, offset in zip(chans, channelizer.estimated_offsets_hz)
+        }
+        return out
+
+    def _put(self, q, item):
+        # blocking put that still notices stop(): a full queue is backpressure
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+        REGISTRY.inc(f"radar_pipeline_{key}_total", n)
+
+    # ------------------------------------------------------------------ stages
+
+    def _rx_loop(self):
+        seq = 0
+        while not self._stop.is_set():
+            idx = self.ring.acquire()
+            while idx is None and not self._live and not self._stop.is_set():
+                time.sleep(0.001)
+                idx = self.ring.acquire()
+            # consumers are behind: keep draining the device, drop the data
+            target = self._scratch if idx is None else self.ring.buffers[idx]
+            n = self.driver.read_into(target)
+            if n <= 0:
+                if idx is not None:
+                    self.ring.release(idx)
+                if getattr(self.driver, "finished", False):
+                    self._total_buffers = seq
+                    break
+                self._count("read_errors")
+                continue
+            if self.recorder is not None:
+                self.recorder.write(target[:n])
+            if idx is None:
+                self._count("overflows")
+                continue
+
+            self.ring.hand_out(idx, len(self._dsp_queues))
+            for q in self._dsp_queues:
+                q.put((seq, idx, n))
+            seq += 1
+            in_use = self.ring.in_use()
+            with self._stats_lock:
+                self._stats["buffers"] += 1
+                self._stats["samples"] += n
+                self._stats["max_ring_in_use"] = max(self._stats["max_ring_in_use"], in_use)
+            REGISTRY.set("radar_pipeline_ring_in_use", in_use)
+
+    def _dsp_loop(self, worker: int):
+        q = self._dsp_queues[worker]
+        channelizer = self._channelizers[worker]
+        chans = self._assignments[worker]
+        while not self._stop.is_set():
+            try:
+                seq, idx, n = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            samples = self.ring.buffers[idx][:n]
+            t0 = time.perf_counter()
+            try:
+                if worker == 0 and self.on_samples is not None:
+                    self.on_samples(samples)
+                bits = channelizer.process(samples)
+                soft = list(zip(channelizer.symbol_values, channelizer.bit_reliabilities,
+                                channelizer.symbol_times))
+            except Exception as e:
+                self.logger.error(f"Worker {worker} DSP failed: {e}")
+                bits = [np.array([], dtype=np.uint8) for _ in chans]
+                soft = [(None, None, None)] * len(chans)
+            finally:
+                self.ring.release(idx)
+
+            results = []
+            for k, channel_bits, (channel_soft, reliability, times) in zip(chans, bits, soft):
+                if len(channel_bits) == 0:
+                    continue
+                try:
+                    packets = self.decoder.decode(channel_bits, self.channels[k][0],
+                                                  soft=channel_soft, reliability=reliability, times=times)
+                except Exception as e:
+                    self.logger.error(f"Worker {worker} decode failed: {e}")
+                    continue
+                if packets:
+                    results.append((k, packets))
+            if self._sample_rate:
+                load = (time.perf_counter() - t0) * self._sample_rate / n
+                self._load[worker] += LOAD_SMOOTHING * (load - self._load[worker])
+                REGISTRY.set("radar_realtime_load", self._load[worker], worker=worker)
+            self._put(self._output_queue, (seq, worker, results))
+            with self._stats_lock:
+                self._stats["max_output_queue"] = max(self._stats["max_output_queue"], self._output_queue.qsize())
+
+    def _output_loop(self):
+        n_workers = len(self._assignments)
+        pending = {}   # seq -> {channel index: packets}
+        parts = {}     # seq -> number of worker results received
+        next_seq = 0
+        while not self._stop.is_set():
+            try:
+                seq, _, results = self._output_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._total_buffers is not None and next_seq >= self._total_buffers:
+                    self._drained.set()
+                continue
+            pending.setdefault(seq, {}).update(results)
+            parts[seq] = parts.get(seq, 0) + 1
+
+            # emit every buffer whose workers have all reported, in sequence order
+            while parts.get(next_seq) == n_workers:
+                by_channel = pending.pop(next_seq)
+                del parts[next_seq]
+                next_seq += 1
+                for k in sorted(by_channel):
+                    packets = by_channel[k]
+                    self._count("packets", len(packets))
+                    clock = REGISTRY.clock()
+                    self.on_packets(packets)
+                    clock.lap("output")
+
@@ -5,13 +5,21 @@ import numpy as np
 from typing import Optional, Union
 import logging
 
+from metrics import REGISTRY
+from sim_device import SIMULATED_DRIVERS, SimulatedDevice
+
 try:
     import SoapySDR
     from SoapySDR import SOAPY_SDR_RX, SOAPY_SDR_CF32
     SOAPY_AVAILABLE = True
 except ImportError:
+    # 没有 SoapySDR 时只能使用模拟设备 (device.driver = "simulated")，open() 时再报错
+    from sim_device import SOAPY_SDR_RX, SOAPY_SDR_CF32
     SOAPY_AVAILABLE = False
-    print("警告: SoapySDR 未安装")
+
+# readStream 返回的 SoapySDR 错误码
+SOAPY_ERRORS = {-1: "timeout", -2: "stream_error", -3: "corruption", -4: "overflow",
+                -5: "not_supported", -6: "time_error", -7: "underflow"}
 
 class SDRDriver:
     def __init__(self, config: dict):
@@ -36,12 +44,16 @@ class SDRDriver:
         # 这里的带宽设置跟采样率一致，确保不滤除干扰信号
         self.bandwidth = self.sample_rate 
         self.buffer_size = self.cfg["processing"]["buffer_size"]
+        # 各错误码的累计次数 (readStream 返回 <0 时不再静默丢弃)
+        self.read_errors = {}
+        # device.driver = "simulated": 按采样率节拍产生 IQ 的模拟设备 (sim_device.py)，无需硬件
+        self.simulated = self.cfg["device"]["driver"] in SIMULATED_DRIVERS
         
         self.logger.info(f"SDR 驱动初始化目标: 频率={self.center_freq/1e6:.4f}MHz, 采样率={self.sample_rate/1e6}Msps")
 
     def open(self):
-        if not SOAPY_AVAILABLE:
-            raise RuntimeError("SoapySDR 未安装")
+        if not SOAPY_AVAILABLE and not self.simulated:
+            raise RuntimeError("SoapySDR 未安装 (无硬件测试可用 device.driver = \"simulated\")")
         
         try:
             # 1. 连接设备
@@ -52,7 +64,7 @@ class SDRDriver:
                 args += "," + self.cfg["device"]["args"]
 
             self.logger.info(f"正在连接设备: {args}")
-            self.sdr = SoapySDR.Device(args)
+            self.sdr = SimulatedDevice(self.cfg) if self.simulated else SoapySDR.Device(args)
             
             channel = 0
             
@@ -87,22 +99,39 @@ class SDRDriver:
             self.logger.error(f"打开设备失败: {e}")
             raise RuntimeError(f"无法打开 SDR: {e}")
 
-    def read_samples(self, num_samples: Optional[int] = None) -> np.ndarray:
+    def read_into(self, buff: np.ndarray, num_samples: Optional[int] = None) -> int:
+        """
+        直接读入调用方预分配的 complex64 缓冲区 (不产生新数组)
+        Returns:
+            实际读到的样本数; <0 为 SoapySDR 错误码
+        """
         if not self._opened:
             raise RuntimeError("设备未打开")
-        
+
         if num_samples is None:
-            num_samples = self.buffer_size
-        
-        buff = np.zeros(num_samples, dtype=np.complex64)
+            num_samples = min(self.buffer_size, len(buff))
+
         sr = self.sdr.readStream(self.rx_stream, [buff], num_samples)
-        
         if sr.ret < 0:
-            # 这里的 log 太多会刷屏，可以注释掉
-            # self.logger.warning(f"读取错误: {sr.ret}")
+            error = SOAPY_ERRORS.get(sr.ret, str(sr.ret))
+            self.read_errors[error] = self.read_errors.get(error, 0) + 1
+            REGISTRY.inc("radar_sdr_read_errors_total", error=error)
+        else:
+            REGISTRY.inc("radar_sdr_samples_total", sr.ret)
+        return sr.ret
+
+    def read_samples(self, num_samples: Optional[int] = None) -> np.ndarray:
+        if num_samples is None:
+            num_samples = self.buffer_size
+
+        buff = np.empty(num_samples, dtype=np.complex64)
+        ret = self.read_into(buff, num_samples)
+
+        if ret < 0:
+            # 错误已在 read_into 中按错误码计数 (read_errors / metrics)，这里不逐次打印以免刷屏
             return np.array([], dtype=np.complex64)
-        
-        return buff[:sr.ret]
+
+        return buff[:ret]
 
     def close(self):
         if self._opened and self.sdr:
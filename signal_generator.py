@@ -0,0 +1,178 @@
+# ============================================================================
+# Synthetic 4-RRC-FSK transmitter for benchmarks and offline checks
+# ============================================================================
+# Builds valid referee frames (SOF 0xA5, header CRC8, cmd_id, payload, frame
+# CRC16), maps them 00->-3, 01->-1, 10->1, 11->3 x fsk_deviation_hz, shapes
+# the frequency with the same RRC as the receiver and FM-modulates at the
+# configured sample rate. Impairments are added on top: AWGN (SNR measured
+# in the channel filter bandwidth), carrier frequency offset and a CW jammer
+# tone. Every call returns the ground truth (sample index of each frame's
+# first symbol, frame bytes) so decoders can be scored frame by frame.
+#
+#   gen = SignalGenerator(config, seed=1)
+#   iq, truth = gen.burst_train(gen.random_frames(100), offset_hz=250e3, snr_db=8)
+# ============================================================================
+import struct
+
+import numpy as np
+
+from crc_engine import get_crc_engine
+from dsp_processor import _rrc_design
+
+SOF = 0xA5
+
+# payload length of each broadcast command (see packet_types.PARSERS)
+PAYLOAD_SIZES = {
+    0x0A01: 24,  # positions, 12 x uint16
+    0x0A02: 12,  # HP, 6 x uint16
+    0x0A03: 10,  # ammo, 5 x uint16
+    0x0A04: 8,   # gold + macro bits
+    0x0A05: 36,  # buffs, 5 x 7 bytes + sentry posture
+    0x0A06: 6,   # key, ASCII
+}
+
+KEY_GUARD = 2  # symbols of carrier before and after every burst
+
+_crc = get_crc_engine("auto")
+
+
+def build_frame(cmd_id: int, payload: bytes, seq: int = 0) -> bytes:
+    """SOF | data_len | seq | CRC8 | cmd_id | payload | CRC16, all little endian."""
+    header = struct.pack("<BHB", SOF, len(payload), seq & 0xFF)
+    header += bytes([_crc.crc8(header)])
+    body = header + struct.pack("<H", cmd_id) + bytes(payload)
+    return body + struct.pack("<H", _crc.crc16(body))
+
+
+def random_payload(cmd_id: int, rng: np.random.Generator) -> bytes:
+    if cmd_id == 0x0A06:
+        return bytes(rng.integers(ord("A"), ord("Z") + 1, PAYLOAD_SIZES[cmd_id], dtype=np.uint8))
+    if cmd_id in (0x0A01, 0x0A02, 0x0A03):
+        # coordinates / HP / ammo: small uint16 values like the real feed
+        return rng.integers(0, 1000, PAYLOAD_SIZES[cmd_id] // 2, dtype=np.uint16).astype("<u2").tobytes()
+    return bytes(rng.integers(0, 256, PAYLOAD_SIZES.get(cmd_id, 8), dtype=np.uint8))
+
+
+def bytes_to_bits(data: bytes) -> np.ndarray:
+    return np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+
+
+class SignalGenerator:
+    def __init__(self, config: dict, seed: int = 0):
+        """
+        Args:
+            config: same dict as DSPProcessor; uses sample rate, symbol rate,
+                    fsk_deviation_hz, filter_bandwidth_hz and the RRC settings
+            seed: all random frames, gaps and noise come from this seed
+        """
+        demod = config["demodulation"]
+        self.sample_rate = float(config["sdr_settings"]["sample_rate_sps"])
+        self.symbol_rate = float(demod["symbol_rate_bps"])
+        self.fsk_dev = float(demod["fsk_deviation_hz"])
+        self.filter_bw = float(demod["filter_bandwidth_hz"])
+        self.sps = int(round(self.sample_rate / self.symbol_rate))
+        if abs(self.sample_rate / self.symbol_rate - self.sps) > 1e-9:
+            raise ValueError(f"the generator needs an integer samples per symbol "
+                             f"({self.sample_rate / self.symbol_rate:g})")
+        # odd length: symbol peaks fall on whole samples
+        self.rrc = _rrc_design(demod.get("rrc_alpha", 0.25), float(self.sps), demod.get("rrc_num_taps", 88) | 1)
+        # impulse scale so that TX RRC * RX RRC peaks at the level itself
+        self._pulse_gain = 1.0 / np.max(np.convolve(self.rrc, self.rrc))
+        self._delay = (len(self.rrc) - 1) // 2
+        # leading samples that put every symbol peak on a multiple of sps
+        # (the sampling phase "fixed" timing assumes)
+        self._lead = -self._delay % self.sps
+        self.rng = np.random.default_rng(seed)
+        self._seq = 0
+
+    def random_frames(self, n: int, cmd_ids=None) -> list:
+        """n valid frames with random payloads, commands drawn from cmd_ids (default: all)."""
+        cmd_ids = list(PAYLOAD_SIZES) if cmd_ids is None else list(cmd_ids)
+        frames = []
+        for cmd in self.rng.choice(cmd_ids, n):
+            frames.append(build_frame(int(cmd), random_payload(int(cmd), self.rng), self._seq))
+            self._seq += 1
+        return frames
+
+    def levels(self, bits: np.ndarray) -> np.ndarray:
+        """4-FSK level (in fsk_dev units, -3/-1/1/3) of every bit pair."""
+        pairs = np.asarray(bits, dtype=np.int64).reshape(-1, 2)
+        return 2 * (2 * pairs[:, 0] + pairs[:, 1]) - 3
+
+    def frequency(self, levels: np.ndarray) -> np.ndarray:
+        """
+        RRC-shaped instantaneous frequency (Hz), one symbol every sps samples;
+        symbol k peaks at sample k * sps + (len(rrc) - 1) // 2.
+        """
+        impulses = np.zeros(len(levels) * self.sps)
+        impulses[::self.sps] = np.asarray(levels) * self.fsk_dev * self._pulse_gain
+        return np.convolve(impulses, self.rrc)
+
+    def burst_train(self, frames, offset_hz: float = 0.0, gap_symbols=(40, 400), idle: str = "off",
+                    snr_db=None, cfo_hz: float = 0.0, jammer_hz=None, jammer_db: float = 0.0):
+        """
+        Frames as separate bursts with random gaps between them, all on one
+        transmitter symbol clock.
+
+        Args:
+            frames: frame bytes (random_frames / build_frame)
+            offset_hz: channel offset from the capture center
+            gap_symbols: (min, max) idle symbols before every burst and after the last
+            idle: "off" (carrier keyed off between bursts) or "random" (random
+                  symbols, i.e. a continuous carrier)
+            snr_db, cfo_hz, jammer_hz, jammer_db: see impair()
+        Returns:
+            (complex64 IQ, [(sample index of the first symbol, frame bytes), ...])
+        """
+        lo, hi = gap_symbols
+        levels, keyed, truth = [], [], []
+        n_sym = 0
+        for frame in list(frames) + [None]:
+            gap = int(self.rng.integers(lo, hi + 1))
+            if idle == "random":
+                levels.append(self.rng.choice([-3, -1, 1, 3], gap))
+            else:
+                levels.append(np.zeros(gap, dtype=np.int64))
+            keyed.append(np.full(gap, idle == "random"))
+            n_sym += gap
+            if frame is None:
+                break
+            frame_levels = self.levels(bytes_to_bits(frame))
+            truth.append((self._lead + n_sym * self.sps + self._delay, bytes(frame)))
+            levels.append(frame_levels)
+            keyed.append(np.ones(len(frame_levels), dtype=bool))
+            n_sym += len(frame_levels)
+        freq = np.concatenate((np.zeros(self._lead), self.frequency(np.concatenate(levels))))
+
+        # carrier on from KEY_GUARD symbols before a burst to KEY_GUARD after
+        keyed = np.concatenate(keyed)
+        guard = np.ones(2 * KEY_GUARD + 1)
+        keyed = np.convolve(keyed, guard)[KEY_GUARD:KEY_GUARD + len(keyed)] > 0
+        amp = np.zeros(len(freq))
+        shift = self._lead + self._delay - self.sps // 2
+        amp[shift:shift + len(keyed) * self.sps] = np.repeat(keyed, self.sps)
+
+        iq = amp * np.exp(2j * np.pi * np.cumsum(freq) / self.sample_rate)
+        return self.impair(iq, offset_hz, snr_db, cfo_hz, jammer_hz, jammer_db), truth
+
+    def impair(self, iq: np.ndarray, offset_hz: float = 0.0, snr_db=None, cfo_hz: float = 0.0,
+               jammer_hz=None, jammer_db: float = 0.0) -> np.ndarray:
+        """
+        Shift to offset_hz + cfo_hz and add a CW jammer and white noise.
+
+        Args:
+            snr_db: burst power (1.0) over the noise power inside the channel
+                    filter bandwidth; None for no noise
+            jammer_hz: tone frequency relative to the capture center, None for none
+            jammer_db: tone power relative to the burst power
+        """
+        n = np.arange(len(iq))
+        out = iq * np.exp(2j * np.pi * (offset_hz + cfo_hz) / self.sample_rate * n)
+        if jammer_hz is not None:
+            phase = self.rng.uniform(0, 2 * np.pi)
+            out += 10 ** (jammer_db / 20) * np.exp(1j * (2 * np.pi * jammer_hz / self.sample_rate * n + phase))
+        if snr_db is not None:
+            # white over the whole sample rate, so the total is scaled up by fs / bandwidth
+            sigma = np.sqrt(10 ** (-snr_db / 10) * self.sample_rate / self.filter_bw / 2)
+            out += sigma * (self.rng.standard_normal(len(out)) + 1j * self.rng.standard_normal(len(out)))
+        return out.astype(np.complex64)
@@ -0,0 +1,240 @@
+# ============================================================================
+# Simulated SoapySDR device (device.driver = "simulated")
+# ============================================================================
+# Implements the part of SoapySDR.Device that SDRDriver uses, so the real
+# driver code path (readStream return codes, read_errors, metrics) runs
+# without hardware. The IQ is a loop of either synthetic bursts on every
+# channel of the plan (SignalGenerator, white noise at simulation.snr_db) or
+# a replayed recording (simulation.source = path).
+#
+# Pacing follows a virtual device clock started by activateStream: at time t
+# the device has produced (t - t0) * sample_rate samples into a FIFO of
+# simulation.fifo_ms. readStream sleeps until the requested samples exist.
+# When the reader lags by more than the FIFO, new samples are lost until
+# there is room again and the next readStream returns SOAPY_SDR_OVERFLOW
+# (-4) once, like a real device whose driver buffers ran full; reads then
+# continue with the buffered samples, the gap shows in the returned timeNs.
+# Dropped samples and the backlog (FIFO fill) are counted
+# (radar_sim_dropped_samples_total, radar_sim_backlog_seconds) and logged
+# when the stream stops.
+# ============================================================================
+import json
+import logging
+import time
+from collections import deque, namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from iq_recorder import sigmf_paths
+from metrics import REGISTRY
+
+# SoapySDR constants (same values as the C API), for use without SoapySDR
+SOAPY_SDR_TX = 0
+SOAPY_SDR_RX = 1
+SOAPY_SDR_CF32 = "CF32"
+SOAPY_SDR_TIMEOUT = -1
+SOAPY_SDR_OVERFLOW = -4
+SOAPY_SDR_HAS_TIME = 1 << 2
+
+SIMULATED_DRIVERS = ("simulated",)
+
+StreamResult = namedtuple("StreamResult", ["ret", "flags", "timeNs"])
+
+
+class SimulatedDevice:
+    def __init__(self, config: dict):
+        """
+        Args:
+            config: the SDRDriver config; reads the "simulation" section and,
+                    for synthetic IQ, the demodulation settings and channel plan
+        """
+        self.cfg = config
+        self.sim = config.get("simulation", {})
+        self.logger = logging.getLogger("radar.sim")
+        self.sample_rate = float(config["sdr_settings"]["sample_rate_sps"])
+        self.center_freq = config.get("center_frequency_hz")
+        self.gain = config["sdr_settings"].get("gain_db")
+        self.agc = False
+        self.bandwidth = self.sample_rate
+
+        self._data = None
+        self._active = False
+        self._t0 = None
+        self._rate = self.sample_rate
+        self._capacity = 0
+        self._produced = 0     # samples the device clock has produced so far
+        self._fill = 0
+        self._segments = deque()
+        self._overflow = False
+        self.stats = {}
+
+    # ------------------------------------------------------------------ settings
+
+    def setSampleRate(self, direction, channel, rate):
+        self.sample_rate = float(rate)
+
+    def getSampleRate(self, direction, channel):
+        return self.sample_rate
+
+    def setFrequency(self, direction, channel, freq):
+        self.center_freq = float(freq)
+
+    def getFrequency(self, direction, channel):
+        return self.center_freq
+
+    def setGainMode(self, direction, channel, automatic):
+        self.agc = bool(automatic)
+
+    def setGain(self, direction, channel, gain):
+        self.gain = float(gain)
+
+    def setBandwidth(self, direction, channel, bandwidth):
+        self.bandwidth = float(bandwidth)
+
+    # ------------------------------------------------------------------ stream
+
+    def setupStream(self, direction, fmt, channels=(0,)):
+        if direction != SOAPY_SDR_RX or fmt != SOAPY_SDR_CF32:
+            raise RuntimeError("simulated device: only RX / CF32 streams")
+        source = self.sim.get("source", "synthetic")
+        self._data = self._synthetic() if source == "synthetic" else self._replay(source)
+        return "rx"
+
+    def activateStream(self, stream, flags=0, timeNs=0, numElems=0):
+        # rate_multiplier > 1 runs the device faster than real time (headroom search)
+        self._rate = self.sample_rate * float(self.sim.get("rate_multiplier", 1.0))
+        self._capacity = max(1, int(float(self.sim.get("fifo_ms", 100)) * 1e-3 * self._rate))
+        self._produced = 0
+        self._fill = 0
+        self._segments = deque()   # [first sample index, length] runs held in the FIFO
+        self._overflow = False
+        self.stats = {"delivered": 0, "dropped": 0, "overflows": 0, "max_backlog": 0}
+        self._t0 = time.perf_counter()
+        self._active = True
+        self.logger.info(f"Simulated device streaming {len(self._data) / self.sample_rate:.1f} s loop "
+                         f"@ {self._rate / 1e6:g} Msps, FIFO {self._capacity / self._rate * 1e3:g} ms")
+        return 0
+
+    def _advance(self):
+        """Move the samples produced since the last call into the FIFO; what does not fit is lost."""
+        produced = int((time.perf_counter() - self._t0) * self._rate)
+        arrived = produced - self._produced
+        if arrived <= 0:
+            return
+        accepted = min(arrived, self._capacity - self._fill)
+        if accepted > 0:
+            last = self._segments[-1] if self._segments else None
+            if last is not None and last[0] + last[1] == self._produced:
+                last[1] += accepted
+            else:
+                self._segments.append([self._produced, accepted])
+            self._fill += accepted
+        if arrived > accepted:
+            lost = arrived - accepted
+            self.stats["dropped"] += lost
+            REGISTRY.inc("radar_sim_dropped_samples_total", lost)
+            if not self._overflow:
+                self.stats["overflows"] += 1
+            self._overflow = True
+        self._produced = produced
+        self.stats["max_backlog"] = max(self.stats["max_backlog"], self._fill)
+        REGISTRY.set("radar_sim_backlog_seconds", self._fill / self._rate)
+
+    def readStream(self, stream, buffs, numElems, flags=0, timeoutUs=100000):
+        if not self._active:
+            return StreamResult(-2, 0, 0)
+        if self._overflow:
+            # reported once per overflow (by the read after it happened); the
+            # next read continues with what the FIFO kept
+            self._overflow = False
+            return StreamResult(SOAPY_SDR_OVERFLOW, 0, 0)
+        self._advance()
+        if self._fill < numElems:
+            time.sleep(min((numElems - self._fill) / self._rate, timeoutUs * 1e-6))
+            self._advance()
+            if self._fill == 0:
+                return StreamResult(SOAPY_SDR_TIMEOUT, 0, 0)
+
+        # one contiguous run per read: a read never spans a gap left by an overflow
+        segment = self._segments[0]
+        start = segment[0]
+        n = min(numElems, segment[1])
+        self._copy(buffs[0], start, n)
+        segment[0] += n
+        segment[1] -= n
+        if segment[1] == 0:
+            self._segments.popleft()
+        self._fill -= n
+        self.stats["delivered"] += n
+        return StreamResult(n, SOAPY_SDR_HAS_TIME, int(start / self._rate * 1e9))
+
+    def deactivateStream(self, stream, flags=0, timeNs=0):
+        if self._active:
+            st = self.stats
+            total = st["delivered"] + st["dropped"]
+            self.logger.info(f"Simulated device: {total / self._rate:.1f} s streamed, {st['overflows']} overflow(s), "
+                             f"{st['dropped']} samples dropped ({100.0 * st['dropped'] / max(total, 1):.2f}%), "
+                             f"max backlog {st['max_backlog'] / self._rate * 1e3:.1f} ms")
+        self._active = False
+        return 0
+
+    def closeStream(self, stream):
+        self._data = None
+
+    def _copy(self, buff, start, n):
+        # the loop may wrap (several times for a short loop) inside one read
+        done = 0
+        while done < n:
+            pos = (start + done) % len(self._data)
+            k = min(n - done, len(self._data) - pos)
+            buff[done:done + k] = self._data[pos:pos + k]
+            done += k
+
+    # ------------------------------------------------------------------ sources
+
+    def _synthetic(self) -> np.ndarray:
+        """simulation.loop_s of random bursts on every channel of the plan, plus noise."""
+        # imported here: main imports sdr_driver, which imports this module
+        from main import calculate_channel_plan
+        from signal_generator import SignalGenerator
+
+        gen = SignalGenerator(self.cfg, seed=int(self.sim.get("seed", 0)))
+        length = int(float(self.sim.get("loop_s", 2.0)) * self.sample_rate)
+        _, plan_center, channels = calculate_channel_plan(self.cfg)
+        shift = plan_center - (self.center_freq if self.center_freq is not None else plan_center)
+        idle = self.sim.get("idle", "random")
+
+        iq = np.zeros(length, dtype=np.complex64)
+        for name, offset in channels:
+            # whole burst trains only, so no frame is cut where the loop wraps
+            pos = 0
+            while True:
+                burst, _ = gen.burst_train(gen.random_frames(20), offset_hz=offset + shift, idle=idle)
+                if pos + len(burst) > length:
+                    break
+                iq[pos:pos + len(burst)] += burst
+                pos += len(burst)
+        # noise once over the sum, so every channel sees snr_db
+        snr_db = self.sim.get("snr_db", 15.0)
+        if snr_db is not None:
+            iq = gen.impair(iq, snr_db=float(snr_db))
+        self.logger.info(f"Simulated IQ: bursts on {', '.join(name for name, _ in channels)}, SNR {snr_db} dB")
+        return iq
+
+    def _replay(self, path) -> np.ndarray:
+        data_path, meta_path = sigmf_paths(path)
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                rate = json.load(f)["global"].get("core:sample_rate")
+            if rate is not None and rate != self.sample_rate:
+                self.logger.warning(f"Recording is {rate / 1e6:g} Msps, paced at {self.sample_rate / 1e6:g} Msps")
+        else:
+            data_path = Path(path)
+        if not data_path.exists():
+            raise RuntimeError(f"Recording not found: {data_path}")
+        data = np.memmap(data_path, dtype="<c8", mode="r")
+        if len(data) == 0:
+            raise RuntimeError(f"Recording is empty: {data_path}")
+        self.logger.info(f"Simulated IQ: looping {data_path} ({len(data) / self.sample_rate:.1f} s)")
+        return data
@@ -0,0 +1,350 @@
+# ============================================================================
+# Spectrum monitor: averaged spectrum, waterfall and SNR off the receive path
+# ============================================================================
+# The receive side only calls push(samples). At most PUSHES_PER_UPDATE times
+# per display update it copies a snapshot (2 x fft_size samples) into a ring
+# of slots in shared memory and returns; it never waits for the consumer.
+# A worker reads new slots, updates an exponentially averaged Welch spectrum
+# (Hann window, 50 % overlap) and one waterfall row per display update, and
+# writes the SNR estimated from that same averaged spectrum back to shared
+# memory, so the status line needs no FFT of its own.
+#
+# The worker is a separate process when the plot is shown (matplotlib redraws
+# take tens of ms and would otherwise hold the receiver's GIL), a thread when
+# only the SNR is needed.
+#
+# Slots (single writer): slot_seq[k] is -1 while slot k is being written and
+# the push number afterwards; the reader drops a slot whose number changed
+# while it was copied (overwritten by a writer that lapped it).
+# ============================================================================
+import importlib.util
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.fft as sp_fft
+
+PUSHES_PER_UPDATE = 4  # snapshots averaged into every display update
+DISPLAY_BINS = 1024    # spectrum / waterfall columns actually drawn
+WORKER_NICE = 10       # display process priority drop
+
+# control / stats words in the shared block
+_PUSHED, _STOP = 0, 1
+_SNR_DB = 0
+
+
+def snr_from_power(power: np.ndarray):
+    """Strongest bin over the median bin (dB): a rough in-band SNR, None without a noise floor."""
+    noise = np.median(power)
+    if noise <= 0:
+        return None
+    return float(10 * np.log10(np.max(power) / noise + 1e-12))
+
+
+class SampleRing:
+    """Fixed slots of complex64 snapshots in one SharedMemory block (one writer, one reader)."""
+
+    def __init__(self, slot_len: int, n_slots: int = 8, name: str = None):
+        self.slot_len, self.n_slots = int(slot_len), int(n_slots)
+        header = 64 + 32 + 16 * self.n_slots
+        create = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=create,
+                                              size=header + 8 * self.slot_len * self.n_slots)
+        buf = self.shm.buf
+        self.ctrl = np.ndarray(8, np.int64, buf, 0)
+        self.stats = np.ndarray(4, np.float64, buf, 64)
+        self.slot_seq = np.ndarray(self.n_slots, np.int64, buf, 96)
+        self.slot_n = np.ndarray(self.n_slots, np.int64, buf, 96 + 8 * self.n_slots)
+        self.slots = np.ndarray((self.n_slots, self.slot_len), np.complex64, buf, header)
+        if create:
+            self.ctrl[:] = 0
+            self.stats[:] = np.nan
+            self.slot_seq[:] = -1
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def write(self, samples: np.ndarray):
+        n = min(len(samples), self.slot_len)
+        seq = int(self.ctrl[_PUSHED])
+        k = seq % self.n_slots
+        self.slot_seq[k] = -1
+        self.slots[k, :n] = samples[:n]
+        self.slot_n[k] = n
+        self.slot_seq[k] = seq
+        self.ctrl[_PUSHED] = seq + 1
+
+    def read(self, last: int):
+        """Snapshots pushed since push number `last`; returns (snapshots, new last)."""
+        pushed = int(self.ctrl[_PUSHED])
+        out = []
+        for seq in range(max(last, pushed - self.n_slots), pushed):
+            k = seq % self.n_slots
+            if self.slot_seq[k] != seq:
+                continue
+            data = self.slots[k, :self.slot_n[k]].copy()
+            if self.slot_seq[k] == seq:
+                out.append(data)
+        return out, pushed
+
+    def close(self, unlink: bool = False):
+        # numpy views keep the buffer exported; drop them before closing
+        del self.ctrl, self.stats, self.slot_seq, self.slot_n, self.slots
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class WelchAverager:
+    """Exponentially averaged Welch power spectrum plus per-row averages for a waterfall."""
+
+    def __init__(self, fft_size: int = 4096, averages: int = 16):
+        self.fft_size = int(fft_size)
+        self.window = np.hanning(self.fft_size).astype(np.float32)
+        self._alpha = 1.0 / max(1, int(averages))
+        self.power = None                        # linear power per bin, DC first
+        self._row = np.zeros(self.fft_size)      # sum of segments since take_row()
+        self._row_count = 0
+
+    def add(self, samples: np.ndarray) -> int:
+        """Fold every 50 %-overlapped segment of samples in; returns the segment count."""
+        n = self.fft_size
+        if len(samples) < n:
+            return 0
+        segments = np.lib.stride_tricks.sliding_window_view(samples, n)[::n // 2]
+        spec = sp_fft.fft(segments * self.window, axis=1)
+        power = spec.real ** 2 + spec.imag ** 2
+        k = len(power)
+        self._row += power.sum(axis=0)
+        self._row_count += k
+        if self.power is None:
+            self.power = power.mean(axis=0, dtype=np.float64)
+            return k
+        # k EWMA steps at once: the newest segment weighs alpha
+        a = self._alpha
+        weights = a * (1 - a) ** np.arange(k - 1, -1, -1)
+        self.power = (1 - a) ** k * self.power + weights @ power
+        return k
+
+    def spectrum_db(self) -> np.ndarray:
+        """Averaged spectrum in dB, negative frequencies first."""
+        return np.fft.fftshift(10 * np.log10(self.power + 1e-20))
+
+    def take_row(self) -> np.ndarray:
+        """Mean spectrum (dB, fftshifted) of the segments since the last row, or None."""
+        if self._row_count == 0:
+            return None
+        row = np.fft.fftshift(10 * np.log10(self._row / self._row_count + 1e-20))
+        self._row[:] = 0
+        self._row_count = 0
+        return row
+
+
+class SpectrumPlot:
+    """
+    Averaged spectrum line over a scrolling waterfall; lives in the worker.
+
+    Drawn at DISPLAY_BINS columns (max over neighbouring bins, so narrow
+    bursts stay visible) and blitted: axes, ticks and labels are only redrawn
+    when the level range moves, the data artists on every update.
+    """
+
+    def __init__(self, sample_rate: float, fft_size: int, rows: int = 200):
+        import matplotlib.pyplot as plt
+        self.plt = plt
+        self._pool = max(1, fft_size // DISPLAY_BINS)
+        bins = fft_size // self._pool
+        freqs = np.fft.fftshift(np.fft.fftfreq(fft_size, d=1.0 / sample_rate))[:bins * self._pool] / 1e3
+        freqs = freqs.reshape(bins, self._pool).mean(axis=1)
+        self.rows = np.full((int(rows), bins), np.nan)
+        self._next_row = 0
+        self._top = None
+        self.fig, (self.ax, self.ax_wf) = plt.subplots(2, 1, sharex=True, figsize=(8, 7),
+                                                       gridspec_kw={"height_ratios": (1, 2)})
+        self.line, = self.ax.plot(freqs, np.zeros(bins), animated=True)
+        self.ax.set_title("Spectrum")
+        self.ax.set_ylabel("Power (dB)")
+        self.ax.grid(True)
+        self.ax.set_xlim(freqs[0], freqs[-1])
+        self.image = self.ax_wf.imshow(self.rows, aspect="auto", origin="upper", interpolation="nearest",
+                                       extent=(freqs[0], freqs[-1], len(self.rows), 0), animated=True)
+        self.ax_wf.set_xlabel("Frequency (kHz)")
+        self.ax_wf.set_ylabel("Updates ago")
+        self.fig.tight_layout()
+        self._background = None
+        # full redraws (resize, new level range) refresh the blit background
+        self.fig.canvas.mpl_connect("draw_event", self._on_draw)
+        plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def _on_draw(self, event):
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        self.ax.draw_artist(self.line)
+        self.ax_wf.draw_artist(self.image)
+
+    def alive(self) -> bool:
+        return self.plt.fignum_exists(self.fig.number)
+
+    def _display(self, power_db: np.ndarray) -> np.ndarray:
+        return power_db[:len(self.line.get_xdata()) * self._pool].reshape(-1, self._pool).max(axis=1)
+
+    def update(self, power_db: np.ndarray, row: np.ndarray):
+        power_db = self._display(power_db)
+        self.line.set_ydata(power_db)
+        if row is not None:
+            self.rows[self._next_row] = self._display(row)
+            self._next_row = (self._next_row + 1) % len(self.rows)
+            # newest row on top
+            self.image.set_data(np.roll(self.rows[::-1], self._next_row, axis=0))
+        top = np.max(power_db)
+        if self._top is None or abs(top - self._top) > 6:
+            self._top = top
+            self.ax.set_ylim(top - 80, top + 5)
+            self.image.set_clim(top - 80, top + 5)
+            self.fig.canvas.draw()
+            return
+        canvas = self.fig.canvas
+        canvas.restore_region(self._background)
+        self._draw_artists()
+        canvas.blit(self.fig.bbox)
+
+    def pause(self, seconds: float):
+        # runs the GUI event loop without the full redraw plt.pause would do
+        # (a timeout <= 0 would mean "until stopped")
+        self.fig.canvas.flush_events()
+        if seconds > 0:
+            self.fig.canvas.start_event_loop(seconds)
+
+
+def _run_worker(ring_name, slot_len, n_slots, sample_rate, interval, show, fft_size, averages, rows):
+    parent = multiprocessing.parent_process()   # None in thread mode
+    if parent is not None:
+        # Ctrl+C reaches the whole process group; the parent stops us through ctrl[_STOP]
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if show:
+        # own process: nothing else configured logging here
+        from utils import setup_logger
+        setup_logger()
+    logger = logging.getLogger("radar.spectrum")
+    ring = SampleRing(slot_len, n_slots, name=ring_name)
+    welch = WelchAverager(fft_size, averages)
+    plot = None
+    if show:
+        try:
+            plot = SpectrumPlot(sample_rate, fft_size, rows)
+        except Exception as e:
+            logger.warning(f"Spectrum display unavailable: {e}")
+        # set up at normal priority; from here on a busy CPU goes to the receiver first
+        if hasattr(os, "nice"):
+            os.nice(WORKER_NICE)
+    last = 0
+    next_update = time.monotonic()
+    try:
+        while not ring.ctrl[_STOP] and (parent is None or parent.is_alive()):
+            snapshots, last = ring.read(last)
+            for samples in snapshots:
+                welch.add(samples)
+            now = time.monotonic()
+            if welch.power is not None and now >= next_update:
+                next_update = now + interval
+                snr_db = snr_from_power(welch.power)
+                ring.stats[_SNR_DB] = np.nan if snr_db is None else snr_db
+                row = welch.take_row()
+                if plot is not None:
+                    if plot.alive():
+                        plot.update(welch.spectrum_db(), row)
+                    else:
+                        plot = None   # window closed: keep serving the SNR
+            if plot is not None:
+                plot.pause(interval / PUSHES_PER_UPDATE)
+            else:
+                time.sleep(interval / PUSHES_PER_UPDATE)
+    except Exception as e:
+        logger.error(f"Spectrum worker failed: {e}")
+    finally:
+        ring.close()
+
+
+class SpectrumMonitor:
+    def __init__(self, sample_rate: float, update_hz: float = 5, show: bool = True, fft_size: int = 4096,
+                 averages: int = 16, waterfall_rows: int = 200):
+        """
+        Args:
+            sample_rate: capture sample rate (Hz), for the frequency axis
+            update_hz: display / SNR update rate
+            show: open the spectrum + waterfall window
+            fft_size: Welch segment length
+            averages: EWMA length of the averaged spectrum, in segments
+            waterfall_rows: waterfall history, one row per update
+        """
+        self.logger = logging.getLogger("radar.spectrum")
+        if show and importlib.util.find_spec("matplotlib") is None:
+            self.logger.warning("matplotlib not installed, spectrum display disabled")
+            show = False
+        self.sample_rate = float(sample_rate)
+        self.show = show
+        self.fft_size = int(fft_size)
+        self.averages = int(averages)
+        self.waterfall_rows = int(waterfall_rows)
+        # matplotlib wants its own main thread: a process whenever there is a window
+        self.worker = "process" if show else "thread"
+        self.interval = 1.0 / max(update_hz, 1)
+        self._push_interval = self.interval / PUSHES_PER_UPDATE
+        self._next_push = 0.0
+        self.ring = SampleRing(2 * self.fft_size)
+        self._worker = None
+
+    @classmethod
+    def from_config(cls, config: dict) -> "SpectrumMonitor":
+        log_cfg = config.get("logging", {})
+        return cls(config["sdr_settings"]["sample_rate_sps"],
+                   update_hz=log_cfg.get("spectrum_update_hz", 5),
+                   show=log_cfg.get("show_spectrum", False),
+                   fft_size=log_cfg.get("spectrum_fft_size", 4096),
+                   averages=log_cfg.get("spectrum_averages", 16),
+                   waterfall_rows=log_cfg.get("waterfall_rows", 200))
+
+    def start(self):
+        args = (self.ring.name, self.ring.slot_len, self.ring.n_slots, self.sample_rate, self.interval,
+                self.show, self.fft_size, self.averages, self.waterfall_rows)
+        if self.worker == "process":
+            # spawn: the GUI must not inherit the receiver's threads / device handles
+            ctx = multiprocessing.get_context("spawn")
+            self._worker = ctx.Process(target=_run_worker, args=args, name="spectrum", daemon=True)
+        else:
+            self._worker = threading.Thread(target=_run_worker, args=args, name="spectrum", daemon=True)
+        self._worker.start()
+        return self
+
+    def push(self, samples: np.ndarray):
+        """Hand a buffer to the monitor; a rate-limited copy, never blocks. Safe from any one thread."""
+        now = time.monotonic()
+        if now < self._next_push:
+            return
+        self._next_push = now + self._push_interval
+        self.ring.write(samples)
+
+    @property
+    def snr_db(self):
+        """Latest SNR estimate from the averaged spectrum, None before the first update."""
+        value = self.ring.stats[_SNR_DB]
+        return None if np.isnan(value) else float(value)
+
+    def stop(self, timeout: float = 2.0):
+        if self._worker is None:
+            return
+        self.ring.ctrl[_STOP] = 1
+        self._worker.join(timeout)
+        if self.worker == "process" and self._worker.is_alive():
+            self._worker.terminate()
+        self._worker = None
+        self.ring.close(unlink=True)